@@ -1,114 +1,259 @@
 from collections import deque
 import heapq
+import itertools
+import logging
+import math
+import time
+from csr_graph import CSRGraph
+from spatial import EARTH_RADIUS, haversine
+
+# Search tracing goes through this logger. Set it to DEBUG to follow a search node by node, e.g.
+# logging.getLogger('algorithms').setLevel(logging.DEBUG); nothing is formatted unless that level is enabled.
+logger = logging.getLogger(__name__)
+
+# Values derived from a whole dict graph (e.g. the A* heuristic scale), kept for the graph searched last since a
+# dictionary can't carry them as attributes like a `CSRGraph` does. The node count catches graphs that grew or
+# shrank since; other edits should call `clear_search_caches`, as the functions in `graph.py` do. A* also notices
+# a scale made stale by shorter edges on its own, see `AStar`.
+_dict_graph = None
+_dict_graph_size = 0
+_dict_graph_values = {}
+
+
+def _graph_value(graph, name, compute):
+    # Returns the value `name` derived from a dict graph, computing it only on the first search of that graph
+    global _dict_graph, _dict_graph_size, _dict_graph_values
+    if _dict_graph is not graph or _dict_graph_size != len(graph):
+        _dict_graph, _dict_graph_size, _dict_graph_values = graph, len(graph), {}
+    if name not in _dict_graph_values:
+        _dict_graph_values[name] = compute()
+    return _dict_graph_values[name]
+
+
+def clear_search_caches(graph) -> None:
+    """
+    Forgets the values the searches derived from a graph's edges (the A* heuristic scale and the reversed edges of
+    a dict graph), so they are computed again after the edges were changed in place.
+
+    Args:
+        graph (CSRGraph | dict): The graph whose edges changed.
+    """
+    global _dict_graph
+    if isinstance(graph, CSRGraph):
+        graph._heuristic_scale = None
+        if graph._reverse is not None:
+            graph._reverse._heuristic_scale = None
+    elif graph is _dict_graph:
+        _dict_graph = None
+
+
+def lower_heuristic_scale(graph, edges) -> None:
+    """
+    Keeps a `CSRGraph`'s A* heuristic scale admissible after edges were shortened in place, lowering it only as far
+    as the new lengths require. Unlike `clear_search_caches`, the next A* search doesn't have to scan every edge
+    again. Lengthened or closed edges never need this, since the scale stays a lower bound for them.
+
+    Args:
+        graph (CSRGraph): The graph whose edges changed.
+        edges (iterable): (source index, target index, new length) of the shortened edges.
+    """
+    scale = graph._heuristic_scale
+    if scale is None:
+        return
+    lats, lons = graph.lats, graph.lons
+    edges = [((lats[i], lons[i]), (lats[j], lons[j]), weight) for i, j, weight in edges
+             if lats[i] == lats[i] and lats[j] == lats[j]]
+    graph._heuristic_scale = min(scale, _heuristic_scale(edges))
+    if graph._reverse is not None:
+        graph._reverse._heuristic_scale = None
+
+
+def record_stats(stats, expanded, pushes, relaxed, peak_frontier, reconstruct_s=0.0) -> None:
+    """
+    Writes a search's counters into the optional `stats` dictionary every search function accepts.
+
+    Args:
+        stats (dict): The dictionary to fill, or None.
+        expanded (int): Nodes settled (expanded) by the search.
+        pushes (int): Entries added to the queue (or stack), including the start.
+        relaxed (int): Edges scanned out of settled nodes.
+        peak_frontier (int): Largest number of entries the queue (or stack) held at once.
+        reconstruct_s (float): Seconds spent rebuilding the path from the parent links.
+    """
+    if stats is not None:
+        stats['expanded'] = expanded
+        stats['pushes'] = pushes
+        stats['relaxed'] = relaxed
+        stats['peak_frontier'] = peak_frontier
+        stats['reconstruct_s'] = reconstruct_s
 
 # ----------------------
 # Breadth-First Search (BFS)
 # ----------------------
-def BFS(graph, start, destination):
+def BFS(graph, start, destination, stats=None):
     """
     Find the shortest path in an unweighted graph using Breadth-First Search (BFS).
 
+    Each node's parent is recorded when it is first discovered, and the path is only rebuilt from those parent
+    links once the destination is reached. Per-node tracing is logged at DEBUG level on this module's logger.
+
     Args:
         graph (dict): The graph where each node has an 'adj' key listing adjacent nodes.
         start: The starting node.
         destination: The target node.
+        stats (dict): Optional dictionary that receives search counters (see `record_stats`).
 
     Returns:
         list: The shortest path from start to destination, or None if no path is found.
     """
+    if isinstance(graph, CSRGraph):
+        return _bfs_csr(graph, start, destination, stats)
+
     # Ensure start and destination nodes exist in the graph
     if start not in graph or destination not in graph:
-        print(f"Error: Start '{start}' or destination '{destination}' not in graph.")
+        logger.warning("Start '%s' or destination '%s' not in graph.", start, destination)
         return None
 
-    # Initialize BFS queue with the start node, tracking the path
-    queue = deque([[start]])
-    visited = set()  # Track visited nodes
+    trace = logger.isEnabledFor(logging.DEBUG)
+    if trace:
+        logger.debug("Starting BFS from '%s' to '%s'", start, destination)
 
-    print(f"Starting BFS from '{start}' to '{destination}'")
+    # Discovering a node records its parent, which also marks it as visited
+    parents = {start: None}
+    queue = deque([start])
+    expanded = relaxed = 0
+    peak = 1
 
     while queue:
-        # Get the first path from the queue
-        path = queue.popleft()
-        current_node = path[-1]
-        print(f"Visiting node: {current_node}, Path so far: {path}")
+        current_node = queue.popleft()
+        if trace:
+            logger.debug("Visiting node: %s", current_node)
 
-        # If the current node is the destination, return the path
+        # If the current node is the destination, rebuild the path from the parent links
         if current_node == destination:
-            print(f"BFS found path: {path}")
+            reconstruct_start = time.perf_counter()
+            path = []
+            while current_node is not None:
+                path.append(current_node)
+                current_node = parents[current_node]
+            path.reverse()
+            record_stats(stats, expanded, len(parents), relaxed, peak, time.perf_counter() - reconstruct_start)
+            if trace:
+                logger.debug("BFS found path: %s", path)
             return path
 
-        # Explore neighbors if not visited
-        if current_node not in visited:
-            visited.add(current_node)
-            neighbors = graph[current_node].get('adj', [])  # Access adjacent nodes
-
-            if not neighbors:
-                print(f"No neighbors found for node {current_node}")
-
-            for neighbor in neighbors:
-                if neighbor not in visited:
-                    new_path = list(path)  # Create a new path including the neighbor
-                    new_path.append(neighbor)
-                    queue.append(new_path)
-                    print(f"Added new path to queue: {new_path}")
-
-    print("BFS could not find a path.")
+        expanded += 1
+        adj = graph[current_node].get('adj', ())
+        relaxed += len(adj)
+        for neighbor in adj:
+            if neighbor not in parents:
+                parents[neighbor] = current_node
+                queue.append(neighbor)
+                if trace:
+                    logger.debug("Discovered node: %s (from %s)", neighbor, current_node)
+        if len(queue) > peak:
+            peak = len(queue)
+
+    # Every discovered node was queued exactly once
+    record_stats(stats, expanded, len(parents), relaxed, peak)
+    logger.info("BFS could not find a path from '%s' to '%s'.", start, destination)
     return None
 
 
 # ----------------------
 # Depth-First Search (DFS)
 # ----------------------
-def DFS(graph, start, end, visited=None, path=None, dist=0):
+def DFS(graph, start, end, visited=None, path=None, dist=0, stats=None):
     """
     Find a path between two nodes in a graph using Depth-First Search (DFS).
 
+    The search is iterative: it keeps one shared path stack with a neighbor iterator and accumulated distance for
+    each node on it, so deep searches never hit Python's recursion limit or copy the path. Neighbors are tried in
+    adjacency order, giving the same path as a recursive DFS.
+
     Args:
         graph (dict): The graph with nodes having 'adj' keys for neighbors.
         start: The starting node.
         end: The target node.
         visited (set): Nodes already visited to prevent cycles.
-        path (list): Accumulated path from start to the current node.
+        path (list): Accumulated path from the original start to `start` (it is copied, not modified).
         dist (float): Distance accumulated along the path.
+        stats (dict): Optional dictionary that receives search counters (see `record_stats`).
 
     Returns:
         tuple: A tuple of total distance and path from start to end, or None if no path is found.
     """
+    if isinstance(graph, CSRGraph):
+        return _dfs_csr(graph, start, end, stats)
+
     # Check if both start and end nodes are in the graph
     if start not in graph or end not in graph:
-        print(f"Error: Start '{start}' or end '{end}' not in graph.")
+        logger.warning("Start '%s' or end '%s' not in graph.", start, end)
         return None
 
     # Initialize visited and path if they are not passed
     if visited is None:
         visited = set()
-    if path is None:
-        path = [start]
+    path = [start] if path is None else list(path)
+    trace = logger.isEnabledFor(logging.DEBUG)
+    expanded = 0
 
     # If the destination is reached, return the path and distance
     if start == end:
-        print(f"DFS found path: {path}")
+        record_stats(stats, expanded, 1, 0, 1)
         return dist, path
 
-    # Mark the current node as visited
+    # One neighbor iterator and accumulated distance per node on the current path
     visited.add(start)
+    expanded += 1
+    adj = graph[start].get('adj', {})
+    relaxed, pushes, peak = len(adj), 1, 1
+    iterators = [iter(adj.items())]
+    distances = [dist]
+
+    while iterators:
+        # Advance to the next unvisited neighbor of the node on top of the stack
+        for node, weight in iterators[-1]:
+            if node not in visited:
+                break
+        else:
+            # Dead end: backtrack to the previous node
+            iterators.pop()
+            distances.pop()
+            path.pop()
+            continue
 
-    # Recursive DFS on each adjacent node
-    for node in graph[start].get('adj', {}):
-        if node not in visited:
-            new_path = DFS(graph, node, end, visited, path + [node], dist + graph[start]['adj'][node])
-            if new_path:
-                return new_path
-
-    print("DFS could not find a path.")
+        node_dist = distances[-1] + weight
+        path.append(node)
+        pushes += 1
+        if trace:
+            logger.debug("Visiting node: %s (distance %s)", node, node_dist)
+
+        if node == end:
+            # The path is the stack itself, so there is nothing to reconstruct
+            record_stats(stats, expanded, pushes, relaxed, max(peak, len(path)))
+            if trace:
+                logger.debug("DFS found path: %s", path)
+            return node_dist, path
+
+        visited.add(node)
+        expanded += 1
+        adj = graph[node].get('adj', {})
+        relaxed += len(adj)
+        iterators.append(iter(adj.items()))
+        distances.append(node_dist)
+        if len(iterators) > peak:
+            peak = len(iterators)
+
+    record_stats(stats, expanded, pushes, relaxed, peak)
+    logger.info("DFS could not find a path from '%s' to '%s'.", start, end)
     return None
 
 
 # ----------------------
 # Dijkstra's Algorithm
 # ----------------------
-def Dijkstra(graph, source, destination):
+def Dijkstra(graph, source, destination, stats=None):
     """
     Find the shortest path in a weighted graph using Dijkstra's algorithm.
 
@@ -116,17 +261,23 @@ def Dijkstra(graph, source, destination):
         graph (dict): The graph where each node has 'adj' for adjacent nodes and weights.
         source: The starting node.
         destination: The target node.
+        stats (dict): Optional dictionary that receives search counters (see `record_stats`).
 
     Returns:
         tuple: Total distance and the path from source to destination, or (None, None) if unreachable.
     """
-    # Step 1: Initialize all distances to infinity except the source
-    distances = {node: float('inf') for node in graph}
-    distances[source] = 0
+    if isinstance(graph, CSRGraph):
+        return _dijkstra_csr(graph, source, destination, stats)
+
+    # Step 1: Only reached nodes get an entry; a missing entry means an infinite distance
+    inf = float('inf')
+    distances = {source: 0}
 
     # Priority queue for selecting the minimum distance node
     priority_queue = [(0, source)]
-    previous_nodes = {node: None for node in graph}
+    previous_nodes = {source: None}
+    expanded = relaxed = 0
+    pushes = peak = 1
 
     while priority_queue:
         current_distance, current_node = heapq.heappop(priority_queue)
@@ -138,23 +289,725 @@ def Dijkstra(graph, source, destination):
         # Skip if a shorter path has already been found
         if current_distance > distances[current_node]:
             continue
+        expanded += 1
 
         # Process each neighbor of the current node
-        for neighbor, weight in graph[current_node].get('adj', {}).items():
+        adj = graph[current_node].get('adj', {})
+        relaxed += len(adj)
+        for neighbor, weight in adj.items():
             distance = current_distance + weight
 
             # Update shortest distance if a new path is found
-            if distance < distances[neighbor]:
+            if distance < distances.get(neighbor, inf):
                 distances[neighbor] = distance
                 previous_nodes[neighbor] = current_node
                 heapq.heappush(priority_queue, (distance, neighbor))
+                pushes += 1
+        if len(priority_queue) > peak:
+            peak = len(priority_queue)
+
+    if destination not in distances:
+        record_stats(stats, expanded, pushes, relaxed, peak)
+        return None, None
+
+    # Reconstruct the shortest path from destination to source
+    reconstruct_start = time.perf_counter()
+    path = []
+    current = destination
+    while current is not None:
+        path.append(current)
+        current = previous_nodes[current]
+    path.reverse()
+    record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+
+    return distances[destination], path
+
+
+# ----------------------
+# A* Search
+# ----------------------
+def AStar(graph, source, destination, stats=None):
+    """
+    Find the shortest path in a weighted graph using A* search with a great-circle distance heuristic.
+
+    The heuristic is the haversine distance to the destination, scaled down by the smallest ratio of edge length
+    to great-circle length found in the graph. That keeps it consistent even for edges shorter than the straight
+    line between their endpoints (such as the location links added by `add_locations`), so A* returns the same
+    distances as Dijkstra while expanding fewer nodes.
+
+    The scale is computed on the first search of a graph and kept. If edges were shortened in place since, without
+    a call to `clear_search_caches`, the search finds an edge the heuristic overestimates; it then computes the
+    scale again and starts over.
+
+    Args:
+        graph (dict): The graph where each node has 'adj' for adjacent nodes and weights and 'coords' for (lat, long).
+        source: The starting node.
+        destination: The target node.
+        stats (dict): Optional dictionary that receives search counters (see `record_stats`).
+
+    Returns:
+        tuple: Total distance and the path from source to destination, or (None, None) if unreachable.
+    """
+    if isinstance(graph, CSRGraph):
+        return _astar_csr(graph, source, destination, stats)
+
+    if source not in graph or destination not in graph or 'coords' not in graph[destination]:
+        return None, None
+
+    def scale():
+        # The scale only depends on the graph, so it is computed on the first search and kept
+        return _graph_value(graph, 'heuristic_scale', lambda: _heuristic_scale(
+            (graph[node]['coords'], graph[neighbor].get('coords'), weight)
+            for node, data in graph.items() if 'coords' in data
+            for neighbor, weight in data.get('adj', {}).items()
+        ))
+
+    result = _astar_dict(graph, source, destination, scale(), True, stats)
+    if result is None:
+        logger.info("A* heuristic scale is stale (edges were shortened in place); recomputing it.")
+        clear_search_caches(graph)
+        result = _astar_dict(graph, source, destination, scale(), False, stats)
+    return result
+
+
+# Slack for rounding when A* checks its heuristic against an edge, in meters
+_CONSISTENCY_SLACK = 1e-6
+
+
+def _astar_dict(graph, source, destination, scale, check, stats):
+    # A* over a dict graph. With `check` set, returns None as soon as an edge shows the heuristic overestimates.
+    estimate = _heuristic(*graph[destination]['coords'], scale)
+
+    # Heuristic values are computed once per node, the first time a node is reached
+    heuristic = {}
+
+    def h(node):
+        if node not in heuristic:
+            coords = graph[node].get('coords')
+            heuristic[node] = estimate(*coords) if coords else 0
+        return heuristic[node]
+
+    distances = {source: 0}
+    previous_nodes = {source: None}
+    closed = set()
+
+    # Entries carry an insertion counter so ties never compare OSM ids with location names
+    counter = itertools.count()
+    priority_queue = [(h(source), 0, next(counter), source)]
+    expanded = relaxed = 0
+    pushes = peak = 1
+
+    while priority_queue:
+        total, current_distance, _, current_node = heapq.heappop(priority_queue)
+
+        # Stop if the destination is reached
+        if current_node == destination:
+            break
+
+        # With a consistent heuristic a node is final the first time it is popped
+        if current_node in closed:
+            continue
+        closed.add(current_node)
+        expanded += 1
+
+        adj = graph[current_node].get('adj', {})
+        relaxed += len(adj)
+        current_estimate = total - current_distance
+        for neighbor, weight in adj.items():
+            distance = current_distance + weight
+            if distance < distances.get(neighbor, float('inf')):
+                remaining = h(neighbor)
+                # A consistent heuristic never drops by more than the edge length (nodes without coordinates
+                # estimate 0 and are not covered by the scale)
+                if check and current_estimate > weight + remaining + _CONSISTENCY_SLACK and 'coords' in graph[neighbor]:
+                    return None
+                distances[neighbor] = distance
+                previous_nodes[neighbor] = current_node
+                heapq.heappush(priority_queue, (distance + remaining, distance, next(counter), neighbor))
+                pushes += 1
+        if len(priority_queue) > peak:
+            peak = len(priority_queue)
+
+    if destination not in distances:
+        record_stats(stats, expanded, pushes, relaxed, peak)
+        return None, None
 
     # Reconstruct the shortest path from destination to source
+    reconstruct_start = time.perf_counter()
     path = []
     current = destination
     while current is not None:
         path.append(current)
         current = previous_nodes[current]
     path.reverse()
+    record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+
+    return distances[destination], path
+
+
+def _reverse_adjacency(graph) -> dict:
+    # Maps every node of a dict graph to its predecessors and the lengths of the edges from them
+    reverse = {}
+    for node, data in graph.items():
+        for neighbor, weight in data.get('adj', {}).items():
+            reverse.setdefault(neighbor, {})[node] = weight
+    return reverse
+
+
+def _heuristic_scale(edges) -> float:
+    """
+    Computes the largest factor by which great-circle distances can be scaled while staying a lower bound on
+    every edge length, so the A* heuristic remains consistent.
+
+    Args:
+        edges (iterable): (source coords, target coords, length) triples. Edges without target coords are skipped.
+
+    Returns:
+        float: A scale factor between 0 and 1.
+    """
+    scale = 1.0
+    for (lat1, long1), coords, weight in edges:
+        if coords is None:
+            continue
+        straight = haversine(lat1, long1, *coords)
+        if straight > 0 and weight < straight * scale:
+            scale = max(0.0, weight / straight)
+    return scale
+
+
+def _heuristic(lat, long, scale):
+    # Returns a function estimating the remaining distance from (lat, long) coordinates to the given target
+    phi_t, lambda_t = math.radians(lat), math.radians(long)
+    cos_t = math.cos(phi_t)
+    factor = 2 * EARTH_RADIUS * scale
+    sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+
+    def estimate(lat, long):
+        phi = radians(lat)
+        a = sin((phi_t - phi) / 2) ** 2 + cos(phi) * cos_t * sin((lambda_t - radians(long)) / 2) ** 2
+        return factor * asin(min(1.0, sqrt(a)))
+
+    return estimate
+
 
-    return (distances[destination], path) if distances[destination] != float('inf') else (None, None)
+# ----------------------
+# Bidirectional Dijkstra
+# ----------------------
+def BidirectionalDijkstra(graph, source, destination, stats=None):
+    """
+    Find the shortest path in a weighted graph by running Dijkstra's algorithm from both ends at once.
+
+    The forward search follows edges from the source, the backward search follows reversed edges from the
+    destination, and the search stops as soon as the two queue heads together can no longer beat the best path
+    found where the searches met. One-way edges are respected because the backward search uses a reverse
+    adjacency view rather than assuming edges are symmetric.
+
+    Args:
+        graph (dict): The graph where each node has 'adj' for adjacent nodes and weights.
+        source: The starting node.
+        destination: The target node.
+        stats (dict): Optional dictionary that receives search counters (see `record_stats`).
+
+    Returns:
+        tuple: Total distance and the path from source to destination, or (None, None) if unreachable.
+    """
+    if isinstance(graph, CSRGraph):
+        return _bidirectional_dijkstra_csr(graph, source, destination, stats)
+
+    if source not in graph or destination not in graph:
+        return None, None
+
+    # Reverse adjacency view: reverse[node] maps each predecessor of `node` to the edge length. Built on the first
+    # search of the graph and kept, like `CSRGraph.reverse()`.
+    reverse = _graph_value(graph, 'reverse', lambda: _reverse_adjacency(graph))
+
+    def forward_edges(node):
+        return graph[node].get('adj', {}).items()
+
+    def backward_edges(node):
+        return reverse.get(node, {}).items()
+
+    # Per direction: distances, parent links (node, edge length), queue and edge accessor. Queue entries carry an
+    # insertion counter so ties never compare OSM ids with location names.
+    counter = itertools.count()
+    forward = ({source: 0}, {source: None}, [(0, next(counter), source)], forward_edges)
+    backward = ({destination: 0}, {destination: None}, [(0, next(counter), destination)], backward_edges)
+
+    best, meeting = (0, source) if source == destination else (float('inf'), None)
+    expanded = relaxed = 0
+    pushes = peak = 2
+    while forward[2] and backward[2]:
+        # Standard stopping rule: nothing left in the queues can produce a shorter path
+        if forward[2][0][0] + backward[2][0][0] >= best:
+            break
+
+        # Expand the side whose queue head is closer
+        search, other = (forward, backward) if forward[2][0][0] <= backward[2][0][0] else (backward, forward)
+        distances, parents, queue, edges = search
+
+        current_distance, _, current_node = heapq.heappop(queue)
+        if current_distance > distances[current_node]:
+            continue
+        expanded += 1
+
+        neighbors = edges(current_node)
+        relaxed += len(neighbors)
+        for neighbor, weight in neighbors:
+            distance = current_distance + weight
+            if distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = distance
+                parents[neighbor] = (current_node, weight)
+                heapq.heappush(queue, (distance, next(counter), neighbor))
+                pushes += 1
+                if neighbor in other[0] and distance + other[0][neighbor] < best:
+                    best, meeting = distance + other[0][neighbor], neighbor
+
+        # The frontier is both queues together
+        if len(forward[2]) + len(backward[2]) > peak:
+            peak = len(forward[2]) + len(backward[2])
+
+    if meeting is None:
+        record_stats(stats, expanded, pushes, relaxed, peak)
+        return None, None
+
+    # Forward half: source -> meeting node
+    reconstruct_start = time.perf_counter()
+    path = []
+    node = meeting
+    while node is not None:
+        path.append(node)
+        node = forward[1][node][0] if forward[1][node] else None
+    path.reverse()
+
+    # Backward half: meeting node -> destination. The distance is re-added edge by edge in path order so it is
+    # bit-for-bit the sum Dijkstra computes along the same path.
+    dist = forward[0][meeting]
+    node = meeting
+    while backward[1][node] is not None:
+        node, weight = backward[1][node]
+        dist += weight
+        path.append(node)
+    record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+
+    return dist, path
+
+
+# ----------------------
+# Shortest-Path Tree
+# ----------------------
+def shortest_path_tree(graph, source, targets=None):
+    """
+    Run Dijkstra's algorithm from one source over a CSR graph and return the whole shortest-path tree.
+
+    Args:
+        graph (CSRGraph): The graph to search.
+        source: The starting node.
+        targets (iterable): Optional nodes of interest. The search stops once all of them are settled instead of
+            exploring the whole graph.
+
+    Returns:
+        tuple: Dictionaries of distances and predecessor indices by node index, holding only the nodes the search
+        reached. The source has predecessor -1.
+    """
+    offsets, targets_, weights = graph.offsets, graph.targets, graph.weights
+    start = graph.index[source]
+
+    # Dictionaries rather than per-node lists, so a search that stops at nearby targets costs as much as the area
+    # it explores rather than the size of the graph
+    inf = float('inf')
+    distances = {start: 0}
+    previous_nodes = {start: -1}
+
+    remaining = None
+    if targets is not None:
+        remaining = {graph.index[node] for node in targets}
+
+    priority_queue = [(0, start)]
+    while priority_queue:
+        current_distance, current = heapq.heappop(priority_queue)
+        if current_distance > distances[current]:
+            continue
+
+        # Stop as soon as every requested target is settled
+        if remaining is not None:
+            remaining.discard(current)
+            if not remaining:
+                break
+
+        first, last = offsets[current], offsets[current + 1]
+        for neighbor, weight in zip(targets_[first:last], weights[first:last]):
+            distance = current_distance + weight
+            if distance < distances.get(neighbor, inf):
+                distances[neighbor] = distance
+                previous_nodes[neighbor] = current
+                heapq.heappush(priority_queue, (distance, neighbor))
+
+    return distances, previous_nodes
+
+
+# ----------------------
+# CSR graph variants
+# ----------------------
+# These run on integer node indices and flat arrays instead of the nested graph dictionaries. Node ids are only
+# translated at the boundary, so the search loops avoid hashing mixed OSM/location ids on every relaxation.
+#
+# None of them allocates per-node state on each call, so a short query costs the same on a campus graph as on a
+# city-sized one. BFS, DFS and `shortest_path_tree` keep their state in dictionaries keyed by node index. The
+# weighted searches reuse per-node tables from a pool kept on the graph and reset only the entries a query wrote,
+# since list reads are noticeably faster than dictionary lookups on long queries.
+
+class _Workspace:
+    # Per-node search tables for one search at a time, plus the indices the current search has written
+    __slots__ = ('distances', 'previous_nodes', 'parent_weights', 'closed', 'touched')
+
+    def __init__(self, n):
+        self.distances = [float('inf')] * n
+        self.previous_nodes = [-1] * n
+        self.parent_weights = [0.0] * n
+        self.closed = bytearray(n)
+        self.touched = []
+
+    def reset(self) -> None:
+        inf = float('inf')
+        distances, previous_nodes, closed = self.distances, self.previous_nodes, self.closed
+        for i in self.touched:
+            distances[i] = inf
+            previous_nodes[i] = -1
+            closed[i] = 0
+        self.touched.clear()
+
+
+def _acquire_workspace(graph) -> _Workspace:
+    # Take an idle workspace from the graph's pool, or allocate one if every workspace is in use. `list.pop` and
+    # `list.append` are atomic, so concurrent searches on one graph (e.g. from server threads) each get their own.
+    try:
+        return graph._workspaces.pop()
+    except IndexError:
+        return _Workspace(len(graph))
+
+
+def _release_workspace(graph, workspace) -> None:
+    workspace.reset()
+    graph._workspaces.append(workspace)
+
+
+def _unwind(graph, parents, node) -> list:
+    # Follow parent indices back to the root (-1) and translate the path to node ids
+    path = []
+    while node != -1:
+        path.append(graph.ids[node])
+        node = parents[node]
+    path.reverse()
+    return path
+
+
+def _bfs_csr(graph, start, destination, stats):
+    if start not in graph or destination not in graph:
+        logger.warning("Start '%s' or destination '%s' not in graph.", start, destination)
+        return None
+
+    trace = logger.isEnabledFor(logging.DEBUG)
+    if trace:
+        logger.debug("Starting BFS from '%s' to '%s'", start, destination)
+
+    offsets, targets = graph.offsets, graph.targets
+    source, target = graph.index[start], graph.index[destination]
+
+    # A node's parent is recorded when it is first discovered, which also marks it as visited
+    parents = {source: -1}
+    queue = deque([source])
+    expanded = relaxed = 0
+    pushes = peak = 1
+
+    while queue:
+        current = queue.popleft()
+        if current == target:
+            reconstruct_start = time.perf_counter()
+            path = _unwind(graph, parents, current)
+            record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+            if trace:
+                logger.debug("BFS found path: %s", path)
+            return path
+
+        if trace:
+            logger.debug("Visiting node: %s", graph.ids[current])
+        expanded += 1
+        first, last = offsets[current], offsets[current + 1]
+        relaxed += last - first
+        for neighbor in targets[first:last]:
+            if neighbor not in parents:
+                parents[neighbor] = current
+                queue.append(neighbor)
+                pushes += 1
+        if len(queue) > peak:
+            peak = len(queue)
+
+    record_stats(stats, expanded, pushes, relaxed, peak)
+    logger.info("BFS could not find a path from '%s' to '%s'.", start, destination)
+    return None
+
+
+def _dfs_csr(graph, start, end, stats):
+    if start not in graph or end not in graph:
+        logger.warning("Start '%s' or end '%s' not in graph.", start, end)
+        return None
+
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    source, target = graph.index[start], graph.index[end]
+
+    # Explicit stack of (node, next edge to try, distance so far), explored in the same order as the recursive DFS
+    visited = set()
+    stack = [(source, offsets[source], 0)]
+    expanded = relaxed = 0
+    pushes = peak = 1
+    while stack:
+        node, e, dist = stack[-1]
+        if node == target:
+            reconstruct_start = time.perf_counter()
+            path = [graph.ids[n] for n, _, _ in stack]
+            record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("DFS found path: %s", path)
+            return dist, path
+        if node not in visited:
+            visited.add(node)
+            expanded += 1
+            relaxed += offsets[node + 1] - offsets[node]
+
+        end_edge = offsets[node + 1]
+        while e < end_edge and targets[e] in visited:
+            e += 1
+        if e == end_edge:
+            stack.pop()
+            continue
+
+        stack[-1] = (node, e + 1, dist)
+        stack.append((targets[e], offsets[targets[e]], dist + weights[e]))
+        pushes += 1
+        if len(stack) > peak:
+            peak = len(stack)
+
+    record_stats(stats, expanded, pushes, relaxed, peak)
+    logger.info("DFS could not find a path from '%s' to '%s'.", start, end)
+    return None
+
+
+def _dijkstra_csr(graph, source, destination, stats):
+    if source not in graph or destination not in graph:
+        return None, None
+
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    start, target = graph.index[source], graph.index[destination]
+
+    inf = float('inf')
+    workspace = _acquire_workspace(graph)
+    distances, previous_nodes, touched = workspace.distances, workspace.previous_nodes, workspace.touched
+    distances[start] = 0
+    touched.append(start)
+
+    priority_queue = [(0, start)]
+    expanded = relaxed = 0
+    pushes = peak = 1
+    while priority_queue:
+        current_distance, current = heapq.heappop(priority_queue)
+        if current == target:
+            break
+        if current_distance > distances[current]:
+            continue
+        expanded += 1
+
+        first, last = offsets[current], offsets[current + 1]
+        relaxed += last - first
+        for neighbor, weight in zip(targets[first:last], weights[first:last]):
+            distance = current_distance + weight
+            if distance < distances[neighbor]:
+                # First time this query reaches the neighbor: remember to reset it
+                if distances[neighbor] == inf:
+                    touched.append(neighbor)
+                distances[neighbor] = distance
+                previous_nodes[neighbor] = current
+                heapq.heappush(priority_queue, (distance, neighbor))
+                pushes += 1
+        if len(priority_queue) > peak:
+            peak = len(priority_queue)
+
+    return _finish_csr(graph, workspace, target, stats, expanded, pushes, relaxed, peak)
+
+
+def _finish_csr(graph, workspace, target, stats, expanded, pushes, relaxed, peak):
+    # Rebuild the path to `target` (if it was reached), report the search counters and return the workspace
+    try:
+        distance = workspace.distances[target]
+        if distance == float('inf'):
+            record_stats(stats, expanded, pushes, relaxed, peak)
+            return None, None
+        reconstruct_start = time.perf_counter()
+        path = _unwind(graph, workspace.previous_nodes, target)
+        record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+        return distance, path
+    finally:
+        _release_workspace(graph, workspace)
+
+
+def _astar_csr(graph, source, destination, stats):
+    if source not in graph or destination not in graph:
+        return None, None
+
+    lats = graph.lats
+    start, target = graph.index[source], graph.index[destination]
+    if lats[target] != lats[target]:
+        return None, None
+
+    # The scale only depends on the graph, so it is computed once and kept on it
+    if graph._heuristic_scale is None:
+        graph._heuristic_scale = _csr_heuristic_scale(graph)
+    result = _astar_csr_search(graph, start, target, graph._heuristic_scale, True, stats)
+    if result is None:
+        logger.info("A* heuristic scale is stale (edges were shortened in place); recomputing it.")
+        graph._heuristic_scale = _csr_heuristic_scale(graph)
+        result = _astar_csr_search(graph, start, target, graph._heuristic_scale, False, stats)
+    return result
+
+
+def _csr_heuristic_scale(graph) -> float:
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    lats, lons = graph.lats, graph.lons
+    return _heuristic_scale(
+        ((lats[i], lons[i]), (lats[targets[e]], lons[targets[e]]) if lats[targets[e]] == lats[targets[e]] else None,
+         weights[e])
+        for i in range(len(graph)) if lats[i] == lats[i]
+        for e in range(offsets[i], offsets[i + 1])
+    )
+
+
+def _astar_csr_search(graph, start, target, scale, check, stats):
+    # A* between node indices. With `check` set, returns None as soon as an edge shows the heuristic overestimates.
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    lats, lons = graph.lats, graph.lons
+    estimate = _heuristic(lats[target], lons[target], scale)
+
+    inf = float('inf')
+    workspace = _acquire_workspace(graph)
+    distances, previous_nodes, closed = workspace.distances, workspace.previous_nodes, workspace.closed
+    touched = workspace.touched
+    distances[start] = 0
+    touched.append(start)
+
+    priority_queue = [(0, 0, start)]
+    expanded = relaxed = 0
+    pushes = peak = 1
+    while priority_queue:
+        total, current_distance, current = heapq.heappop(priority_queue)
+        if current == target:
+            break
+        if closed[current]:
+            continue
+        closed[current] = 1
+        expanded += 1
+
+        first, last = offsets[current], offsets[current + 1]
+        relaxed += last - first
+        current_estimate = total - current_distance
+        for neighbor, weight in zip(targets[first:last], weights[first:last]):
+            distance = current_distance + weight
+            if distance < distances[neighbor]:
+                lat = lats[neighbor]
+                if lat == lat:
+                    remaining = estimate(lat, lons[neighbor])
+                    if check and current_estimate > weight + remaining + _CONSISTENCY_SLACK:
+                        _release_workspace(graph, workspace)
+                        return None
+                else:
+                    remaining = 0
+                if distances[neighbor] == inf:
+                    touched.append(neighbor)
+                distances[neighbor] = distance
+                previous_nodes[neighbor] = current
+                heapq.heappush(priority_queue, (distance + remaining, distance, neighbor))
+                pushes += 1
+        if len(priority_queue) > peak:
+            peak = len(priority_queue)
+
+    return _finish_csr(graph, workspace, target, stats, expanded, pushes, relaxed, peak)
+
+
+def _bidirectional_dijkstra_csr(graph, source, destination, stats):
+    if source not in graph or destination not in graph:
+        return None, None
+
+    reverse = graph.reverse()
+    start, target = graph.index[source], graph.index[destination]
+
+    forward_workspace, backward_workspace = _acquire_workspace(graph), _acquire_workspace(graph)
+    try:
+        return _bidirectional_search(graph, reverse, start, target, forward_workspace, backward_workspace, stats)
+    finally:
+        _release_workspace(graph, forward_workspace)
+        _release_workspace(graph, backward_workspace)
+
+
+def _bidirectional_search(graph, reverse, start, target, forward_workspace, backward_workspace, stats):
+    inf = float('inf')
+    # Per direction: distances, parent indices, parent edge lengths, touched indices, queue and CSR arrays
+    forward = (forward_workspace.distances, forward_workspace.previous_nodes, forward_workspace.parent_weights,
+               forward_workspace.touched, [(0, start)], graph.offsets, graph.targets, graph.weights)
+    backward = (backward_workspace.distances, backward_workspace.previous_nodes, backward_workspace.parent_weights,
+                backward_workspace.touched, [(0, target)], reverse.offsets, reverse.targets, reverse.weights)
+    forward[0][start] = 0
+    forward[3].append(start)
+    backward[0][target] = 0
+    backward[3].append(target)
+
+    best, meeting = (0, start) if start == target else (inf, -1)
+    expanded = relaxed = 0
+    pushes = peak = 2
+    while forward[4] and backward[4]:
+        if forward[4][0][0] + backward[4][0][0] >= best:
+            break
+
+        search, other = (forward, backward) if forward[4][0][0] <= backward[4][0][0] else (backward, forward)
+        distances, parents, parent_weights, touched, queue, offsets, targets, weights = search
+        other_distances = other[0]
+
+        current_distance, current = heapq.heappop(queue)
+        if current_distance > distances[current]:
+            continue
+        expanded += 1
+
+        first, last = offsets[current], offsets[current + 1]
+        relaxed += last - first
+        for neighbor, weight in zip(targets[first:last], weights[first:last]):
+            distance = current_distance + weight
+            if distance < distances[neighbor]:
+                if distances[neighbor] == inf:
+                    touched.append(neighbor)
+                distances[neighbor] = distance
+                parents[neighbor] = current
+                parent_weights[neighbor] = weight
+                heapq.heappush(queue, (distance, neighbor))
+                pushes += 1
+                if distance + other_distances[neighbor] < best:
+                    best, meeting = distance + other_distances[neighbor], neighbor
+
+        # The frontier is both queues together
+        if len(forward[4]) + len(backward[4]) > peak:
+            peak = len(forward[4]) + len(backward[4])
+
+    if meeting == -1:
+        record_stats(stats, expanded, pushes, relaxed, peak)
+        return None, None
+
+    reconstruct_start = time.perf_counter()
+    path = _unwind(graph, forward[1], meeting)
+
+    # Re-add the backward half edge by edge so the distance matches Dijkstra's sum along the same path
+    dist = forward[0][meeting]
+    node = meeting
+    parents, parent_weights = backward[1], backward[2]
+    while parents[node] != -1:
+        dist += parent_weights[node]
+        node = parents[node]
+        path.append(graph.ids[node])
+    record_stats(stats, expanded, pushes, relaxed, peak, time.perf_counter() - reconstruct_start)
+
+    return dist, path
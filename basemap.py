@@ -0,0 +1,285 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import urllib.request
+from io import BytesIO
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# OpenStreetMap's standard tile layer, the same source `plot_campus` used through contextily
+TILE_URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+ATTRIBUTION = '(C) OpenStreetMap contributors'
+MAX_ZOOM = 19
+TILE_SIZE = 256
+
+# Tile servers ask clients to identify themselves
+USER_AGENT = 'csuf-campus-navigation/1.0'
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+
+# On-disk tile cache and its size limit; the least recently used tiles are deleted beyond the limit
+TILE_CACHE_DIR = os.path.join(CACHE_DIR, 'tiles')
+TILE_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+# Pre-rendered campus background
+BACKGROUND_PATH = os.path.join(CACHE_DIR, 'campus_background.npz')
+
+# Web Mercator (EPSG:3857) spans [-pi * R, pi * R] meters on both axes
+WEB_MERCATOR_RADIUS = 6378137
+WEB_MERCATOR_HALF = math.pi * WEB_MERCATOR_RADIUS
+
+# Roughly how many pixels wide the background should be; sets the zoom level picked by `auto_zoom`
+TARGET_WIDTH = 1024
+
+
+class TileCache:
+    """
+    Persistent on-disk cache of map tiles with size-based eviction.
+
+    Tiles are stored as `<directory>/<source hash>/<z>/<x>/<y>.png`. Reading a cached tile refreshes its
+    modification time, so once the cache outgrows `max_bytes` the tiles that haven't been used for the longest time
+    are deleted first.
+    """
+
+    def __init__(self, directory=TILE_CACHE_DIR, max_bytes=TILE_CACHE_MAX_BYTES, url=TILE_URL, timeout=10):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.url = url
+        self.timeout = timeout
+        self._source_dir = os.path.join(directory, hashlib.sha1(url.encode('utf-8')).hexdigest()[:12])
+
+        # Total size of the cache, computed on the first write
+        self._size = None
+
+        # Set after the first failed download, so an offline render doesn't wait for a timeout on every tile
+        self.offline = False
+
+    def _path(self, z, x, y):
+        return os.path.join(self._source_dir, str(z), str(x), f'{y}.png')
+
+    def get(self, z, x, y):
+        """
+        Returns the PNG bytes of a tile, from the cache or else from the tile server.
+
+        Returns:
+            bytes: The tile, or None if it is not cached and cannot be downloaded (e.g. when offline). After a
+            failed download, only cached tiles are returned.
+        """
+        path = self._path(z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            pass
+
+        if self.offline:
+            return None
+        url = self.url.format(z=z, x=x, y=y)
+        try:
+            request = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+        except (OSError, ValueError) as error:
+            logger.warning("Could not download tile %s, using cached tiles only: %s", url, error)
+            self.offline = True
+            return None
+
+        self._store(path, data)
+        return data
+
+    def _store(self, path, data) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._files())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _files(self):
+        # (path, size, modification time) of every cached tile
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def evict(self) -> None:
+        """
+        Deletes the least recently used tiles until the cache is back under 90% of `max_bytes`.
+        """
+        files = sorted(self._files(), key=lambda item: item[2])
+        size = sum(item[1] for item in files)
+        limit = self.max_bytes * 0.9
+        for path, file_size, _ in files:
+            if size <= limit:
+                break
+            try:
+                os.remove(path)
+                size -= file_size
+            except OSError:
+                pass
+        self._size = size
+
+
+def auto_zoom(bounds, width=TARGET_WIDTH) -> int:
+    """
+    Picks the lowest zoom level at which `bounds` is at least `width` pixels wide.
+
+    Args:
+        bounds (tuple): (west, south, east, north) in Web Mercator meters.
+        width (int): Desired width in pixels.
+
+    Returns:
+        int: The zoom level, capped at `MAX_ZOOM`.
+    """
+    west, _, east, _ = bounds
+    span = max(east - west, 1.0)
+    zoom = math.ceil(math.log2(2 * WEB_MERCATOR_HALF * width / (TILE_SIZE * span)))
+    return max(0, min(MAX_ZOOM, zoom))
+
+
+# ----------------------
+# Function: render_tiles
+# ----------------------
+def render_tiles(bounds, zoom=None, tile_cache=None):
+    """
+    Stitches the tiles covering `bounds` into one image cropped to the bounds.
+
+    Tiles that are neither cached nor downloadable are left blank.
+
+    Args:
+        bounds (tuple): (west, south, east, north) in Web Mercator meters.
+        zoom (int): Tile zoom level. Defaults to `auto_zoom(bounds)`.
+        tile_cache (TileCache): Where tiles come from. Defaults to the shared on-disk cache.
+
+    Returns:
+        tuple: The RGB image (uint8 array), its (left, right, bottom, top) extent in Web Mercator meters, and
+        whether every tile was available.
+    """
+    from PIL import Image
+
+    if zoom is None:
+        zoom = auto_zoom(bounds)
+    if tile_cache is None:
+        tile_cache = TileCache()
+
+    west, south, east, north = bounds
+    tile_span = 2 * WEB_MERCATOR_HALF / 2 ** zoom
+    last_tile = 2 ** zoom - 1
+
+    # Tile columns grow eastwards from -pi * R, tile rows grow southwards from +pi * R
+    x0 = min(last_tile, max(0, math.floor((west + WEB_MERCATOR_HALF) / tile_span)))
+    x1 = min(last_tile, max(0, math.floor((east + WEB_MERCATOR_HALF) / tile_span)))
+    y0 = min(last_tile, max(0, math.floor((WEB_MERCATOR_HALF - north) / tile_span)))
+    y1 = min(last_tile, max(0, math.floor((WEB_MERCATOR_HALF - south) / tile_span)))
+
+    mosaic = np.full(((y1 - y0 + 1) * TILE_SIZE, (x1 - x0 + 1) * TILE_SIZE, 3), 255, dtype=np.uint8)
+    complete = True
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            data = tile_cache.get(zoom, x, y)
+            if data is None:
+                complete = False
+                continue
+            tile = Image.open(BytesIO(data)).convert('RGB')
+            if tile.size != (TILE_SIZE, TILE_SIZE):
+                tile = tile.resize((TILE_SIZE, TILE_SIZE))
+            row, column = (y - y0) * TILE_SIZE, (x - x0) * TILE_SIZE
+            mosaic[row:row + TILE_SIZE, column:column + TILE_SIZE] = np.asarray(tile)
+
+    # Crop the mosaic to the requested bounds
+    pixels_per_meter = TILE_SIZE / tile_span
+    left = -WEB_MERCATOR_HALF + x0 * tile_span
+    top = WEB_MERCATOR_HALF - y0 * tile_span
+    column0 = max(0, int((west - left) * pixels_per_meter))
+    column1 = min(mosaic.shape[1], math.ceil((east - left) * pixels_per_meter))
+    row0 = max(0, int((top - north) * pixels_per_meter))
+    row1 = min(mosaic.shape[0], math.ceil((top - south) * pixels_per_meter))
+
+    image = np.ascontiguousarray(mosaic[row0:row1, column0:column1])
+    extent = (left + column0 / pixels_per_meter, left + column1 / pixels_per_meter,
+              top - row1 / pixels_per_meter, top - row0 / pixels_per_meter)
+    return image, extent, complete
+
+
+def background_key(bounds, zoom, url=TILE_URL) -> str:
+    """
+    Identifies a rendered background by everything that goes into it.
+    """
+    return hashlib.sha256(json.dumps({'bounds': list(bounds), 'zoom': zoom, 'url': url}).encode('utf-8')).hexdigest()
+
+
+# ----------------------
+# Function: load_background
+# ----------------------
+def load_background(bounds, path=BACKGROUND_PATH, refresh=False, tile_cache=None):
+    """
+    Loads the pre-rendered background for `bounds`, rendering and saving it first if needed.
+
+    A background is only saved once all of its tiles were available, so one rendered while offline is rebuilt
+    the next time.
+
+    Args:
+        bounds (tuple): (west, south, east, north) in Web Mercator meters.
+        path (str): Raster file to read and write.
+        refresh (bool): Render the background again even if a matching one is stored.
+        tile_cache (TileCache): Where tiles come from. Defaults to the shared on-disk cache.
+
+    Returns:
+        tuple: The RGB image and its (left, right, bottom, top) extent in Web Mercator meters.
+    """
+    zoom = auto_zoom(bounds)
+    url = tile_cache.url if tile_cache is not None else TILE_URL
+    key = background_key(bounds, zoom, url)
+
+    if not refresh:
+        try:
+            with np.load(path) as stored:
+                if str(stored['key']) == key:
+                    return stored['image'], tuple(stored['extent'])
+        except (OSError, KeyError, ValueError):
+            pass
+
+    image, extent, complete = render_tiles(bounds, zoom, tile_cache)
+    if complete:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, key=key, image=image, extent=np.array(extent))
+        os.replace(tmp_path, path)
+    return image, extent
+
+
+# ----------------------
+# Function: add_background
+# ----------------------
+def add_background(ax, bounds, path=BACKGROUND_PATH, refresh=False):
+    """
+    Draws the map background for `bounds` on `ax` with a single `imshow`, in place of `ctx.add_basemap`.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes in Web Mercator coordinates.
+        bounds (tuple): (west, south, east, north) in Web Mercator meters.
+        path (str): Pre-rendered raster file to use.
+        refresh (bool): Render the background again from the tiles.
+
+    Returns:
+        matplotlib.image.AxesImage: The background image.
+    """
+    image, extent = load_background(bounds, path, refresh)
+    background = ax.imshow(image, extent=extent, interpolation='bilinear', zorder=0)
+    ax.text(0.005, 0.005, ATTRIBUTION, transform=ax.transAxes, fontsize=8, ha='left', va='bottom')
+    return background
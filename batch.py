@@ -0,0 +1,146 @@
+import argparse
+import csv
+import itertools
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from graph import SNAPSHOT_PATH, graph_key, load_graph, parse_node_id
+from routing_engine import RoutingEngine
+from snapshot import load_snapshot
+
+# Routing engine of the current worker process, set up once by `_init_worker`
+_engine = None
+
+
+def group_by_source(pairs) -> dict:
+    """
+    Groups (start, end) pairs by their start node, keeping the order in which starts and ends first appear.
+
+    Args:
+        pairs (iterable): (start, end) node id pairs.
+
+    Returns:
+        dict: List of end nodes per start node. Repeated pairs are kept so every input pair gets a result.
+    """
+    groups = {}
+    for start, end in pairs:
+        groups.setdefault(start, []).append(end)
+    return groups
+
+
+def _init_worker(path, key):
+    global _engine
+
+    # Every worker maps the same snapshot file, so the graph pages are shared by the OS instead of being pickled
+    # into each process. The key makes sure it is the graph the parent routes on.
+    graph = load_snapshot(path, key)
+    if graph is None:
+        raise RuntimeError(f"The graph snapshot at {path} is missing, corrupt or was built for another graph; "
+                           f"load it with graph.load_graph first to rebuild it.")
+    _engine = RoutingEngine(graph)
+
+
+def _route_groups(groups, engine=None) -> list:
+    # Answer every destination of a source from one search tree
+    engine = engine or _engine
+    results = []
+    for source, destinations in groups:
+        paths = engine.shortest_paths(source, destinations)
+        results.extend((source, destination) + paths[destination] for destination in destinations)
+    return results
+
+
+# ----------------------
+# Function: route_batch
+# ----------------------
+def route_batch(pairs, path=SNAPSHOT_PATH, workers=None, groups_per_task=None, graph=None):
+    """
+    Computes shortest routes for many (start, end) pairs, spreading the work across processes.
+
+    Pairs that share a start node are answered by one search. Groups of starts are sent to a pool of worker
+    processes that each memory-map the graph snapshot at `path`, so only node ids and results cross process
+    boundaries.
+
+    Args:
+        pairs (iterable): (start, end) node id pairs.
+        path (str): Graph snapshot to route on. It is built first if it is missing or stale.
+        workers (int): Number of worker processes. Defaults to the number of CPUs; 1 routes in this process.
+        groups_per_task (int): Start nodes sent to a worker at a time. Defaults to a size that gives every worker
+            several tasks.
+        graph (CSRGraph): The graph already loaded from `path`, if the caller has it, so it isn't loaded again.
+
+    Yields:
+        tuple: (start, end, distance, path) for every input pair, with (None, None) as distance and path when the
+        end is unreachable. Results arrive as workers finish, not in input order.
+    """
+    # Make sure an up-to-date snapshot exists before any worker opens it
+    if graph is None:
+        graph = load_graph(path=path)
+    groups = list(group_by_source(pairs).items())
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        engine = RoutingEngine(graph)
+        for group in groups:
+            yield from _route_groups([group], engine)
+        return
+
+    # A few tasks per worker keeps every worker busy until the end without paying IPC for every start node
+    if groups_per_task is None:
+        groups_per_task = max(1, math.ceil(len(groups) / (workers * 8)))
+    tasks = (groups[i:i + groups_per_task] for i in range(0, len(groups), groups_per_task))
+
+    initargs = (path, graph_key())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as executor:
+        # Only keep a couple of tasks per worker in flight, so finished results don't pile up in memory while the
+        # caller is still consuming earlier ones
+        pending = {executor.submit(_route_groups, task) for task in itertools.islice(tasks, workers * 2)}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for task in itertools.islice(tasks, 1):
+                        pending.add(executor.submit(_route_groups, task))
+                    yield from future.result()
+        finally:
+            # The caller stopped early: drop the work that hasn't started yet
+            for future in pending:
+                future.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compute shortest walking routes for a CSV file of start,end "
+                                                 "pairs (location names or OSM node ids).")
+    parser.add_argument('pairs', help="CSV file with one start,end pair per row")
+    parser.add_argument('--output', help="write start,end,distance_m,path rows to this CSV file instead of stdout")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    graph = load_graph()
+    with open(args.pairs, newline='') as f:
+        pairs = [(parse_node_id(graph, row[0].strip()), parse_node_id(graph, row[1].strip()))
+                 for row in csv.reader(f) if row]
+
+    output = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(['start', 'end', 'distance_m', 'path'])
+
+        start_time = time.perf_counter()
+        for start, end, dist, route in route_batch(pairs, workers=args.workers, graph=graph):
+            writer.writerow([start, end, '' if dist is None else f"{dist:.2f}",
+                             '' if route is None else ' '.join(map(str, route))])
+        elapsed = time.perf_counter() - start_time
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(f"Routed {len(pairs)} pairs in {elapsed:.2f} s ({len(pairs) / elapsed if elapsed else 0:.0f} pairs/s)",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from algorithms import AStar, BFS, BidirectionalDijkstra, DFS, Dijkstra
+from csr_graph import CSRGraph
+from graph import SNAPSHOT_PATH, latitude, longitude
+from routing_engine import RoutingEngine
+from snapshot import load_snapshot
+from spatial import EARTH_RADIUS, GridIndex, haversine
+
+# Each engine is prepared once per graph and returns a query function taking (start, end, stats)
+ENGINES = {
+    'BFS': lambda graph: lambda start, end, stats: BFS(graph, start, end, stats=stats),
+    'DFS': lambda graph: lambda start, end, stats: DFS(graph, start, end, stats=stats),
+    'Dijkstra': lambda graph: lambda start, end, stats: Dijkstra(graph, start, end, stats=stats),
+    'AStar': lambda graph: lambda start, end, stats: AStar(graph, start, end, stats=stats),
+    'BidirectionalDijkstra': lambda graph: lambda start, end, stats: BidirectionalDijkstra(graph, start, end,
+                                                                                           stats=stats),
+    'RoutingEngine': lambda graph: RoutingEngine(graph).shortest_path,
+}
+
+# Distance in meters between neighboring nodes of the synthetic graphs, about one city block
+NODE_SPACING = 80
+
+
+def _to_coords(x, y):
+    # Place a point given in meters east/north of the campus center on the map
+    lat = latitude + math.degrees(y / EARTH_RADIUS)
+    long = longitude + math.degrees(x / (EARTH_RADIUS * math.cos(math.radians(latitude))))
+    return lat, long
+
+
+def _connect(graph, u, v) -> None:
+    # Two-way street between u and v, as long as the great-circle distance between them
+    length = haversine(*graph[u]['coords'], *graph[v]['coords'])
+    graph[u]['adj'][v] = length
+    graph[v]['adj'][u] = length
+
+
+# ----------------------
+# Function: grid_graph
+# ----------------------
+def grid_graph(nodes, seed=0) -> dict:
+    """
+    Builds a street grid around the campus center in the `create_graph` dictionary format.
+
+    Intersections are jittered a little so edge lengths (and therefore shortest paths) are not all tied.
+
+    Args:
+        nodes (int): Approximate number of nodes; the grid is the smallest square with at least this many.
+        seed (int): Seed for the jitter.
+
+    Returns:
+        dict: The graph dictionary.
+    """
+    rng = random.Random(seed)
+    side = math.ceil(math.sqrt(nodes))
+    offset = (side - 1) * NODE_SPACING / 2
+
+    graph = defaultdict(dict)
+    for row in range(side):
+        for column in range(side):
+            x = column * NODE_SPACING - offset + rng.uniform(-0.2, 0.2) * NODE_SPACING
+            y = row * NODE_SPACING - offset + rng.uniform(-0.2, 0.2) * NODE_SPACING
+            graph[row * side + column] = {'coords': _to_coords(x, y), 'adj': {}}
+
+    for row in range(side):
+        for column in range(side):
+            node = row * side + column
+            if column + 1 < side:
+                _connect(graph, node, node + 1)
+            if row + 1 < side:
+                _connect(graph, node, node + side)
+    return graph
+
+
+# ----------------------
+# Function: geometric_graph
+# ----------------------
+def geometric_graph(nodes, seed=0, degree=6) -> dict:
+    """
+    Builds a random geometric graph around the campus center in the `create_graph` dictionary format.
+
+    Nodes are scattered uniformly over a square with one node per `NODE_SPACING`² on average, and every pair of
+    nodes closer than the radius that gives `degree` neighbors on average is connected. Unlike the grid, the
+    result has irregular degrees and may be disconnected, like a real footpath network.
+
+    Args:
+        nodes (int): Number of nodes.
+        seed (int): Seed for the node positions.
+        degree (float): Expected number of neighbors per node.
+
+    Returns:
+        dict: The graph dictionary.
+    """
+    rng = random.Random(seed)
+    extent = NODE_SPACING * math.sqrt(nodes)
+    xs = [rng.uniform(-extent / 2, extent / 2) for _ in range(nodes)]
+    ys = [rng.uniform(-extent / 2, extent / 2) for _ in range(nodes)]
+    radius = NODE_SPACING * math.sqrt(degree / math.pi)
+
+    graph = defaultdict(dict)
+    for node, (x, y) in enumerate(zip(xs, ys)):
+        graph[node] = {'coords': _to_coords(x, y), 'adj': {}}
+
+    index = GridIndex(xs, ys, cell_size=radius)
+    for node, (x, y) in enumerate(zip(xs, ys)):
+        for neighbor, _ in index.within(x, y, radius):
+            if neighbor > node:
+                _connect(graph, node, neighbor)
+    return graph
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# ----------------------
+# Function: benchmark_engine
+# ----------------------
+def benchmark_engine(name, graph, pairs, memory_queries) -> dict:
+    """
+    Runs one engine over a list of query pairs.
+
+    Setup covers preparing the engine and one warm-up query. Queries are timed without `tracemalloc`, which slows
+    Python code down considerably. Peak memory is then measured separately by re-running the first
+    `memory_queries` pairs with tracing enabled.
+
+    Args:
+        name (str): Key into `ENGINES`.
+        graph (dict | CSRGraph): The graph to route on.
+        pairs (list): (start, end) node id pairs.
+        memory_queries (int): Number of pairs to re-run for the memory measurement.
+
+    Returns:
+        dict: Timing, expansion and memory figures for the engine.
+    """
+    # Engines build some per-graph state on their first query (the A* heuristic scale, the reversed edges of the
+    # bidirectional search), so one untimed query is run as part of the setup rather than skewing the first sample
+    start_time = time.perf_counter()
+    query = ENGINES[name](graph)
+    if pairs:
+        query(*pairs[0], {})
+    setup = time.perf_counter() - start_time
+
+    times, expanded, found = [], [], 0
+    for start, end in pairs:
+        stats = {}
+        start_time = time.perf_counter()
+        result = query(start, end, stats)
+        times.append(time.perf_counter() - start_time)
+        expanded.append(stats.get('expanded', 0))
+        if result is not None and result != (None, None):
+            found += 1
+
+    peak = 0
+    if memory_queries:
+        tracemalloc.start()
+        for start, end in pairs[:memory_queries]:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            query(start, end, {})
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+        tracemalloc.stop()
+
+    return {
+        'engine': name,
+        'queries': len(pairs),
+        'found': found,
+        'setup_s': setup,
+        'mean_ms': statistics.fmean(times) * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'p95_ms': _percentile(times, 0.95) * 1000,
+        'max_ms': max(times) * 1000,
+        'mean_expanded': statistics.fmean(expanded),
+        'peak_kib': peak / 1024,
+    }
+
+
+def _graph_size(graph):
+    if isinstance(graph, CSRGraph):
+        return len(graph), graph.edge_count
+    return len(graph), sum(len(data.get('adj', {})) for data in graph.values())
+
+
+def _git_commit():
+    # Results are tagged with the commit they were measured on, when run from a git checkout
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _inputs(args):
+    # Yields (label, kind, graph builder) for every input graph selected on the command line
+    if not args.no_campus:
+        yield 'campus', 'campus', lambda: load_snapshot(args.snapshot)
+    for kind, builder in (('grid', grid_graph), ('geometric', geometric_graph)):
+        if kind in args.kinds:
+            for size in args.sizes:
+                yield f'{kind}-{size}', kind, lambda builder=builder, size=size: builder(size, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the routing algorithms on the campus graph and on "
+                                                 "synthetic graphs, fully offline.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                        help="node counts of the synthetic graphs")
+    parser.add_argument('--kinds', nargs='+', choices=['grid', 'geometric'], default=['grid', 'geometric'],
+                        help="synthetic graph families to generate")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help="engines to benchmark")
+    parser.add_argument('--queries', type=int, default=20, help="random queries per graph")
+    parser.add_argument('--memory-queries', type=int, default=3,
+                        help="queries re-run under tracemalloc to measure peak memory (0 to skip)")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic graphs and query pairs")
+    parser.add_argument('--csr', action='store_true',
+                        help="route the synthetic graphs as CSRGraphs instead of graph dictionaries")
+    parser.add_argument('--snapshot', default=SNAPSHOT_PATH, help="campus graph snapshot to benchmark")
+    parser.add_argument('--no-campus', action='store_true', help="skip the campus graph")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'graph':>16} {'nodes':>8} {'engine':>22} {'mean (ms)':>10} {'p95 (ms)':>10} {'expanded':>10} "
+          f"{'peak (KiB)':>11}")
+    for label, kind, build in _inputs(args):
+        start_time = time.perf_counter()
+        graph = build()
+        if graph is None:
+            print(f"{label:>16} skipped: no snapshot at {args.snapshot} (run main.py once to create it)")
+            continue
+        if args.csr and kind != 'campus':
+            graph = CSRGraph.from_dict(graph)
+        build_time = time.perf_counter() - start_time
+
+        nodes, edges = _graph_size(graph)
+        rng = random.Random(args.seed)
+        ids = list(graph)
+        pairs = [(rng.choice(ids), rng.choice(ids)) for _ in range(args.queries)]
+
+        for name in args.engines:
+            row = {'graph': label, 'kind': kind, 'nodes': nodes, 'edges': edges, 'build_s': build_time,
+                   **benchmark_engine(name, graph, pairs, args.memory_queries)}
+            results.append(row)
+            print(f"{label:>16} {nodes:>8} {name:>22} {row['mean_ms']:>10.3f} {row['p95_ms']:>10.3f} "
+                  f"{row['mean_expanded']:>10.0f} {row['peak_kib']:>11.1f}")
+
+        # Let the graph go before the next (possibly much larger) one is built
+        del graph
+
+    if args.output:
+        report = {
+            'commit': _git_commit(),
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'arguments': vars(args),
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import random
+import time
+from algorithms import Dijkstra
+from contraction import ContractionHierarchy
+from graph import SNAPSHOT_PATH, load_graph
+
+
+def benchmark_radius(dist, queries, seed):
+    """
+    Measures Contraction Hierarchies preprocessing time and query speedup over Dijkstra for one download radius.
+
+    Args:
+        dist (int): Download radius in meters.
+        queries (int): Number of random node pairs to route.
+        seed (int): Seed for picking the node pairs.
+
+    Returns:
+        dict: Graph size, preprocessing time and average query times for the radius.
+    """
+    # Each radius gets its own snapshot so repeated runs don't download anything
+    path = os.path.join(os.path.dirname(SNAPSHOT_PATH), f'campus_graph_{dist}m.bin')
+    graph = load_graph(path=path, dist=dist)
+
+    start = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(graph)
+    preprocessing = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    pairs = [(rng.choice(graph.ids), rng.choice(graph.ids)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    expected = [Dijkstra(graph, source, destination)[0] for source, destination in pairs]
+    dijkstra_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [hierarchy.query(source, destination)[0] for source, destination in pairs]
+    ch_time = time.perf_counter() - start
+
+    # Both engines must agree on every distance (up to floating-point summation order)
+    for (source, destination), want, got in zip(pairs, expected, results):
+        if (want is None) != (got is None) or (want is not None and abs(want - got) > 1e-6 * max(1.0, want)):
+            raise AssertionError(f"CH returned {got} for {source} -> {destination}, Dijkstra returned {want}")
+
+    return {
+        'radius_m': dist,
+        'nodes': len(graph),
+        'edges': graph.edge_count,
+        'shortcut_edges': len(hierarchy.up_targets) + len(hierarchy.down_targets) - graph.edge_count,
+        'preprocessing_s': preprocessing,
+        'dijkstra_query_ms': dijkstra_time / queries * 1000,
+        'ch_query_ms': ch_time / queries * 1000,
+        'speedup': dijkstra_time / ch_time if ch_time else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Contraction Hierarchies against Dijkstra as the "
+                                                 "download radius grows.")
+    parser.add_argument('--radii', type=int, nargs='+', default=[800, 1600, 3200, 6400],
+                        help="download radii in meters")
+    parser.add_argument('--queries', type=int, default=200, help="random queries per radius")
+    parser.add_argument('--seed', type=int, default=0, help="seed for picking query pairs")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'radius':>8} {'nodes':>8} {'edges':>8} {'shortcuts':>10} {'prep (s)':>9} "
+          f"{'dijkstra (ms)':>14} {'ch (ms)':>8} {'speedup':>8}")
+    for dist in args.radii:
+        row = benchmark_radius(dist, args.queries, args.seed)
+        results.append(row)
+        print(f"{row['radius_m']:>8} {row['nodes']:>8} {row['edges']:>8} {row['shortcut_edges']:>10} "
+              f"{row['preprocessing_s']:>9.2f} {row['dijkstra_query_ms']:>14.3f} {row['ch_query_ms']:>8.3f} "
+              f"{row['speedup']:>7.1f}x")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+from array import array
+from csr_graph import CSRGraph
+from snapshot import BYTE_ORDER, map_tables, tables_size, write_tables
+
+# Bump whenever the on-disk layout below changes so old hierarchies are rebuilt
+HIERARCHY_VERSION = 1
+MAGIC = b'CSUFCHRC'
+
+# Header layout: magic, version, byte order flag, cache key, node count, upward edge count, downward edge count
+HEADER = struct.Struct('<8sII32sQQQ')
+
+# ------------------------------------------------------------------
+# File layout (every section starts on an 8-byte boundary):
+#
+#   header
+#   up_offsets     int64[node_count + 1]   edges v -> w to higher-ranked nodes w, grouped by v
+#   up_weights     float64[up_count]
+#   up_targets     int32[up_count]
+#   up_middle      int32[up_count]         contracted node a shortcut bypasses, -1 for original edges
+#   down_offsets   int64[node_count + 1]   edges u -> v from higher-ranked nodes u, grouped by v
+#   down_weights   float64[down_count]
+#   down_targets   int32[down_count]       the source node u of each edge
+#   down_middle    int32[down_count]
+# ------------------------------------------------------------------
+
+# Witness searches give up (and keep the shortcut) after settling this many nodes
+WITNESS_SETTLE_LIMIT = 50
+
+
+def hierarchy_key(graph) -> bytes:
+    """
+    Computes the cache key of a hierarchy from the contents of the graph it was built on.
+    """
+    return hashlib.sha256(b'contraction-hierarchy' + graph.fingerprint()).digest()
+
+
+class ContractionHierarchy:
+    """
+    Contraction Hierarchies speed-up technique for point-to-point shortest paths.
+
+    Preprocessing contracts the nodes one by one in order of importance, adding shortcut edges that preserve
+    shortest-path distances among the remaining nodes. A query then runs a bidirectional Dijkstra search that only
+    follows edges towards more important nodes, which settles a small fraction of the graph, and unpacks the
+    shortcuts on the result back into the original nodes.
+
+    The hierarchy is stored as two CSR edge lists: `up_*` holds, for every node, its edges to higher-ranked nodes
+    (used by the forward search) and `down_*` holds the edges arriving from higher-ranked nodes (used by the
+    backward search).
+    """
+
+    def __init__(self, graph, up_offsets, up_targets, up_weights, up_middle,
+                 down_offsets, down_targets, down_weights, down_middle, buffer=None):
+        self.graph = graph
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+        self.down_offsets = down_offsets
+        self.down_targets = down_targets
+        self.down_weights = down_weights
+        self.down_middle = down_middle
+
+        # Object owning the memory behind the tables (e.g. an mmap), kept alive with the hierarchy
+        self.buffer = buffer
+
+    # ----------------------
+    # Preprocessing
+    # ----------------------
+    @classmethod
+    def build(cls, graph, settle_limit=WITNESS_SETTLE_LIMIT):
+        """
+        Orders and contracts every node of the graph.
+
+        Nodes are contracted by increasing edge difference (shortcuts added minus edges removed) plus the number of
+        already contracted neighbors, with priorities updated lazily.
+
+        Args:
+            graph (CSRGraph | dict): The routing graph.
+            settle_limit (int): Maximum number of nodes a witness search may settle before a shortcut is kept.
+
+        Returns:
+            ContractionHierarchy: The preprocessed hierarchy.
+        """
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        n = len(graph)
+
+        # Remaining graph as adjacency dictionaries: neighbor -> (weight, middle node)
+        out_edges = [{} for _ in range(n)]
+        in_edges = [{} for _ in range(n)]
+        for u in range(n):
+            for v, weight in graph.edges(u):
+                if v != u and (v not in out_edges[u] or weight < out_edges[u][v][0]):
+                    out_edges[u][v] = (weight, -1)
+                    in_edges[v][u] = (weight, -1)
+
+        def witness_distances(source, excluded, targets, limit):
+            # Dijkstra from `source` in the remaining graph without `excluded`. It stops once every target is
+            # settled, the distance limit is passed or the settle limit is hit.
+            distances = {source: 0}
+            queue = [(0, source)]
+            remaining = len(targets)
+            settled = 0
+            while queue and settled < settle_limit:
+                d, u = heapq.heappop(queue)
+                if d > distances[u]:
+                    continue
+                if d > limit:
+                    break
+                if u in targets:
+                    remaining -= 1
+                    if not remaining:
+                        break
+                settled += 1
+                for v, (weight, _) in out_edges[u].items():
+                    if v == excluded:
+                        continue
+                    nd = d + weight
+                    if nd < distances.get(v, float('inf')):
+                        distances[v] = nd
+                        heapq.heappush(queue, (nd, v))
+            return distances
+
+        def needed_shortcuts(v):
+            # Shortcuts u -> w that contracting `v` requires, as (u, w, weight) triples
+            shortcuts = []
+            for u, (in_weight, _) in in_edges[v].items():
+                candidates = {w: in_weight + out_weight for w, (out_weight, _) in out_edges[v].items() if w != u}
+                if not candidates:
+                    continue
+                distances = witness_distances(u, v, candidates, max(candidates.values()))
+                for w, weight in candidates.items():
+                    if distances.get(w, float('inf')) > weight:
+                        shortcuts.append((u, w, weight))
+            return shortcuts
+
+        contracted_neighbors = [0] * n
+        depth = [0] * n
+
+        def priority(v, shortcuts):
+            return 2 * (len(shortcuts) - len(in_edges[v]) - len(out_edges[v])) + contracted_neighbors[v] + depth[v]
+
+        queue = [(priority(v, needed_shortcuts(v)), v) for v in range(n)]
+        heapq.heapify(queue)
+
+        up = [None] * n
+        down = [None] * n
+        while queue:
+            _, v = heapq.heappop(queue)
+
+            # Lazy update: if the node's priority got worse, put it back unless it is still the minimum
+            shortcuts = needed_shortcuts(v)
+            current = priority(v, shortcuts)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, v))
+                continue
+
+            # All remaining neighbors outrank `v`, so its current edges become part of the hierarchy
+            up[v] = list(out_edges[v].items())
+            down[v] = list(in_edges[v].items())
+
+            for w in out_edges[v]:
+                del in_edges[w][v]
+                contracted_neighbors[w] += 1
+                depth[w] = max(depth[w], depth[v] + 1)
+            for u in in_edges[v]:
+                del out_edges[u][v]
+                contracted_neighbors[u] += 1
+                depth[u] = max(depth[u], depth[v] + 1)
+            for u, w, weight in shortcuts:
+                if w not in out_edges[u] or weight < out_edges[u][w][0]:
+                    out_edges[u][w] = (weight, v)
+                    in_edges[w][u] = (weight, v)
+            out_edges[v] = {}
+            in_edges[v] = {}
+
+        tables = []
+        for edges in (up, down):
+            offsets, targets, weights, middle = array('q', [0]), array('i'), array('d'), array('i')
+            for node_edges in edges:
+                for target, (weight, mid) in node_edges:
+                    targets.append(target)
+                    weights.append(weight)
+                    middle.append(mid)
+                offsets.append(len(targets))
+            tables.extend((offsets, targets, weights, middle))
+
+        return cls(graph, *tables)
+
+    # ----------------------
+    # Queries
+    # ----------------------
+    def query(self, source, destination, stats=None):
+        """
+        Finds the shortest path between two nodes with a bidirectional upward search.
+
+        Args:
+            source: The starting node.
+            destination: The target node.
+            stats (dict): Optional dictionary that receives search counters ('expanded').
+
+        Returns:
+            tuple: Total distance and the path from source to destination (original nodes only), or (None, None)
+            if unreachable.
+        """
+        graph = self.graph
+        if source not in graph or destination not in graph:
+            return None, None
+        s, t = graph.index[source], graph.index[destination]
+
+        inf = float('inf')
+        # Per direction: distances, predecessor (node, middle) links, queue, the edges the search follows and the
+        # edges of the opposite direction, which are used to stall nodes
+        up = (self.up_offsets, self.up_targets, self.up_weights, self.up_middle)
+        down = (self.down_offsets, self.down_targets, self.down_weights, self.down_middle)
+        forward = ({s: 0}, {s: None}, [(0, s)], *up, *down[:3])
+        backward = ({t: 0}, {t: None}, [(0, t)], *down, *up[:3])
+
+        best, meeting = (0, s) if s == t else (inf, -1)
+        expanded = 0
+        while True:
+            # Advance the direction with the smaller queue head; stop once neither can improve on `best`
+            f_min = forward[2][0][0] if forward[2] else inf
+            b_min = backward[2][0][0] if backward[2] else inf
+            if min(f_min, b_min) >= best:
+                break
+            search, other = (forward, backward) if f_min <= b_min else (backward, forward)
+            distances, links, queue, offsets, targets, weights, middle = search[:7]
+            stall_offsets, stall_targets, stall_weights = search[7:]
+
+            d, u = heapq.heappop(queue)
+            if d > distances[u]:
+                continue
+
+            # Stall-on-demand: if a higher-ranked node already reached reaches `u` more cheaply, `u` lies on no
+            # shortest up-path and its edges need not be relaxed
+            stalled = False
+            for e in range(stall_offsets[u], stall_offsets[u + 1]):
+                w = stall_targets[e]
+                if w in distances and distances[w] + stall_weights[e] < d:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            expanded += 1
+
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                nd = d + weights[e]
+                if nd < distances.get(v, inf):
+                    distances[v] = nd
+                    links[v] = (u, middle[e])
+                    heapq.heappush(queue, (nd, v))
+                    # A node reached from both sides closes a candidate path
+                    if v in other[0] and nd + other[0][v] < best:
+                        best, meeting = nd + other[0][v], v
+
+        if stats is not None:
+            stats['expanded'] = expanded
+        if meeting == -1:
+            return None, None
+
+        # Forward half: source -> meeting, following links back from the meeting node
+        edges = []
+        node = meeting
+        while forward[1][node] is not None:
+            previous, mid = forward[1][node]
+            edges.append((previous, node, mid))
+            node = previous
+        edges.reverse()
+
+        # Backward half: meeting -> destination, links point towards the destination
+        node = meeting
+        while backward[1][node] is not None:
+            following, mid = backward[1][node]
+            edges.append((node, following, mid))
+            node = following
+
+        path = [s]
+        for u, v, mid in edges:
+            self._unpack(u, v, mid, path)
+        return best, [graph.ids[i] for i in path]
+
+    def _unpack(self, u, v, mid, path):
+        # Append the original nodes of edge u -> v (excluding u) to `path`, expanding shortcuts recursively
+        stack = [(u, v, mid)]
+        while stack:
+            u, v, mid = stack.pop()
+            if mid == -1:
+                path.append(v)
+                continue
+            # The bypassed node ranks below both endpoints: u -> mid is stored with mid's incoming edges and
+            # mid -> v with its outgoing edges
+            stack.append((mid, v, self._middle(self.up_offsets, self.up_targets, self.up_middle, mid, v)))
+            stack.append((u, mid, self._middle(self.down_offsets, self.down_targets, self.down_middle, mid, u)))
+
+    @staticmethod
+    def _middle(offsets, targets, middle, node, neighbor):
+        for e in range(offsets[node], offsets[node + 1]):
+            if targets[e] == neighbor:
+                return middle[e]
+        raise KeyError((node, neighbor))
+
+    # ----------------------
+    # Persistence
+    # ----------------------
+    def save(self, path, key) -> None:
+        """
+        Writes the hierarchy to disk.
+
+        Args:
+            path (str): Destination file. Parent directories are created as needed.
+            key (bytes): Cache key from `hierarchy_key` stored in the header.
+        """
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, HIERARCHY_VERSION, BYTE_ORDER, key, len(self.graph), len(self.up_targets),
+                                len(self.down_targets)))
+            write_tables(f, ((self.up_offsets, 'q'), (self.up_weights, 'd'), (self.up_targets, 'i'),
+                             (self.up_middle, 'i'), (self.down_offsets, 'q'), (self.down_weights, 'd'),
+                             (self.down_targets, 'i'), (self.down_middle, 'i')))
+
+        # Replace the old hierarchy only once the new one is fully written
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, graph, key):
+        """
+        Memory-maps a saved hierarchy.
+
+        Args:
+            path (str): Hierarchy file to open.
+            graph (CSRGraph): The routing graph the hierarchy belongs to.
+            key (bytes): Expected cache key.
+
+        Returns:
+            ContractionHierarchy: The hierarchy, or None if the file is missing or truncated, or was built for another
+            graph.
+        """
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(mm) < HEADER.size:
+            mm.close()
+            return None
+
+        magic, version, byte_order, file_key, node_count, up_count, down_count = HEADER.unpack_from(mm)
+        if (magic != MAGIC or version != HIERARCHY_VERSION or byte_order != BYTE_ORDER or file_key != key
+                or node_count != len(graph)):
+            mm.close()
+            return None
+
+        layout = (
+            ('up_offsets', 'q', node_count + 1), ('up_weights', 'd', up_count), ('up_targets', 'i', up_count),
+            ('up_middle', 'i', up_count), ('down_offsets', 'q', node_count + 1), ('down_weights', 'd', down_count),
+            ('down_targets', 'i', down_count), ('down_middle', 'i', down_count),
+        )
+        # A truncated file is rebuilt; views can't be created past its end
+        if HEADER.size + tables_size(layout) > len(mm):
+            mm.close()
+            return None
+
+        tables, _ = map_tables(memoryview(mm), HEADER.size, layout)
+        return cls(graph, buffer=mm, **tables)
+
+
+# ----------------------
+# Function: load_hierarchy
+# ----------------------
+def load_hierarchy(graph, path, refresh=False) -> ContractionHierarchy:
+    """
+    Loads a saved hierarchy for the graph, building and saving it when it is missing or stale.
+
+    Args:
+        graph (CSRGraph): The routing graph.
+        path (str): Hierarchy file to read and write.
+        refresh (bool): Rebuild the hierarchy even if a valid one exists.
+
+    Returns:
+        ContractionHierarchy: The hierarchy.
+    """
+    key = hierarchy_key(graph)
+
+    if not refresh:
+        hierarchy = ContractionHierarchy.load(path, graph, key)
+        if hierarchy is not None:
+            return hierarchy
+
+    hierarchy = ContractionHierarchy.build(graph)
+    hierarchy.save(path, key)
+    return hierarchy
@@ -0,0 +1,208 @@
+import hashlib
+import json
+from array import array
+from collections import defaultdict
+
+
+def table_bytes(values, typecode) -> bytes:
+    """
+    Returns the raw bytes of a numeric table, whether it is backed by an `array`, a memoryview or a list.
+    """
+    if isinstance(values, (array, memoryview)):
+        return values.tobytes()
+    return array(typecode, values).tobytes()
+
+
+class CSRGraph:
+    """
+    Compact, array-backed routing graph.
+
+    Nodes are numbered 0..n-1. The outgoing edges of node `i` are `targets[offsets[i]:offsets[i + 1]]` with the
+    matching lengths in `weights`. Coordinates and labels live in separate tables indexed the same way, and
+    `ids`/`index` translate between graph node ids (OSM integers and location names) and indices.
+
+    Any sequence that supports indexing can back the tables, so a graph can be built from `array`s or used
+    directly on top of a memory-mapped snapshot.
+
+    The graph also behaves like the read-only graph dictionary produced by `create_graph`: `node in graph`,
+    `len(graph)`, iteration over node ids and `graph[node]['adj' | 'coords' | 'name' | 'geometry']` all work, so
+    code written against the dictionary format keeps working.
+
+    Curved streets and edges merged by `contract_chains` carry their shape points, for drawing only: the points of
+    edge `e` are `geometry_lats/lons[geometry_offsets[e]:geometry_offsets[e + 1]]`.
+    """
+
+    def __init__(self, ids, offsets, targets, weights, lats, lons, names, buffer=None, geometry_offsets=None,
+                 geometry_lats=None, geometry_lons=None):
+        self.ids = ids
+        self.index = {node: i for i, node in enumerate(ids)}
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.lats = lats
+        self.lons = lons
+        self.names = names
+
+        # Shape points between the end nodes of each edge; None when no edge has any
+        self.geometry_offsets = geometry_offsets
+        self.geometry_lats = geometry_lats
+        self.geometry_lons = geometry_lons
+
+        # Object owning the memory behind the tables (e.g. a snapshot's mmap), kept alive with the graph
+        self.buffer = buffer
+        self._fingerprint = None
+        self._reverse = None
+        self._heuristic_scale = None  # A* heuristic scale, computed by the first A* search
+        self._workspaces = []  # Idle search workspaces, see `algorithms._acquire_workspace`
+
+    @classmethod
+    def from_dict(cls, graph):
+        """
+        Builds a CSR graph from the graph dictionary produced by `create_graph`/`add_locations`.
+
+        Args:
+            graph (dict): The graph dictionary to convert. Adjacency order is preserved.
+
+        Returns:
+            CSRGraph: The converted graph.
+        """
+        ids = list(graph)
+        index = {node: i for i, node in enumerate(ids)}
+
+        offsets = array('q', [0])
+        targets = array('i')
+        weights = array('d')
+        lats = array('d')
+        lons = array('d')
+        names = []
+        geometry_offsets = array('q', [0])
+        geometry_lats = array('d')
+        geometry_lons = array('d')
+
+        for node in ids:
+            data = graph[node]
+            geometry = data.get('geometry', {})
+            for neighbor, weight in data.get('adj', {}).items():
+                targets.append(index[neighbor])
+                weights.append(weight)
+                for lat, long in geometry.get(neighbor, ()):
+                    geometry_lats.append(lat)
+                    geometry_lons.append(long)
+                geometry_offsets.append(len(geometry_lats))
+            offsets.append(len(targets))
+
+            # NaN marks a node without coordinates
+            lat, long = data.get('coords', (float('nan'), float('nan')))
+            lats.append(lat)
+            lons.append(long)
+            names.append(data.get('name'))
+
+        if not geometry_lats:
+            return cls(ids, offsets, targets, weights, lats, lons, names)
+        return cls(ids, offsets, targets, weights, lats, lons, names, geometry_offsets=geometry_offsets,
+                   geometry_lats=geometry_lats, geometry_lons=geometry_lons)
+
+    def to_dict(self) -> dict:
+        """
+        Converts the graph back to the graph dictionary format.
+
+        Returns:
+            dict: A `defaultdict(dict)` with 'adj', 'coords', 'name' and 'geometry' entries per node.
+        """
+        graph = defaultdict(dict)
+        for node in self.ids:
+            graph[node] = self[node]
+        return graph
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    def fingerprint(self) -> bytes:
+        """
+        Returns a SHA-256 digest of the node ids, edges and weights, used to tell whether data derived from the
+        graph (such as precomputed route tables) is still valid.
+        """
+        if self._fingerprint is None:
+            digest = hashlib.sha256(json.dumps(list(self.ids)).encode('utf-8'))
+            for values, typecode in ((self.offsets, 'q'), (self.targets, 'i'), (self.weights, 'd')):
+                digest.update(table_bytes(values, typecode))
+            self._fingerprint = digest.digest()
+        return self._fingerprint
+
+    def reverse(self):
+        """
+        Returns the transposed graph, where every edge points the other way. It shares the node tables with this
+        graph and is built once, then cached. Edge geometry is not carried over, since only searches use it.
+
+        Returns:
+            CSRGraph: The reversed graph.
+        """
+        if self._reverse is None:
+            n = len(self.ids)
+            offsets, targets, weights = self.offsets, self.targets, self.weights
+
+            # Counting sort of the edges by target node
+            counts = [0] * (n + 1)
+            for target in targets:
+                counts[target + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            reverse_offsets = array('q', counts)
+
+            position = counts[:-1]
+            reverse_targets = array('i', bytes(4 * len(targets)))
+            reverse_weights = array('d', bytes(8 * len(targets)))
+            for source in range(n):
+                for e in range(offsets[source], offsets[source + 1]):
+                    slot = position[targets[e]]
+                    reverse_targets[slot] = source
+                    reverse_weights[slot] = weights[e]
+                    position[targets[e]] = slot + 1
+
+            self._reverse = CSRGraph(self.ids, reverse_offsets, reverse_targets, reverse_weights, self.lats,
+                                     self.lons, self.names)
+            self._reverse._reverse = self
+        return self._reverse
+
+    def coords(self, i) -> tuple:
+        """Returns the (lat, long) coordinates of the node at index `i`."""
+        return self.lats[i], self.lons[i]
+
+    def edges(self, i):
+        """Yields (target index, weight) pairs for the outgoing edges of the node at index `i`."""
+        targets, weights = self.targets, self.weights
+        for e in range(self.offsets[i], self.offsets[i + 1]):
+            yield targets[e], weights[e]
+
+    def edge_geometry(self, e) -> list:
+        """Returns the (lat, long) shape points between the end nodes of edge `e`, empty for a straight edge."""
+        if self.geometry_offsets is None:
+            return []
+        first, last = self.geometry_offsets[e], self.geometry_offsets[e + 1]
+        return list(zip(self.geometry_lats[first:last], self.geometry_lons[first:last]))
+
+    # Dictionary-style access, for code written against the `create_graph` format
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def __getitem__(self, node) -> dict:
+        i = self.index[node]
+        ids = self.ids
+        data = {'adj': {ids[j]: weight for j, weight in self.edges(i)}}
+        if self.lats[i] == self.lats[i]:
+            data['coords'] = self.coords(i)
+        if self.names[i] is not None:
+            data['name'] = self.names[i]
+        first, last = self.offsets[i], self.offsets[i + 1]
+        if self.geometry_offsets is not None and self.geometry_offsets[first] != self.geometry_offsets[last]:
+            data['geometry'] = {ids[self.targets[e]]: self.edge_geometry(e) for e in range(first, last)
+                                if self.geometry_offsets[e] != self.geometry_offsets[e + 1]}
+        return data
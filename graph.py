@@ -1,11 +1,29 @@
 from collections import defaultdict
-import osmnx as ox
+import os
+from algorithms import clear_search_caches
+from csr_graph import CSRGraph
+from instrumentation import phase
+from snapshot import snapshot_key, load_snapshot, save_snapshot
+from spatial import SnapIndex, haversine
 
 # Set latitude and longitude for the center of the CSUF campus map
 latitude = 33.88534
 longitude = -117.88742
 
-csuf_campus_map = ox.graph_from_point((latitude, longitude), dist=800, network_type='all')
+# Radius (in meters) of the street network downloaded around the campus center
+radius = 800
+
+# Default location of the on-disk snapshot of the routing graph
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'campus_graph.bin')
+
+# Default location of the precomputed location-to-location route table, stored next to the snapshot
+ROUTE_TABLE_PATH = os.path.join(os.path.dirname(SNAPSHOT_PATH), 'route_table.bin')
+
+# Average walking speed in meters per second, used to turn route lengths into walking times
+WALKING_SPEED = 1.42
+
+# The OSMnx campus map is only downloaded when something actually needs it (see `get_campus_map`)
+_campus_map = None
 
 # Dictionary mapping locations (e.g., buildings, parking lots) to their coordinates on campus
 
@@ -61,8 +79,8 @@ def create_graph(csuf_campus_map) -> dict:
     # Iterate over each node in the OSMNx graph to create adjacency relationships
     for source_id, source_data in csuf_campus_map.adj.items():
         for nei_id, nei_data in source_data.items():
-            # Retrieve edge data (first edge in the list)
-            nei_data = nei_data[0]
+            # Of parallel edges between the same two nodes, only the shortest can be on a shortest path
+            nei_data = min(nei_data.values(), key=lambda edge: edge['length'])
 
             # Extract and store the street name, if available
             if 'name' in nei_data:
@@ -77,6 +95,12 @@ def create_graph(csuf_campus_map) -> dict:
             # Store the length of the edge as the distance between nodes
             graph[source_id]['adj'][nei_id] = nei_data['length']
 
+            # Keep the shape of curved streets (the points between the two end nodes) for drawing routes
+            if 'geometry' in nei_data:
+                points = [(lat, long) for long, lat in nei_data['geometry'].coords[1:-1]]
+                if points:
+                    graph[source_id].setdefault('geometry', {})[nei_id] = points
+
     # Add coordinates for each node
     for name, data in csuf_campus_map.nodes(data=True):
         long, lat = data['x'], data['y']  # Extract longitude and latitude
@@ -88,45 +112,127 @@ def create_graph(csuf_campus_map) -> dict:
 # ----------------------
 # Function: add_locations
 # ----------------------
-def add_locations(graph) -> None:
+def add_locations(graph, locations=None) -> None:
     """
     Adds custom location nodes (e.g., campus buildings) to the graph and connects them to nearby streets.
 
     Args:
         graph (dict): The graph dictionary to which locations will be added.
+        locations (dict): Mapping of location names to (lat, long) coordinates. Defaults to `csuf_locations`.
     """
-    # Add each location in `csuf_locations` to the graph with coordinates and adjacency structure
-    for location_name, (lat, long) in csuf_locations.items():
+    if locations is None:
+        locations = csuf_locations
+
+    # Index the street nodes once. Location nodes (which `add_csuf_locations` may already have put on the map)
+    # are left out, so a location can never snap to itself or to another building.
+    street_nodes = [node for node, data in graph.items()
+                    if 'coords' in data and node not in locations and node not in csuf_locations]
+    snap_index = SnapIndex(street_nodes, [graph[node]['coords'] for node in street_nodes])
+
+    # Add each location to the graph with coordinates and adjacency structure
+    for location_name, (lat, long) in locations.items():
         graph[location_name]['name'] = location_name
         graph[location_name]['adj'] = {}  # Initialize adjacency list
         graph[location_name]['coords'] = (lat, long)  # Set coordinates
 
-    # Connect each location to nearby streets by defining bounding boxes
-    for location_name, (lat, long) in csuf_locations.items():
-        bp = 0.0001  # Define bounding box padding in degrees
-        # Define offsets for creating a bounding box around each location
-        top_left = (-bp, -bp)
-        top_right = (bp, -bp)
-        bottom_left = (-bp, bp)
-        bottom_right = (bp, bp)
-
-        # Connect the location to nearby street nodes based on bounding box corners
-        for dx, dy in [top_left, top_right, bottom_left, bottom_right]:
-            nearest_node_id, dist = ox.distance.nearest_nodes(
-                csuf_campus_map, long + dx, lat + dy, return_dist=True
-            )
-
-            # Adjust the search radius if the nearest node is the same as the location
-            scale = 1
-            while nearest_node_id == location_name:
-                scale *= 1.4  # Increase scale to expand search radius
-                nearest_node_id, dist = ox.distance.nearest_nodes(
-                    csuf_campus_map, long + dx * scale, lat + dy * scale, return_dist=True
-                )
+    # Connect each location to nearby streets through the corners of a small bounding box around it
+    bp = 0.0001  # Define bounding box padding in degrees
+    corners = [(-bp, -bp), (bp, -bp), (-bp, bp), (bp, bp)]  # (dx, dy) offsets in degrees
+
+    # Snap every corner of every location in one batch
+    queries = [(lat + dy, long + dx) for lat, long in locations.values() for dx, dy in corners]
+    snapped = iter(snap_index.snap_many(queries))
+
+    for location_name, (lat, long) in locations.items():
+        for _ in corners:
+            nearest_node_id, _ = next(snapped)
+
+            # Weight the link by the distance from the location itself, not from the probe corner, so it is never
+            # shorter than the straight line between its endpoints
+            dist = haversine(lat, long, *graph[nearest_node_id]['coords'])
 
             # Update the adjacency lists in both directions (bidirectional graph)
             graph[location_name]['adj'][nearest_node_id] = dist
-            graph[nearest_node_id]['adj'][location_name] = dist
+            graph[nearest_node_id].setdefault('adj', {})[location_name] = dist
+
+    clear_search_caches(graph)
+
+
+# ----------------------
+# Function: contract_chains
+# ----------------------
+def contract_chains(graph, keep=()) -> int:
+    """
+    Merges chains of degree-2 nodes (shape points along a footpath, with one way in and one way out) into single
+    edges, so searches settle far fewer nodes. Distances between the remaining nodes don't change.
+
+    A node is removed when it only links two other nodes, either in both directions or as one link of a one-way
+    chain. The edges through it become one edge whose weight is the sum of theirs, and the node's coordinates (with
+    those of any chains already merged into the edges) are kept in the edge's 'geometry' so the curve can still be
+    drawn. If the two neighbors are already linked, the shorter of the two edges is kept.
+
+    Args:
+        graph (dict): The graph dictionary to simplify, in place.
+        keep (iterable): Nodes that must not be removed, e.g. locations that are searched from or to.
+
+    Returns:
+        int: The number of nodes removed.
+    """
+    keep = set(keep)
+
+    # Incoming neighbors of every node; the graph dictionary only stores outgoing edges
+    predecessors = defaultdict(set)
+    for node, data in graph.items():
+        for neighbor in data.get('adj', {}):
+            predecessors[neighbor].add(node)
+
+    def edge_points(source, target):
+        return graph[source].get('geometry', {}).get(target, [])
+
+    def merge(source, node, target):
+        # Replaces source -> node -> target with one edge, unless a shorter source -> target edge already exists
+        weight = graph[source]['adj'][node] + graph[node]['adj'][target]
+        points = edge_points(source, node) + [graph[node]['coords']] + edge_points(node, target)
+        del graph[source]['adj'][node]
+        graph[source].get('geometry', {}).pop(node, None)
+        predecessors[target].discard(node)
+        if weight < graph[source]['adj'].get(target, float('inf')):
+            graph[source]['adj'][target] = weight
+            graph[source].setdefault('geometry', {})[target] = points
+            predecessors[target].add(source)
+
+    removed = 0
+    pending = list(graph)
+    while pending:
+        node = pending.pop()
+        if node in keep or node not in graph or 'coords' not in graph[node]:
+            continue
+        successors = set(graph[node].get('adj', {}))
+        incoming = predecessors[node]
+        if node in successors:
+            continue
+
+        if len(successors) == 2 and incoming == successors:
+            # Two-way chain: a <-> node <-> b
+            a, b = successors
+            merge(a, node, b)
+            merge(b, node, a)
+        elif len(successors) == len(incoming) == 1 and incoming != successors:
+            # One-way chain: a -> node -> b
+            (a,), (b,) = incoming, successors
+            merge(a, node, b)
+        else:
+            continue
+
+        del graph[node]
+        del predecessors[node]
+        removed += 1
+        # The neighbors may have become chain nodes themselves, e.g. when the merged edge replaced an existing one
+        pending.extend((a, b))
+
+    if removed:
+        clear_search_caches(graph)
+    return removed
 
 
 # ----------------------
@@ -136,6 +242,149 @@ def add_csuf_locations():
     """
     Adds CSUF-specific locations as nodes to the OSMNx graph (for visualization).
     """
+    csuf_campus_map = get_campus_map()
     for location, coords in csuf_locations.items():
         # Add each CSUF location as a node to the original OSMNx graph
-        csuf_campus_map.add_node(location, x=coords[1], y=coords[0], weight=1)
\ No newline at end of file
+        csuf_campus_map.add_node(location, x=coords[1], y=coords[0], weight=1)
+
+
+# ----------------------
+# Function: get_campus_map
+# ----------------------
+def get_campus_map():
+    """
+    Returns the OSMNx campus map, downloading it the first time it is needed.
+
+    Returns:
+        networkx.MultiDiGraph: The street network around the campus center.
+    """
+    global _campus_map
+    if _campus_map is None:
+        # OSMnx (and the matplotlib it pulls in) is only imported when a map really has to be downloaded
+        import osmnx as ox
+        _campus_map = ox.graph_from_point((latitude, longitude), dist=radius, network_type='all')
+    return _campus_map
+
+
+def __getattr__(name):
+    # Keep `from graph import csuf_campus_map` working without downloading the map at import time
+    if name == 'csuf_campus_map':
+        return get_campus_map()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def graph_key(dist=None) -> bytes:
+    """
+    Returns the snapshot key of the campus routing graph, which `load_graph` checks snapshots against.
+
+    Args:
+        dist (int): Download radius in meters. Defaults to `radius`.
+    """
+    return snapshot_key(latitude, longitude, radius if dist is None else dist, csuf_locations)
+
+
+# ----------------------
+# Function: load_graph
+# ----------------------
+def load_graph(refresh=False, path=SNAPSHOT_PATH, dist=None, stats=None) -> CSRGraph:
+    """
+    Loads the routing graph from its on-disk snapshot, building and saving it first if needed.
+
+    The graph is only rebuilt from OSM when `refresh` is set or when the snapshot was made for a different
+    center, radius or set of `csuf_locations`.
+
+    Args:
+        refresh (bool): Rebuild the graph from OSM even if a valid snapshot exists.
+        path (str): Snapshot file to read and write.
+        dist (int): Download radius in meters. Defaults to `radius`; other radii are downloaded separately and are
+            not added to the campus map used for visualization.
+        stats (QueryStats): Optional record that receives the time of each loading phase ('load snapshot', and
+            when rebuilding 'download map', 'build graph', 'snap locations', 'contract chains' and
+            'save snapshot').
+
+    Returns:
+        CSRGraph: The routing graph with custom locations already added.
+    """
+    if dist is None:
+        dist = radius
+    key = graph_key(dist)
+
+    if not refresh:
+        with phase(stats, 'load snapshot'):
+            graph = load_snapshot(path, key)
+        if graph is not None:
+            return graph
+
+    # Build the graph the same way `main` used to: locations on the map, then the routing graph
+    with phase(stats, 'download map'):
+        if dist == radius:
+            add_csuf_locations()
+            campus_map = get_campus_map()
+        else:
+            import osmnx as ox
+            campus_map = ox.graph_from_point((latitude, longitude), dist=dist, network_type='all')
+    with phase(stats, 'build graph'):
+        graph = create_graph(campus_map)
+    with phase(stats, 'snap locations'):
+        add_locations(graph)
+    with phase(stats, 'contract chains'):
+        contract_chains(graph, keep=csuf_locations)
+    with phase(stats, 'build graph'):
+        graph = CSRGraph.from_dict(graph)
+
+    with phase(stats, 'save snapshot'):
+        save_snapshot(path, graph, key)
+    return graph
+
+
+# ----------------------
+# Function: walking_minutes
+# ----------------------
+def walking_minutes(dist) -> float:
+    """
+    Estimates the time needed to walk a distance at `WALKING_SPEED`.
+
+    Args:
+        dist (float): Distance in meters.
+
+    Returns:
+        float: Walking time in minutes.
+    """
+    return (dist / WALKING_SPEED) / 60
+
+
+# ----------------------
+# Function: walking_distance
+# ----------------------
+def walking_distance(minutes) -> float:
+    """
+    Estimates how far one walks in a given time at `WALKING_SPEED`, the inverse of `walking_minutes`.
+
+    Args:
+        minutes (float): Walking time in minutes.
+
+    Returns:
+        float: Distance in meters.
+    """
+    return minutes * 60 * WALKING_SPEED
+
+
+# ----------------------
+# Function: parse_node_id
+# ----------------------
+def parse_node_id(graph, value):
+    """
+    Converts a node id given as text (e.g. from a CSV file or URL) to the id used in the graph.
+
+    Location names are used as is, while OSM node ids are integers in the graph.
+
+    Args:
+        graph (CSRGraph | dict): The routing graph.
+        value (str): The node id as text.
+
+    Returns:
+        The matching node id.
+    """
+    if value not in graph and value.isdigit():
+        return int(value)
+    return value
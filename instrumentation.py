@@ -0,0 +1,104 @@
+import datetime
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# Algorithm counters copied from a search's `stats` dictionary (see `algorithms.record_stats`)
+COUNTERS = ('expanded', 'pushes', 'relaxed', 'peak_frontier')
+
+
+class QueryStats:
+    """
+    Timings and counters of one routing query (or of one startup), as a structured record.
+
+    Phases are timed with `phase` (or added with `record`) and accumulate when a phase runs more than once.
+    Search counters are taken from an algorithm's `stats` dictionary with `add_search`, which also splits the
+    path reconstruction time off the search time.
+    """
+
+    def __init__(self, event='query', **fields):
+        self.event = event
+        self.timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.fields = fields
+        self.timings = {}
+        self.counters = {}
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the body of a `with` block as one phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds) -> None:
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_search(self, stats, seconds, phase='search') -> None:
+        """
+        Records a search from its total time and the `stats` dictionary the algorithm filled.
+
+        Args:
+            stats (dict): The algorithm's counters.
+            seconds (float): Time the algorithm call took, path reconstruction included.
+            phase (str): Name of the phase to record the search under.
+        """
+        reconstruct = stats.get('reconstruct_s', 0.0)
+        self.record(phase, seconds - reconstruct)
+        self.record('reconstruct', reconstruct)
+        for name in COUNTERS:
+            if name in stats:
+                self.counters[name] = self.counters.get(name, 0) + stats[name]
+
+    def to_dict(self) -> dict:
+        return {
+            'event': self.event,
+            'timestamp': self.timestamp,
+            **self.fields,
+            'timings_ms': {name: seconds * 1000 for name, seconds in self.timings.items()},
+            'counters': dict(self.counters),
+        }
+
+    def summary(self, phases=None) -> str:
+        """
+        Formats the phase timings on one line, e.g. "search 1.20 ms, reconstruct 0.01 ms".
+
+        Args:
+            phases (list): Phases to include, in order. Defaults to all recorded phases.
+        """
+        names = phases if phases is not None else list(self.timings)
+        return ', '.join(f"{name} {self.timings[name] * 1000:.2f} ms" for name in names if name in self.timings)
+
+
+def phase(stats, name):
+    """
+    Returns `stats.phase(name)`, or a context manager that does nothing when `stats` is None, so callers can time
+    phases only when they were asked to.
+    """
+    return stats.phase(name) if stats is not None else nullcontext()
+
+
+class StatsLog:
+    """
+    Appends `QueryStats` records to a file, one JSON object per line, so slow queries can be found later without
+    a profiler. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def write(self, stats) -> None:
+        line = json.dumps(stats.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,339 @@
+import bisect
+import heapq
+import math
+import threading
+from collections import OrderedDict
+from algorithms import record_stats
+from csr_graph import CSRGraph
+from graph import WALKING_SPEED, csuf_locations
+from overlay import improves
+from spatial import convex_hull, haversine
+
+# Default budget bucket of `IsochroneCache`: half a minute of walking, in meters
+BUCKET_SIZE = 30 * WALKING_SPEED
+
+
+class BoundedSearch:
+    """
+    Dijkstra from one source that settles nodes in order of distance only up to a budget, and can be resumed.
+
+    `extend` stops as soon as the closest node left in the queue is farther than the budget, so a short budget
+    only explores the area around the source. The queue is kept, so extending the same search to a larger budget
+    later continues from where it stopped instead of starting over. Nodes are recorded in the order they are
+    settled, so what is reachable within any budget already searched is a prefix of that order.
+    """
+
+    def __init__(self, graph, source):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        self.graph = graph
+        self.source = source
+
+        # Dictionaries rather than per-node lists, so the cost of a search follows the area it explores
+        start = graph.index[source]
+        self.distances = {start: 0.0}
+        self.previous_nodes = {start: -1}
+        self._queue = [(0.0, start)]
+
+        # Settled node indices and their distances, in settling (nondecreasing distance) order
+        self.settled = []
+        self.settled_distances = []
+
+        # Distance up to which every node has been settled
+        self.radius = 0.0
+
+    def extend(self, max_distance, stats=None) -> None:
+        """
+        Settles every node within `max_distance` of the source that isn't settled yet.
+
+        Args:
+            max_distance (float): Budget in meters.
+            stats (dict): Optional dictionary that receives the counters of this extension only (see
+                `algorithms.record_stats`); all zero when the budget was already searched.
+        """
+        if max_distance <= self.radius:
+            record_stats(stats, 0, 0, 0, 0)
+            return
+
+        offsets, targets, weights = self.graph.offsets, self.graph.targets, self.graph.weights
+        distances, previous_nodes, queue = self.distances, self.previous_nodes, self._queue
+        settled, settled_distances = self.settled, self.settled_distances
+        expanded = pushes = relaxed = 0
+        peak = len(queue)
+
+        # Stop at the first node beyond the budget; it stays queued for the next extension
+        while queue and queue[0][0] <= max_distance:
+            current_distance, current = heapq.heappop(queue)
+            if current_distance > distances[current]:
+                continue
+            settled.append(current)
+            settled_distances.append(current_distance)
+            expanded += 1
+
+            first, last = offsets[current], offsets[current + 1]
+            relaxed += last - first
+            for neighbor, weight in zip(targets[first:last], weights[first:last]):
+                distance = current_distance + weight
+                if distance < distances.get(neighbor, math.inf):
+                    distances[neighbor] = distance
+                    previous_nodes[neighbor] = current
+                    heapq.heappush(queue, (distance, neighbor))
+                    pushes += 1
+            if len(queue) > peak:
+                peak = len(queue)
+
+        # An exhausted queue means everything reachable is settled, whatever the budget
+        self.radius = max_distance if queue else math.inf
+        record_stats(stats, expanded, pushes, relaxed, peak)
+
+    def count(self, max_distance) -> int:
+        """Returns how many settled nodes lie within `max_distance`, extending the search first if needed."""
+        self.extend(max_distance)
+        return bisect.bisect_right(self.settled_distances, max_distance)
+
+    def path(self, node) -> list:
+        """
+        Returns the shortest path from the source to a settled node, as node ids.
+        """
+        ids, previous_nodes = self.graph.ids, self.previous_nodes
+        path = []
+        i = self.graph.index[node]
+        while i != -1:
+            path.append(ids[i])
+            i = previous_nodes[i]
+        path.reverse()
+        return path
+
+    def isochrone(self, max_distance, locations=None, stats=None):
+        """
+        Returns everything reachable within `max_distance`, extending the search first if needed.
+
+        Args:
+            max_distance (float): Budget in meters.
+            locations (iterable): Node ids reported separately as reachable buildings. Defaults to
+                `csuf_locations`.
+            stats (dict): Optional dictionary that receives the counters of the search work this call did.
+
+        Returns:
+            Isochrone: The reachable nodes, locations and area.
+        """
+        self.extend(max_distance, stats)
+        return Isochrone(self, max_distance, locations)
+
+
+class Isochrone:
+    """
+    The part of the walking network reachable from a source within a distance budget.
+
+    Attributes:
+        source: The start node id.
+        max_distance (float): The budget in meters.
+        nodes (dict): Distance in meters of every reachable node, by node id, closest first.
+        locations (dict): Distance in meters of every reachable location (building), by name, closest first.
+    """
+
+    def __init__(self, search, max_distance, locations=None):
+        if locations is None:
+            locations = csuf_locations
+        self.search = search
+        self.source = search.source
+        self.max_distance = max_distance
+
+        ids = search.graph.ids
+        self._count = search.count(max_distance)
+        self.nodes = {ids[i]: distance for i, distance in
+                      zip(search.settled[:self._count], search.settled_distances[:self._count])}
+        self.locations = {node: distance for node, distance in self.nodes.items() if node in locations}
+
+        # Computed on first use, see `points` and `polygon`
+        self._points = None
+        self._polygon = None
+
+    @property
+    def points(self) -> list:
+        """
+        (lat, long) points covering the reachable part of the network: the reachable nodes, the shape points of the
+        edges walked from them and, on edges where the budget runs out part-way, the point where it does. Suited
+        for drawing as a point set.
+        """
+        if self._points is None:
+            self._points = self._collect_points()
+        return self._points
+
+    @property
+    def polygon(self) -> list:
+        """
+        (lat, long) vertices of the convex hull of `points`, to draw the reachable area as one polygon. Being
+        convex, it can cover unreachable pockets between the reachable paths.
+        """
+        if self._polygon is None:
+            self._polygon = convex_hull(self.points)
+        return self._polygon
+
+    def _collect_points(self) -> list:
+        search, graph = self.search, self.search.graph
+        offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+        lats, lons = graph.lats, graph.lons
+
+        # Without edge geometry, every edge is a straight line between its end nodes
+        shape_offsets = graph.geometry_offsets
+        if shape_offsets is None:
+            shape_offsets = [0] * (graph.edge_count + 1)
+        shape_lats, shape_lons = graph.geometry_lats, graph.geometry_lons
+
+        points = []
+        for i, distance in zip(search.settled[:self._count], search.settled_distances[:self._count]):
+            lat, long = lats[i], lons[i]
+            if lat != lat:
+                continue  # NaN: no coordinates
+            points.append((lat, long))
+
+            remaining = self.max_distance - distance
+            for e in range(offsets[i], offsets[i + 1]):
+                weight = weights[e]
+                neighbor = targets[e]
+                first, last = shape_offsets[e], shape_offsets[e + 1]
+                if remaining >= weight:
+                    # The whole edge is walkable; its far end is a reachable node and is added on its own
+                    if first != last:
+                        points.extend(zip(shape_lats[first:last], shape_lons[first:last]))
+                elif lats[neighbor] == lats[neighbor]:
+                    line = [(lat, long)]
+                    if first != last:
+                        line.extend(zip(shape_lats[first:last], shape_lons[first:last]))
+                    line.append((lats[neighbor], lons[neighbor]))
+                    points.extend(_cut_line(line, remaining / weight if weight > 0 else 0.0))
+        return points
+
+
+def _cut_line(line, fraction) -> list:
+    # Points of a (lat, long) polyline from its start up to `fraction` of its length (start point excluded), the
+    # last one interpolated. Edge weights can differ from the drawn length, so the cut is by fraction.
+    lengths = [haversine(*a, *b) for a, b in zip(line, line[1:])]
+    left = fraction * sum(lengths)
+    points = []
+    for (a, b), length in zip(zip(line, line[1:]), lengths):
+        if left >= length:
+            points.append(b)
+            left -= length
+            continue
+        t = left / length if length > 0 else 0.0
+        points.append((a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t))
+        break
+    return points
+
+
+class IsochroneCache:
+    """
+    Isochrones by source and budget bucket, backed by one resumable `BoundedSearch` per source.
+
+    Budgets are rounded up to a multiple of `bucket`, and the isochrone of each (source, bucket) is computed once.
+    A larger bucket for the same source extends that source's search from its current frontier rather than
+    searching again, so dragging a slider from 3 to 10 minutes only settles the nodes between the two, and dragging
+    it back costs nothing. The searches of the least recently used sources are dropped beyond `max_sources`.
+
+    The cache can be shared between threads, e.g. to search off a server's event loop; searches are run one at a
+    time.
+    """
+
+    def __init__(self, graph, bucket=BUCKET_SIZE, max_sources=32, locations=None):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        self.graph = graph
+        self.bucket = bucket
+        self.max_sources = max_sources
+        self.locations = locations
+        self.entries = OrderedDict()  # source -> (BoundedSearch, {bucket number: Isochrone})
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _bucket_number(self, max_distance) -> int:
+        # Rounded first, so e.g. 3 minutes with half-minute buckets isn't pushed into the next bucket by float error
+        return math.ceil(round(max_distance / self.bucket, 9))
+
+    def bucket_distance(self, max_distance) -> float:
+        """Returns the budget `max_distance` is rounded up to."""
+        return self._bucket_number(max_distance) * self.bucket
+
+    def get(self, source, max_distance, stats=None) -> Isochrone:
+        """
+        Returns the isochrone of `source` for `max_distance` rounded up to the bucket size.
+
+        Args:
+            source: The start node id.
+            max_distance (float): Budget in meters.
+            stats (dict): Optional dictionary that receives the counters of the search work this call did.
+
+        Returns:
+            Isochrone: Everything reachable within the bucket's budget.
+        """
+        with self._lock:
+            return self._get(source, max_distance, stats)
+
+    def cached(self, source, max_distance):
+        """
+        Returns the isochrone of `source` for `max_distance` if it was computed already, without searching.
+
+        Returns:
+            Isochrone: The cached isochrone (counted as a hit), or None.
+        """
+        bucket = self._bucket_number(max_distance)
+        with self._lock:
+            entry = self.entries.get(source)
+            if entry is None or bucket not in entry[1]:
+                return None
+            self.entries.move_to_end(source)
+            self.hits += 1
+            return entry[1][bucket]
+
+    def _get(self, source, max_distance, stats):
+        bucket = self._bucket_number(max_distance)
+        entry = self.entries.get(source)
+        if entry is None:
+            entry = (BoundedSearch(self.graph, source), {})
+            self.entries[source] = entry
+            if len(self.entries) > self.max_sources:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(source)
+
+        search, isochrones = entry
+        if bucket in isochrones:
+            self.hits += 1
+            record_stats(stats, 0, 0, 0, 0)
+            return isochrones[bucket]
+
+        self.misses += 1
+        isochrone = isochrones[bucket] = search.isochrone(bucket * self.bucket, self.locations, stats)
+        return isochrone
+
+    def invalidate(self, overlay, changes) -> None:
+        """
+        Drops the searches that edge changes affect, so the next query for those sources starts over. Can be
+        registered as a `GraphOverlay` listener when the cache's graph is the overlay's graph.
+
+        A search is affected by a longer or closed edge it reached a node through, and by a shorter edge out of a
+        node it already reached. Searches that haven't reached an edge yet see its new weight when they get there.
+        """
+        index = self.graph.index
+        edges = [(index[u], index[v]) for u, v in changes]
+        shorter = improves(changes)
+        with self._lock:
+            self._invalidate(edges, shorter)
+
+    def _invalidate(self, edges, shorter) -> None:
+        for source, (search, _) in list(self.entries.items()):
+            if shorter:
+                affected = any(u in search.distances for u, _ in edges)
+            else:
+                affected = any(search.previous_nodes.get(v) == u for u, v in edges)
+            if affected:
+                del self.entries[source]
+
+    def stats(self) -> dict:
+        return {'sources': len(self.entries), 'max_sources': self.max_sources, 'hits': self.hits,
+                'misses': self.misses}
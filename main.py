@@ -1,28 +1,70 @@
-import matplotlib
-matplotlib.use("TkAgg")  # Set TkAgg as the backend for tkinter integration
-from tkinter import ttk  # For Combobox dropdowns
-import tkinter as tk  # GUI library for dropdowns and labels
-import matplotlib.pyplot as plt  # Plotting library
-from matplotlib.widgets import Button  # For algorithm buttons on the map
-from graph import add_csuf_locations, create_graph, csuf_campus_map, add_locations, csuf_locations  # Graph functions and data
-from visualizer import plot_campus, run_algo, on_hover  # Visualization functions
-from algorithms import BFS, DFS, Dijkstra  # Pathfinding algorithms
-
-def main():
+import argparse
+from graph import load_graph, csuf_locations, walking_distance, ROUTE_TABLE_PATH  # Graph functions and data
+from route_table import load_route_table  # Precomputed routes between locations
+from algorithms import BFS, DFS, Dijkstra, AStar, BidirectionalDijkstra  # Pathfinding algorithms
+from startup import PhaseTimer  # Startup timing report
+from instrumentation import QueryStats, StatsLog  # Per-query timings and search counters
+from route_worker import RouteWorker  # Background search process
+from isochrone import IsochroneCache  # Areas reachable within a walking time
+from overlay import GraphOverlay, load_closures  # Closed and reweighted paths
+
+def main(refresh=False, startup_report=False, stats_log=None, closures=None):
     """
     Main function to run the CSUF campus navigation program. It initializes the map, sets up the graph with custom
     locations, configures the GUI for selecting start and end points, and creates buttons for running algorithms.
+
+    The GUI libraries are imported here rather than at the top of the module, so importing `main` (or anything it
+    imports) doesn't load matplotlib with the TkAgg backend or need a display.
+
+    Args:
+        refresh (bool): Rebuild the graph snapshot from OSM instead of loading it from disk.
+        startup_report (bool): Print how long each startup phase took before showing the window.
+        stats_log (str): JSON-lines file that receives the startup timings and every query's timings and search
+            counters.
+        closures (str): JSON file of closed or reweighted paths (see `overlay.load_closures`) to route around.
     """
-    # Step 1: Add custom CSUF-specific locations to the map graph
-    add_csuf_locations()
+    timer = PhaseTimer()
+    startup = QueryStats('startup', program='main')
+    stats_log = StatsLog(stats_log) if stats_log else None
+
+    # Step 0: Load the GUI libraries
+    with timer.phase("import matplotlib/tkinter"):
+        import matplotlib
+        matplotlib.use("TkAgg")  # Set TkAgg as the backend for tkinter integration
+        from tkinter import ttk  # For Combobox dropdowns
+        import tkinter as tk  # GUI library for dropdowns and labels
+        import matplotlib.pyplot as plt  # Plotting library
+        from matplotlib.widgets import Button, Slider  # For algorithm buttons and the walking time slider
+    with timer.phase("import visualizer"):
+        from visualizer import (SearchController, plot_campus, plot_isochrone, on_hover,  # Visualization functions
+                                run_tour)
+        from projection import projected  # Node positions in the map's projection
+
+    # Step 1: Load the graph structure with custom locations (from the snapshot when it is up to date; the OSM map
+    # is only downloaded when the snapshot has to be rebuilt)
+    with timer.phase("load graph"):
+        graph = load_graph(refresh=refresh, stats=startup)
+    with timer.phase("load route table"):
+        route_table = load_route_table(graph, csuf_locations, ROUTE_TABLE_PATH, refresh=refresh)
+
+    # Closures are applied on top of the loaded graph, which stays untouched (and keeps the route table valid); the
+    # route table then only answers the routes the closures can't affect
+    overlay = None
+    if closures:
+        with timer.phase("load closures"):
+            overlay = GraphOverlay(graph)
+            overlay.subscribe(route_table.apply_overlay)
+            load_closures(overlay, closures)
+            graph = overlay.graph
+    with timer.phase("project graph"):
+        projected(graph)  # Map positions of every node, so drawing a route doesn't reproject anything
 
     # Step 2: Plot the campus map with only the main nodes (locations) and background
-    fig, ax, campus_locations = plot_campus()
+    with timer.phase("plot campus"):
+        fig, ax, campus_locations = plot_campus(graph)
 
-    # Step 3: Create the graph structure from the map and add custom locations
-    graph = create_graph(csuf_campus_map)  # Converts the map to a graph structure
-    add_locations(graph)  # Adds custom locations (like buildings) to the graph
-    on_hover(fig, ax, csuf_locations)  # Enables hover functionality for node names
+    # Step 3: Enable hover functionality for node names
+    on_hover(fig, ax, csuf_locations)
 
     # Step 4: Set up the dropdowns using tkinter's Combobox
     root = fig.canvas.manager.window  # Access the tkinter root window
@@ -44,24 +86,94 @@ def main():
     end_dropdown = ttk.Combobox(tk_frame, values=location_options)
     end_dropdown.pack(side=tk.LEFT)
 
+    # Multi-stop tours: the start location, then every stop added from the end dropdown, in the best order
+    tour_stops = []
+    stops_label = tk.Label(tk_frame, text="Stops: 0")
+
+    def add_stop():
+        stop = end_dropdown.get()
+        if stop in csuf_locations and stop not in tour_stops:
+            tour_stops.append(stop)
+            stops_label.config(text=f"Stops: {len(tour_stops)}")
+
+    def clear_stops():
+        tour_stops.clear()
+        stops_label.config(text="Stops: 0")
+
+    tk.Button(tk_frame, text="Add stop", command=add_stop).pack(side=tk.LEFT)
+    stops_label.pack(side=tk.LEFT)
+    tk.Button(tk_frame, text="Plan tour", command=lambda: run_tour(graph, [start_dropdown.get()] + tour_stops, ax,
+                                                                  route_table, stats_log)).pack(side=tk.LEFT)
+    tk.Button(tk_frame, text="Clear stops", command=clear_stops).pack(side=tk.LEFT)
+
     # Step 5: Set up buttons using matplotlib widgets for the algorithms
     bfs_ax = plt.axes([0.0350, 0.005, 0.11, 0.1])  # Define position for BFS button
     dfs_ax = plt.axes([0.155, 0.005, 0.11, 0.1])   # Define position for DFS button
     dijkstra_ax = plt.axes([0.275, 0.005, 0.11, 0.1])  # Define position for Dijkstra's button
+    astar_ax = plt.axes([0.395, 0.005, 0.11, 0.1])  # Define position for A* button
+    bidirectional_ax = plt.axes([0.515, 0.005, 0.11, 0.1])  # Define position for bidirectional Dijkstra's button
+
+    # Searches run in a background process, so the window stays responsive while they run; results are picked up
+    # by polling the worker with tkinter's `after`
+    worker = RouteWorker(overlay=overlay)
+    worker.start()
+    fig.canvas.mpl_connect('close_event', lambda event: worker.close())
+    searches = SearchController(graph, ax, worker, route_table, schedule=root.after, stats_log=stats_log)
 
     # Button actions for each algorithm using selected dropdown values
     bfs_button = Button(bfs_ax, 'Run BFS')
-    bfs_button.on_clicked(lambda event: run_algo(graph, BFS, start_dropdown.get(), end_dropdown.get(), fig, ax))
+    bfs_button.on_clicked(lambda event: searches.run(BFS, start_dropdown.get(), end_dropdown.get()))
 
     dfs_button = Button(dfs_ax, 'Run DFS')
-    dfs_button.on_clicked(lambda event: run_algo(graph, DFS, start_dropdown.get(), end_dropdown.get(), fig, ax))
+    dfs_button.on_clicked(lambda event: searches.run(DFS, start_dropdown.get(), end_dropdown.get()))
 
     dijkstra_button = Button(dijkstra_ax, 'Run Dijkstras')
-    dijkstra_button.on_clicked(lambda event: run_algo(graph, Dijkstra, start_dropdown.get(), end_dropdown.get(), fig, ax))
+    dijkstra_button.on_clicked(lambda event: searches.run(Dijkstra, start_dropdown.get(), end_dropdown.get()))
+
+    astar_button = Button(astar_ax, 'Run A*')
+    astar_button.on_clicked(lambda event: searches.run(AStar, start_dropdown.get(), end_dropdown.get()))
+
+    bidirectional_button = Button(bidirectional_ax, 'Run Bi-Dijkstra')
+    bidirectional_button.on_clicked(lambda event: searches.run(BidirectionalDijkstra, start_dropdown.get(),
+                                                               end_dropdown.get()))
+
+    # Step 6: Walking time slider, shading everything reachable from the start location within that time. Each
+    # start location's search is kept, so moving the slider further only explores the newly reachable nodes.
+    isochrones = IsochroneCache(graph)
+    if overlay is not None:
+        overlay.subscribe(isochrones.invalidate)
+    walk_ax = plt.axes([0.70, 0.04, 0.22, 0.03])
+    walk_slider = Slider(walk_ax, 'Walk (min)', 0, 15, valinit=0, valstep=0.5)
+
+    def show_isochrone(*_):
+        start = start_dropdown.get()
+        if walk_slider.val <= 0 or start not in graph:
+            plot_isochrone(None, ax)
+        else:
+            plot_isochrone(isochrones.get(start, walking_distance(walk_slider.val)), ax)
+
+    walk_slider.on_changed(show_isochrone)
+    start_dropdown.bind('<<ComboboxSelected>>', show_isochrone)
+
+    if startup_report:
+        print(timer.report())
+    if stats_log is not None:
+        for name, seconds in timer.phases:
+            startup.record(name, seconds)
+        stats_log.write(startup)
 
     # Display the plot, integrating the matplotlib plot with tkinter widgets
     plt.show()
+    if stats_log is not None:
+        stats_log.close()
 
 # Run the main function when this script is executed
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="CSUF campus navigation.")
+    parser.add_argument('--refresh', action='store_true', help="rebuild the graph snapshot from OSM")
+    parser.add_argument('--startup-report', action='store_true', help="print how long each startup phase took")
+    parser.add_argument('--stats-log', help="append startup and per-query timings and search counters to this "
+                                            "JSON-lines file")
+    parser.add_argument('--closures', help="JSON file of closed or reweighted paths to route around")
+    args = parser.parse_args()
+    main(refresh=args.refresh, startup_report=args.startup_report, stats_log=args.stats_log, closures=args.closures)
@@ -0,0 +1,344 @@
+import bisect
+import json
+import math
+import os
+from array import array
+from algorithms import lower_heuristic_scale
+from csr_graph import CSRGraph, table_bytes
+
+
+def _copy_table(values, typecode) -> array:
+    # Writable copy of a (possibly memory-mapped, read-only) table, copied as raw bytes
+    copy = array(typecode)
+    copy.frombytes(table_bytes(values, typecode))
+    return copy
+
+
+class GraphOverlay:
+    """
+    Closures and weight changes applied to a routing graph at runtime, leaving the base graph untouched.
+
+    `graph` is a `CSRGraph` that shares the node tables of the base graph but has its own copy of the edge
+    weights and targets, patched in place on every change. A closed edge is turned into a self-loop of infinite
+    weight: every search already skips edges back to the node being expanded and never relaxes an infinite edge,
+    so closures cost nothing per query and searches on `graph` run exactly as fast as on the base graph. The
+    reversed graph used by bidirectional searches is patched the same way.
+
+    Changes are kept in three layers (closed edges, reweighted edges, closed nodes), so reopening an edge restores
+    whatever still applies to it, e.g. a reweight under a lifted closure. `overrides` holds the resulting weight of
+    every edge that differs from the base (infinite when closed), which is all another process needs to reproduce
+    the overlay with `set_overrides`.
+
+    Listeners registered with `subscribe` are called after every change with the overlay and the changed edges,
+    as a dictionary of (from node id, to node id): (old weight, new weight), so caches can drop just the results
+    that used those edges.
+    """
+
+    def __init__(self, base):
+        if not isinstance(base, CSRGraph):
+            base = CSRGraph.from_dict(base)
+        self.base = base
+        self.graph = CSRGraph(base.ids, base.offsets, _copy_table(base.targets, 'i'),
+                              _copy_table(base.weights, 'd'), base.lats, base.lons, base.names, buffer=base.buffer,
+                              geometry_offsets=base.geometry_offsets, geometry_lats=base.geometry_lats,
+                              geometry_lons=base.geometry_lons)
+
+        base_reverse = base.reverse()
+        self.graph._reverse = CSRGraph(base.ids, base_reverse.offsets, _copy_table(base_reverse.targets, 'i'),
+                                       _copy_table(base_reverse.weights, 'd'), base.lats, base.lons, base.names)
+        self.graph._reverse._reverse = self.graph
+
+        self.overrides = {}  # edge index -> weight, for every edge whose weight differs from the base
+        self.version = 0
+        self.listeners = []
+
+        self._closed_edges = set()  # edge indices
+        self._reweighted = {}  # edge index -> weight
+        self._closed_nodes = set()  # node indices
+        self._reverse_slots = {}  # edge index -> position of the same edge in the reversed graph
+
+    def subscribe(self, listener) -> None:
+        """
+        Registers `listener(overlay, changes)` to be called after every change.
+        """
+        self.listeners.append(listener)
+
+    def close_edge(self, u, v, both_ways=True) -> dict:
+        """
+        Closes the edge from node `u` to node `v` (and from `v` to `u` unless `both_ways` is False).
+
+        Returns:
+            dict: The edges whose weight changed, see the class description.
+        """
+        edges = self._edges(u, v, both_ways)
+        self._closed_edges.update(e for e, _ in edges)
+        return self._refresh(edges)
+
+    def reweight_edge(self, u, v, weight, both_ways=True) -> dict:
+        """
+        Sets the length of the edge from node `u` to node `v` (and back unless `both_ways` is False), e.g. to
+        steer routes away from a crowded walkway without closing it.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        if not weight >= 0:
+            raise ValueError(f"Edge weights must be non-negative, got {weight}.")
+        edges = self._edges(u, v, both_ways)
+        for e, _ in edges:
+            self._reweighted[e] = weight
+        return self._refresh(edges)
+
+    def reopen_edge(self, u, v, both_ways=True) -> dict:
+        """
+        Lifts closures and weight changes of the edge from `u` to `v` (and back unless `both_ways` is False).
+        Edges of a closed node stay closed until the node is reopened.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        edges = self._edges(u, v, both_ways)
+        for e, _ in edges:
+            self._closed_edges.discard(e)
+            self._reweighted.pop(e, None)
+        return self._refresh(edges)
+
+    def close_node(self, node) -> dict:
+        """
+        Closes every edge into and out of a node.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        i = self._index(node)
+        self._closed_nodes.add(i)
+        return self._refresh(self._node_edges(i))
+
+    def reopen_node(self, node) -> dict:
+        """
+        Lifts a node closure.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        i = self._index(node)
+        self._closed_nodes.discard(i)
+        return self._refresh(self._node_edges(i))
+
+    def clear(self) -> dict:
+        """
+        Lifts every closure and weight change, restoring the base graph's weights.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        edges = [(e, self._source(e)) for e in self.overrides]
+        self._closed_edges.clear()
+        self._reweighted.clear()
+        self._closed_nodes.clear()
+        return self._refresh(edges)
+
+    def set_overrides(self, overrides) -> dict:
+        """
+        Makes the overlay match another overlay's `overrides` (e.g. in a worker process that maps the same graph
+        snapshot), replacing all changes made so far.
+
+        Returns:
+            dict: The edges whose weight changed.
+        """
+        edges = [(e, self._source(e)) for e in set(self.overrides) | set(overrides)]
+        self._closed_nodes.clear()
+        self._closed_edges = {e for e, weight in overrides.items() if weight == math.inf}
+        self._reweighted = {e: weight for e, weight in overrides.items() if weight != math.inf}
+        return self._refresh(edges)
+
+    def overridden_edges(self):
+        """
+        Yields (source index, target index, base weight, weight) for every edge whose weight differs from the base.
+        """
+        base = self.base
+        for e, weight in self.overrides.items():
+            yield self._source(e), base.targets[e], base.weights[e], weight
+
+    def _index(self, node) -> int:
+        if node not in self.base.index:
+            raise KeyError(f"Unknown node '{node}'.")
+        return self.base.index[node]
+
+    def _source(self, e) -> int:
+        # Node index the edge at index `e` leaves from: the last row whose offset is at most `e`
+        return bisect.bisect_right(self.base.offsets, e) - 1
+
+    def _edges(self, u, v, both_ways) -> list:
+        # (edge index, source index) of the base edges u -> v (and v -> u)
+        pairs = [(self._index(u), self._index(v))]
+        if both_ways:
+            pairs.append(pairs[0][::-1])
+
+        offsets, targets = self.base.offsets, self.base.targets
+        edges = [(e, i) for i, j in pairs for e in range(offsets[i], offsets[i + 1]) if targets[e] == j]
+        if not edges:
+            raise KeyError(f"No edge between '{u}' and '{v}'.")
+        return edges
+
+    def _node_edges(self, i) -> list:
+        # (edge index, source index) of every base edge out of and into node index i
+        base = self.base
+        offsets, targets = base.offsets, base.targets
+        edges = [(e, i) for e in range(offsets[i], offsets[i + 1])]
+        reverse = base.reverse()
+        for slot in range(reverse.offsets[i], reverse.offsets[i + 1]):
+            source = reverse.targets[slot]
+            edges.extend((e, source) for e in range(offsets[source], offsets[source + 1]) if targets[e] == i)
+        return edges
+
+    def _reverse_slot(self, e, source) -> int:
+        # Position of edge e (source -> target) in the row of its target in the reversed graph
+        slot = self._reverse_slots.get(e)
+        if slot is None:
+            base, reverse = self.base, self.base.reverse()
+            target, weight = base.targets[e], base.weights[e]
+            taken = set(self._reverse_slots.values())
+            for candidate in range(reverse.offsets[target], reverse.offsets[target + 1]):
+                # Parallel edges are told apart by their weight and by the slots already matched
+                if (reverse.targets[candidate] == source and reverse.weights[candidate] == weight
+                        and candidate not in taken):
+                    slot = candidate
+                    break
+            self._reverse_slots[e] = slot
+        return slot
+
+    def _weight(self, e, source) -> float:
+        # Weight of edge e once every layer is applied
+        if e in self._closed_edges or source in self._closed_nodes or self.base.targets[e] in self._closed_nodes:
+            return math.inf
+        return self._reweighted.get(e, self.base.weights[e])
+
+    def _refresh(self, edges) -> dict:
+        # Patch the edges whose resulting weight changed and tell the listeners
+        base, graph = self.base, self.graph
+        reverse = graph._reverse
+        ids = base.ids
+        changes = {}
+        shortened = []
+        for e, source in edges:
+            weight = self._weight(e, source)
+            old = graph.weights[e]
+            if weight == old:
+                continue
+
+            # A closed edge loops back to the node it leaves, in both directions
+            target = base.targets[e]
+            slot = self._reverse_slot(e, source)
+            graph.weights[e] = reverse.weights[slot] = weight
+            graph.targets[e] = source if weight == math.inf else target
+            reverse.targets[slot] = target if weight == math.inf else source
+
+            if weight == base.weights[e]:
+                self.overrides.pop(e, None)
+            else:
+                self.overrides[e] = weight
+            changes[ids[source], ids[target]] = (old, weight)
+            if weight < old:
+                shortened.append((source, target, weight))
+
+        if changes:
+            self.version += 1
+            # Values derived from the old weights. The A* scale stays valid for longer and closed edges, and is
+            # lowered just enough for shorter ones, so queries right after a change run as fast as before.
+            graph._fingerprint = None
+            lower_heuristic_scale(graph, shortened)
+            for listener in self.listeners:
+                listener(self, changes)
+        return changes
+
+
+def improves(changes) -> bool:
+    """
+    Tells whether any change made an edge shorter (including reopening one). Shorter edges can improve routes that
+    never used them, so caches can only be invalidated selectively for changes that make edges longer or close them.
+    """
+    return any(new < old for old, new in changes.values())
+
+
+# ----------------------
+# Function: apply_closures
+# ----------------------
+def apply_closures(overlay, closures) -> dict:
+    """
+    Applies a set of closures given as a JSON-style object, such as the contents of a closures file or the body of
+    a request to the routing service.
+
+    The object has an optional 'clear' flag, which lifts every change made so far before the rest is applied, and
+    optional 'edges', 'nodes' and 'reopen_nodes' lists. Each edge is an object with 'from' and 'to' node ids, an
+    optional 'weight' (the edge is closed without one), an optional 'reopen' flag (which lifts the edge's changes
+    instead) and an optional 'both_ways' flag (default true). 'nodes' lists node ids to close and 'reopen_nodes'
+    node ids to reopen. Changes are applied in that order; if one fails, those before it stay applied.
+
+    Args:
+        overlay (GraphOverlay): The overlay to apply the closures to.
+        closures (dict): The closures.
+
+    Returns:
+        dict: The edges whose weight changed, see `GraphOverlay`.
+
+    Raises:
+        KeyError: If a node or edge is not in the graph.
+        ValueError: If a weight is negative.
+    """
+    changes = {}
+    if closures.get('clear'):
+        changes.update(overlay.clear())
+    for edge in closures.get('edges', []):
+        both_ways = edge.get('both_ways', True)
+        if edge.get('reopen'):
+            changed = overlay.reopen_edge(edge['from'], edge['to'], both_ways)
+        elif 'weight' in edge:
+            changed = overlay.reweight_edge(edge['from'], edge['to'], edge['weight'], both_ways)
+        else:
+            changed = overlay.close_edge(edge['from'], edge['to'], both_ways)
+        changes.update(changed)
+    for node in closures.get('nodes', []):
+        changes.update(overlay.close_node(node))
+    for node in closures.get('reopen_nodes', []):
+        changes.update(overlay.reopen_node(node))
+    return changes
+
+
+# ----------------------
+# Function: load_closures
+# ----------------------
+def load_closures(overlay, path) -> None:
+    """
+    Applies the closures listed in a JSON file, e.g. this week's construction work. See `apply_closures` for the
+    format.
+
+    Args:
+        overlay (GraphOverlay): The overlay to apply the closures to.
+        path (str): The JSON file.
+    """
+    with open(path, encoding='utf-8') as f:
+        apply_closures(overlay, json.load(f))
+
+
+def save_overrides(overlay, path) -> None:
+    """
+    Writes an overlay's version and `overrides` to a file, replacing it atomically, so other processes mapping the
+    same graph snapshot can catch up with `read_overrides` and `GraphOverlay.set_overrides`.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': overlay.version, 'overrides': list(overlay.overrides.items())}, f)
+    os.replace(tmp_path, path)
+
+
+def read_overrides(path) -> tuple:
+    """
+    Reads a file written by `save_overrides`.
+
+    Returns:
+        tuple: The overlay version and its overrides, as a dictionary of edge index to weight.
+    """
+    with open(path, encoding='utf-8') as f:
+        saved = json.load(f)
+    return saved['version'], {e: weight for e, weight in saved['overrides']}
@@ -0,0 +1,241 @@
+import logging
+import math
+from algorithms import shortest_path_tree
+from csr_graph import CSRGraph
+from instrumentation import phase
+
+logger = logging.getLogger(__name__)
+
+# Largest number of stops whose visiting order is found exactly (Held-Karp); larger sets use nearest neighbor
+# followed by 2-opt. Held-Karp's time grows as 2^n * n^2, and 12 stops still take a fraction of a second.
+EXACT_LIMIT = 12
+
+
+class StopMatrix:
+    """
+    Shortest distances between every pair of stops, with the routes behind them.
+
+    Built with one single-source search per stop, each stopping once all the other stops are settled, instead of
+    one search per pair. When every stop is a row of a precomputed `RouteTable`, the table is used and nothing is
+    searched.
+    """
+
+    def __init__(self, graph, stops, route_table=None):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        self.graph = graph
+        self.stops = list(stops)
+        self.route_table = None
+        self._trees = None
+
+        # Every stop must be a valid table row (one not made stale by closures) as well as a column
+        if route_table is not None and all((stop, stop) in route_table for stop in self.stops):
+            self.route_table = route_table
+            size = len(route_table.locations)
+            rows = [route_table.rows[stop] for stop in self.stops]
+            self.distances = [[route_table.distances[row * size + column] for column in rows] for row in rows]
+        else:
+            columns = [graph.index[stop] for stop in self.stops]
+            self._trees = []
+            self.distances = []
+            for stop in self.stops:
+                tree_distances, tree_previous = shortest_path_tree(graph, stop, targets=self.stops)
+                self._trees.append(tree_previous)
+                self.distances.append([tree_distances.get(column, math.inf) for column in columns])
+
+    def path(self, i, j) -> list:
+        """
+        Returns the route from stop `i` to stop `j` (positions in `stops`) as node ids, or None if there is none.
+        """
+        if self.distances[i][j] == math.inf:
+            return None
+        if self.route_table is not None:
+            return self.route_table.lookup(self.stops[i], self.stops[j])[1]
+
+        # Walk up stop i's shortest-path tree from stop j
+        graph, previous_nodes = self.graph, self._trees[i]
+        node = graph.index[self.stops[j]]
+        path = []
+        while node != -1:
+            path.append(graph.ids[node])
+            node = previous_nodes[node]
+        path.reverse()
+        return path
+
+
+def tour_length(distances, order, round_trip=False) -> float:
+    """
+    Returns the length of visiting stops in `order` (positions in the distance matrix), back to the first stop when
+    `round_trip` is set.
+    """
+    length = sum((distances[a][b] for a, b in zip(order, order[1:])), 0.0)
+    if round_trip and len(order) > 1:
+        length += distances[order[-1]][order[0]]
+    return length
+
+
+# ----------------------
+# Function: held_karp
+# ----------------------
+def held_karp(distances, round_trip=False, keep_last=False) -> list:
+    """
+    Finds the shortest visiting order exactly with the Held-Karp dynamic program.
+
+    The first stop is always the start. Distances may be asymmetric (one-way paths).
+
+    Args:
+        distances (list): Square matrix of distances between stops.
+        round_trip (bool): Return to the first stop at the end.
+        keep_last (bool): Keep the last stop as the end of the route.
+
+    Returns:
+        list: Stop positions in visiting order.
+    """
+    n = len(distances)
+    last = n - 1 if keep_last and n > 1 else None
+    middle = [stop for stop in range(1, n) if stop != last]
+    m = len(middle)
+    if m == 0:
+        return [0] if last is None else [0, last]
+
+    # best[mask][k]: shortest route from the start through the middle stops in `mask`, ending at middle[k]
+    inf = math.inf
+    best = [[inf] * m for _ in range(1 << m)]
+    parent = [[-1] * m for _ in range(1 << m)]
+    for k in range(m):
+        best[1 << k][k] = distances[0][middle[k]]
+
+    for mask in range(1, 1 << m):
+        row = best[mask]
+        for k in range(m):
+            length = row[k]
+            if length == inf:
+                continue
+            from_row = distances[middle[k]]
+            for j in range(m):
+                bit = 1 << j
+                if mask & bit:
+                    continue
+                candidate = length + from_row[middle[j]]
+                if candidate < best[mask | bit][j]:
+                    best[mask | bit][j] = candidate
+                    parent[mask | bit][j] = k
+
+    # Close the route: to the fixed last stop, back to the start, or nowhere
+    full = (1 << m) - 1
+    end = last if last is not None else (0 if round_trip else None)
+    closing = [best[full][k] + (distances[middle[k]][end] if end is not None else 0.0) for k in range(m)]
+    k = min(range(m), key=closing.__getitem__)
+
+    order = []
+    mask = full
+    while k != -1:
+        order.append(middle[k])
+        k, mask = parent[mask][k], mask & ~(1 << k)
+    order.append(0)
+    order.reverse()
+    if last is not None:
+        order.append(last)
+    return order
+
+
+# ----------------------
+# Function: nearest_neighbor_2opt
+# ----------------------
+def nearest_neighbor_2opt(distances, round_trip=False, keep_last=False) -> list:
+    """
+    Finds a good visiting order quickly: a nearest-neighbor route from the first stop, improved with 2-opt moves
+    (reversing a stretch of the route) until no move shortens it.
+
+    Args:
+        distances (list): Square matrix of distances between stops.
+        round_trip (bool): Return to the first stop at the end.
+        keep_last (bool): Keep the last stop as the end of the route.
+
+    Returns:
+        list: Stop positions in visiting order.
+    """
+    n = len(distances)
+    last = n - 1 if keep_last and n > 1 else None
+
+    # Nearest neighbor: always walk to the closest stop not visited yet
+    order = [0]
+    remaining = {stop for stop in range(1, n) if stop != last}
+    while remaining:
+        row = distances[order[-1]]
+        stop = min(remaining, key=row.__getitem__)
+        order.append(stop)
+        remaining.discard(stop)
+    if last is not None:
+        order.append(last)
+
+    # 2-opt: reverse order[i:j + 1] whenever that shortens the route. Distances may be asymmetric, so a reversal
+    # also changes the length of the reversed stretch and each candidate is measured in full.
+    end = len(order) - 2 if last is not None else len(order) - 1
+    length = tour_length(distances, order, round_trip)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, end):
+            for j in range(i + 1, end + 1):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                candidate_length = tour_length(distances, candidate, round_trip)
+                if candidate_length < length - 1e-9:
+                    order, length, improved = candidate, candidate_length, True
+    return order
+
+
+# ----------------------
+# Function: plan_route
+# ----------------------
+def plan_route(graph, stops, ordered=False, round_trip=False, keep_last=False, route_table=None, stats=None):
+    """
+    Plans one route through several stops (e.g. `csuf_locations` names), starting at the first.
+
+    Args:
+        graph (CSRGraph | dict): The routing graph.
+        stops (iterable): Node ids to visit. Repeated stops are only visited once unless `ordered` is set.
+        ordered (bool): Visit the stops in the given order instead of looking for the shortest order.
+        round_trip (bool): Return to the first stop at the end.
+        keep_last (bool): End at the last stop given, e.g. where the day ends.
+        route_table (RouteTable): Precomputed location routes, used instead of searching when it covers every stop.
+        stats (QueryStats): Optional record that receives the time of each phase ('matrix', 'order' and 'stitch').
+
+    Returns:
+        tuple: Total distance, the stops in visiting order and the full path through them, or (None, None, None)
+        if a stop is unknown or can't be reached.
+    """
+    stops = list(stops) if ordered else list(dict.fromkeys(stops))
+    for stop in stops:
+        if stop not in graph:
+            logger.warning("Stop '%s' not in graph.", stop)
+            return None, None, None
+    if not stops:
+        return None, None, None
+
+    with phase(stats, 'matrix'):
+        matrix = StopMatrix(graph, stops, route_table)
+    distances = matrix.distances
+
+    with phase(stats, 'order'):
+        if ordered:
+            order = list(range(len(stops)))
+            if round_trip and len(stops) > 1:
+                order.append(0)
+        else:
+            solve = held_karp if len(stops) <= EXACT_LIMIT else nearest_neighbor_2opt
+            order = solve(distances, round_trip, keep_last)
+            if round_trip and len(stops) > 1:
+                order.append(order[0])
+
+    dist = tour_length(distances, order)
+    if dist == math.inf:
+        logger.warning("No route through all stops.")
+        return None, None, None
+
+    # Join the legs, dropping the first node of each leg since it ends the previous one
+    with phase(stats, 'stitch'):
+        path = [stops[order[0]]]
+        for a, b in zip(order, order[1:]):
+            path.extend(matrix.path(a, b)[1:])
+    return dist, [stops[i] for i in order], path
@@ -0,0 +1,121 @@
+import numpy as np
+from csr_graph import CSRGraph
+
+# Lat/long to Web Mercator (the map's projection) transformer, created on first use since pyproj is slow to import
+_transformer = None
+
+# Projection of the most recently projected graph, see `projected`
+_projection = None
+
+
+def get_transformer():
+    global _transformer
+    if _transformer is None:
+        from pyproj import Transformer
+        _transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
+    return _transformer
+
+
+def to_web_mercator(lats, lons) -> tuple:
+    """
+    Projects (lat, long) coordinates to Web Mercator with a single vectorized transform.
+
+    Args:
+        lats (sequence): Latitudes in degrees. NaN marks a missing coordinate and stays NaN.
+        lons (sequence): Longitudes in degrees.
+
+    Returns:
+        tuple: x and y float arrays in meters.
+    """
+    xs, ys = get_transformer().transform(np.asarray(lons, dtype=float), np.asarray(lats, dtype=float))
+    return np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+
+
+class ProjectedGraph:
+    """
+    Web Mercator positions of every node of a graph, and of the shape points of its edges, projected once.
+
+    `xs` and `ys` are indexed like the node tables of a `CSRGraph` (or in iteration order for a graph dictionary),
+    so looking up the map positions of a path is an array gather instead of a reprojection. The shape points of the
+    edges (see `CSRGraph.edge_geometry`) follow the nodes in `xs` and `ys`, so a path is drawn with the full curve of
+    every footpath, even where `contract_chains` merged its intermediate nodes away.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        self.csr = graph
+        self.index = graph.index
+        lats, lons = graph.lats, graph.lons
+        if graph.geometry_offsets is not None:
+            # Nodes first, then the shape points of every edge in edge order
+            lats = np.concatenate((np.asarray(lats, dtype=float), np.asarray(graph.geometry_lats, dtype=float)))
+            lons = np.concatenate((np.asarray(lons, dtype=float), np.asarray(graph.geometry_lons, dtype=float)))
+        self.xs, self.ys = to_web_mercator(lats, lons)
+
+    def position(self, node) -> tuple:
+        """Returns the (x, y) map position of a node, NaN if it has no coordinates."""
+        i = self.index[node]
+        return self.xs[i], self.ys[i]
+
+    def _edge_points(self, i, j) -> range:
+        # Positions in `xs`/`ys` of the shape points of the shortest edge from node index i to node index j
+        graph = self.csr
+        targets, weights = graph.targets, graph.weights
+        edge = None
+        for e in range(graph.offsets[i], graph.offsets[i + 1]):
+            if targets[e] == j and (edge is None or weights[e] < weights[edge]):
+                edge = e
+        if edge is None:
+            return range(0)
+        n = len(graph.ids)
+        return range(n + graph.geometry_offsets[edge], n + graph.geometry_offsets[edge + 1])
+
+    def positions(self, nodes) -> tuple:
+        """
+        Gathers the map positions of some nodes, skipping nodes without coordinates.
+
+        Returns:
+            tuple: x and y float arrays.
+        """
+        indices = np.fromiter((self.index[node] for node in nodes), dtype=np.intp, count=len(nodes))
+        return self._gather(indices)
+
+    def path(self, path) -> tuple:
+        """
+        Gathers the map positions along a path: its nodes and the shape points of the edges between them, skipping
+        nodes without coordinates.
+
+        Returns:
+            tuple: x and y float arrays.
+        """
+        if self.csr.geometry_offsets is None or len(path) < 2:
+            return self.positions(path)
+        index = self.index
+        positions = []
+        i = index[path[0]]
+        for node in path[1:]:
+            j = index[node]
+            positions.append(i)
+            positions.extend(self._edge_points(i, j))
+            i = j
+        positions.append(i)
+        return self._gather(np.array(positions, dtype=np.intp))
+
+    def _gather(self, indices) -> tuple:
+        xs, ys = self.xs[indices], self.ys[indices]
+        valid = ~np.isnan(xs)
+        if not valid.all():
+            xs, ys = xs[valid], ys[valid]
+        return xs, ys
+
+
+def projected(graph) -> ProjectedGraph:
+    """
+    Returns the projection of a graph, projecting it on the first call for that graph.
+    """
+    global _projection
+    if _projection is None or _projection.graph is not graph:
+        _projection = ProjectedGraph(graph)
+    return _projection
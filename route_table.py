@@ -0,0 +1,262 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+from array import array
+from algorithms import shortest_path_tree
+from csr_graph import CSRGraph
+from snapshot import BYTE_ORDER, map_tables, read_json_table, tables_size, write_tables
+
+# Bump whenever the on-disk layout below changes so old tables are rebuilt
+ROUTE_TABLE_VERSION = 1
+MAGIC = b'CSUFRTBL'
+
+# Header layout: magic, version, byte order flag, cache key, location count, node count, name table size
+HEADER = struct.Struct('<8sII32sQQQ')
+
+# ------------------------------------------------------------------
+# File layout (every section starts on an 8-byte boundary):
+#
+#   header
+#   distances     float64[location_count * location_count]   row-major, distances[i * k + j] = i -> j
+#   predecessors  int32[location_count * node_count]         one shortest-path tree per source location
+#   table         UTF-8 JSON                                  location names, in row order
+# ------------------------------------------------------------------
+
+
+def route_table_key(graph, locations) -> bytes:
+    """
+    Computes the cache key of a route table from the graph contents and the list of locations.
+
+    Args:
+        graph (CSRGraph): The routing graph the table was computed on.
+        locations (iterable): Location names used as table rows and columns.
+
+    Returns:
+        bytes: A 32-byte SHA-256 digest.
+    """
+    digest = hashlib.sha256(graph.fingerprint())
+    digest.update(json.dumps(list(locations)).encode('utf-8'))
+    return digest.digest()
+
+
+class RouteTable:
+    """
+    Precomputed shortest routes between every pair of locations.
+
+    Built with one single-source Dijkstra search per location. The table keeps the location-to-location distance
+    matrix and the predecessor array of each search, so a query is a matrix lookup plus a walk up one
+    shortest-path tree.
+    """
+
+    def __init__(self, graph, locations, distances, predecessors, buffer=None):
+        self.graph = graph
+        self.locations = list(locations)
+        self.rows = {name: i for i, name in enumerate(self.locations)}
+        self.distances = distances
+        self.predecessors = predecessors
+
+        # Object owning the memory behind the tables (e.g. an mmap), kept alive with the table
+        self.buffer = buffer
+
+        # Rows (start locations) whose routes a `GraphOverlay` may have changed, see `apply_overlay`
+        self.stale_rows = set()
+        self._route_nodes = {}  # row -> node indices on the row's routes to the other locations, built on demand
+
+    @classmethod
+    def build(cls, graph, locations):
+        """
+        Runs one shortest-path tree search from each location.
+
+        Args:
+            graph (CSRGraph | dict): The routing graph.
+            locations (iterable): Names of location nodes in the graph.
+
+        Returns:
+            RouteTable: The computed table.
+        """
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+
+        locations = list(locations)
+        columns = [graph.index[name] for name in locations]
+        distances = array('d')
+        predecessors = array('i')
+
+        for source in locations:
+            tree_distances, tree_previous = shortest_path_tree(graph, source)
+            distances.extend(tree_distances.get(column, float('inf')) for column in columns)
+            predecessors.extend(tree_previous.get(i, -1) for i in range(len(graph)))
+
+        return cls(graph, locations, distances, predecessors)
+
+    def __contains__(self, pair):
+        start, end = pair
+        return start in self.rows and end in self.rows and self.rows[start] not in self.stale_rows
+
+    def apply_overlay(self, overlay, changes=None) -> None:
+        """
+        Marks the rows whose routes an overlay's closures and weight changes can affect, so routes from those
+        start locations are searched on the overlay instead (`pair in table` is False for them). Can be registered
+        as an overlay listener.
+
+        The table was computed on the base graph, so a row stays valid as long as none of its routes uses an edge
+        the overlay made longer or closed; lengthening other edges can't make any of its routes shorter. Once
+        an edge is shorter than in the base graph, any route might improve and every row is marked. Rows are
+        checked against the overlay's current state rather than the last change, so reopening a closure makes the
+        rows it affected valid again.
+
+        Args:
+            overlay (GraphOverlay): The overlay on top of the table's graph.
+            changes (dict): The latest changes, unused; accepted so the method can be a listener.
+        """
+        n = len(self.graph)
+        rows = range(len(self.locations))
+        predecessors = self.predecessors
+        stale = set()
+        for source, target, base_weight, weight in overlay.overridden_edges():
+            if weight < base_weight:
+                stale = set(rows)
+                break
+            stale.update(row for row in rows
+                         if predecessors[row * n + target] == source and target in self._routes_through(row))
+        self.stale_rows = stale
+
+    def _routes_through(self, row) -> set:
+        # Node indices on the routes from a row's location to every location, found by walking up its tree once
+        nodes = self._route_nodes.get(row)
+        if nodes is None:
+            graph, predecessors = self.graph, self.predecessors
+            base = row * len(graph)
+            nodes = set()
+            for name in self.locations:
+                node = graph.index[name]
+                while node != -1 and node not in nodes:
+                    nodes.add(node)
+                    node = predecessors[base + node]
+            self._route_nodes[row] = nodes
+        return nodes
+
+    def lookup(self, start, end):
+        """
+        Returns the shortest route between two locations from the table.
+
+        Args:
+            start: Name of the start location.
+            end: Name of the end location.
+
+        Returns:
+            tuple: Total distance and path (list of node ids), or (None, None) if the locations are not connected.
+            Rows marked stale by `apply_overlay` are not checked; test `(start, end) in table` first.
+        """
+        row, column = self.rows[start], self.rows[end]
+        dist = self.distances[row * len(self.locations) + column]
+        if dist == float('inf'):
+            return None, None
+
+        # Walk up the start location's shortest-path tree from the end location
+        graph = self.graph
+        base = row * len(graph)
+        predecessors, ids = self.predecessors, graph.ids
+        node = graph.index[end]
+        path = []
+        while node != -1:
+            path.append(ids[node])
+            node = predecessors[base + node]
+        path.reverse()
+        return dist, path
+
+    def save(self, path, key) -> None:
+        """
+        Writes the table to disk.
+
+        Args:
+            path (str): Destination file. Parent directories are created as needed.
+            key (bytes): Cache key from `route_table_key` stored in the header.
+        """
+        table = json.dumps(self.locations).encode('utf-8')
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, ROUTE_TABLE_VERSION, BYTE_ORDER, key, len(self.locations), len(self.graph),
+                                len(table)))
+            write_tables(f, ((self.distances, 'd'), (self.predecessors, 'i')))
+            f.write(table)
+
+        # Replace the old table only once the new one is fully written
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, graph, key):
+        """
+        Memory-maps a saved table.
+
+        Args:
+            path (str): Table file to open.
+            graph (CSRGraph): The routing graph the table belongs to.
+            key (bytes): Expected cache key.
+
+        Returns:
+            RouteTable: The table, or None if the file is missing, truncated or corrupt, or was computed for another
+            graph or location list.
+        """
+        try:
+            with open(path, 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        if len(mm) < HEADER.size:
+            mm.close()
+            return None
+
+        magic, version, byte_order, file_key, location_count, node_count, table_size = HEADER.unpack_from(mm)
+        if (magic != MAGIC or version != ROUTE_TABLE_VERSION or byte_order != BYTE_ORDER or file_key != key
+                or node_count != len(graph)):
+            mm.close()
+            return None
+
+        # Check the body against the header before mapping it, as `snapshot.read_snapshot` does
+        layout = (('distances', 'd', location_count * location_count),
+                  ('predecessors', 'i', location_count * node_count))
+        locations = read_json_table(mm, HEADER.size + tables_size(layout), table_size)
+        if not isinstance(locations, list) or len(locations) != location_count:
+            mm.close()
+            return None
+
+        tables, _ = map_tables(memoryview(mm), HEADER.size, layout)
+
+        return cls(graph, locations, tables['distances'], tables['predecessors'], buffer=mm)
+
+
+# ----------------------
+# Function: load_route_table
+# ----------------------
+def load_route_table(graph, locations, path, refresh=False) -> RouteTable:
+    """
+    Loads the route table saved next to the graph snapshot, rebuilding it when it is missing or stale.
+
+    The table is tied to the graph contents and the location list through its cache key, so it is rebuilt
+    automatically whenever either changes.
+
+    Args:
+        graph (CSRGraph): The routing graph.
+        locations (iterable): Names of the location nodes to precompute routes between.
+        path (str): Table file to read and write.
+        refresh (bool): Rebuild the table even if a valid one exists.
+
+    Returns:
+        RouteTable: The route table.
+    """
+    key = route_table_key(graph, locations)
+
+    if not refresh:
+        table = RouteTable.load(path, graph, key)
+        if table is not None:
+            return table
+
+    table = RouteTable.build(graph, locations)
+    table.save(path, key)
+    return table
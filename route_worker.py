@@ -0,0 +1,169 @@
+import logging
+import multiprocessing
+import queue
+import time
+from algorithms import AStar, Dijkstra
+from graph import SNAPSHOT_PATH
+from overlay import GraphOverlay
+from snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def _run_searches(path, requests, results):
+    # Worker process: map the snapshot once, then answer searches until told to stop
+    graph = base = load_snapshot(path)
+    overlay = None
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+
+        # ('overlay', overrides) replaces the closures applied to the searches that follow
+        if request[0] == 'overlay':
+            if overlay is None:
+                overlay = GraphOverlay(base)
+            overlay.set_overrides(request[1])
+            graph = overlay.graph
+            continue
+
+        search_id, algo, start, end = request
+        try:
+            stats = {}
+            start_time = time.perf_counter()
+            result = algo(graph, start, end, stats=stats)
+            elapsed = time.perf_counter() - start_time
+            reply = {'result': result, 'stats': stats, 'elapsed': elapsed,
+                     'comparing': algo is AStar and result != (None, None)}
+        except Exception as error:
+            reply = {'error': f"{type(error).__name__}: {error}"}
+        results.put((search_id, reply))
+
+        # For A*, run Dijkstra on the same query once the route is on its way, so the saved expansions can be
+        # compared without delaying the route itself
+        if reply.get('comparing'):
+            try:
+                baseline_stats = {}
+                start_time = time.perf_counter()
+                Dijkstra(graph, start, end, stats=baseline_stats)
+                reply = {'baseline': baseline_stats['expanded'], 'baseline_elapsed': time.perf_counter() - start_time}
+            except Exception as error:
+                reply = {'error': f"{type(error).__name__}: {error}"}
+            results.put((search_id, reply))
+
+
+class RouteWorker:
+    """
+    Runs route searches in a background process, one at a time, so a slow search never blocks the caller.
+
+    The process memory-maps the graph snapshot itself, so only node ids and results cross the process boundary.
+    Submitting a search while another one is still running cancels the running one. A search can't be interrupted
+    from the outside, so cancelling terminates the worker process and a fresh one is started.
+
+    For A*, the worker also counts the nodes Dijkstra expands on the same query. That count follows the route as a
+    second reply, and the search stays pending until it has arrived.
+
+    With a `GraphOverlay`, searches follow its closures; its changes are sent to the process ahead of the next
+    search.
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, overlay=None):
+        self.path = path
+        self.overlay = overlay
+        self.pending = None
+        self._context = multiprocessing.get_context('spawn')
+        self._process = None
+        self._requests = None
+        self._results = None
+        self._next_id = 0
+        self._sent_version = 0  # Overlay version the worker process has, 0 being no closures
+
+    def start(self) -> None:
+        """
+        Starts the worker process if it isn't running, e.g. ahead of the first search.
+        """
+        if self._process is not None:
+            return
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process = self._context.Process(target=_run_searches, args=(self.path, self._requests, self._results),
+                                              daemon=True)
+        self._process.start()
+        self._sent_version = 0
+
+    def submit(self, algo, start, end) -> int:
+        """
+        Starts a search, cancelling the one still running (if any).
+
+        Args:
+            algo (function): One of the search functions in `algorithms`.
+            start: The start node id.
+            end: The end node id.
+
+        Returns:
+            int: Id of the search, which `poll` returns with its result.
+        """
+        self.cancel()
+        self.start()
+        if self.overlay is not None and self.overlay.version != self._sent_version:
+            self._requests.put(('overlay', dict(self.overlay.overrides)))
+            self._sent_version = self.overlay.version
+        self._next_id += 1
+        self.pending = self._next_id
+        self._requests.put((self.pending, algo, start, end))
+        return self.pending
+
+    def cancel(self) -> None:
+        """
+        Cancels the running search, if any, by replacing the worker process.
+        """
+        if self.pending is None:
+            return
+        logger.info("Cancelling search %d.", self.pending)
+        self.pending = None
+        self._stop(terminate=True)
+
+    def poll(self):
+        """
+        Checks, without blocking, whether the pending search has finished.
+
+        Returns:
+            tuple: (search id, reply) for every reply of the pending search. The first reply is a dict with the
+            algorithm's return value ('result'), its 'stats', the search time in seconds ('elapsed') and whether
+            Dijkstra's expansions follow ('comparing'). If they do, a second reply carries them ('baseline') and
+            the time they took ('baseline_elapsed'). Either reply is a dict with an 'error' message instead if its
+            search failed.
+            None while the search is still running or if there is none.
+        """
+        if self.pending is None:
+            return None
+        try:
+            search_id, reply = self._results.get_nowait()
+        except queue.Empty:
+            if not self._process.is_alive():
+                search_id, self.pending = self.pending, None
+                self._stop(terminate=False)
+                return search_id, {'error': "The search process exited unexpectedly."}
+            return None
+        if not reply.get('comparing'):
+            self.pending = None
+        return search_id, reply
+
+    def _stop(self, terminate) -> None:
+        if self._process is None:
+            return
+        if terminate:
+            self._process.terminate()
+        else:
+            self._requests.put(None)
+        self._process.join(timeout=5)
+        self._requests.close()
+        self._results.close()
+        self._process = self._requests = self._results = None
+
+    def close(self) -> None:
+        """
+        Stops the worker process, cancelling any running search.
+        """
+        self.pending = None
+        self._stop(terminate=True)
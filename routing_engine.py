@@ -0,0 +1,160 @@
+import heapq
+import time
+from algorithms import record_stats
+from csr_graph import CSRGraph
+
+
+class RoutingEngine:
+    """
+    Dijkstra search over a `CSRGraph` with a reusable, preallocated workspace.
+
+    The engine allocates its distance and predecessor tables once and remembers which entries a query wrote. The
+    next query resets only those entries, so the cost of a query depends on the part of the graph it explores
+    rather than on the size of the graph. `Dijkstra` on a `CSRGraph` now works the same way; the engine adds
+    `shortest_paths`, which answers many destinations with a single search.
+
+    An engine is not thread-safe; give each thread or worker process its own.
+    """
+
+    def __init__(self, graph):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_dict(graph)
+        self.graph = graph
+
+        # Plain lists rather than `array`s: the search reads these on every relaxation, and list reads don't box
+        # a new float each time
+        n = len(graph)
+        self.distances = [float('inf')] * n
+        self.previous_nodes = [-1] * n
+
+        # Indices whose distance the last query set, and the priority queue list, both reused between queries
+        self._touched = []
+        self._queue = []
+
+    def _reset(self) -> None:
+        # Put back the entries written by the previous query
+        inf = float('inf')
+        distances, previous_nodes = self.distances, self.previous_nodes
+        for i in self._touched:
+            distances[i] = inf
+            previous_nodes[i] = -1
+        self._touched.clear()
+
+    def _search(self, start, goals, stats=None) -> None:
+        # Dijkstra from index `start`, stopping once every index in the set `goals` is settled
+        self._reset()
+        offsets, targets, weights = self.graph.offsets, self.graph.targets, self.graph.weights
+        distances, previous_nodes, touched = self.distances, self.previous_nodes, self._touched
+        inf = float('inf')
+
+        distances[start] = 0.0
+        touched.append(start)
+
+        priority_queue = self._queue
+        priority_queue.clear()
+        priority_queue.append((0.0, start))
+        expanded = relaxed = 0
+        pushes = peak = 1
+        remaining = set(goals)
+
+        while priority_queue:
+            current_distance, current = heapq.heappop(priority_queue)
+
+            # The first pop of a node is at its final distance
+            if current in remaining:
+                remaining.discard(current)
+                if not remaining:
+                    break
+            if current_distance > distances[current]:
+                continue
+            expanded += 1
+
+            first, last = offsets[current], offsets[current + 1]
+            relaxed += last - first
+            for neighbor, weight in zip(targets[first:last], weights[first:last]):
+                distance = current_distance + weight
+                if distance < distances[neighbor]:
+                    # First time this query reaches the neighbor: remember to reset it
+                    if distances[neighbor] == inf:
+                        touched.append(neighbor)
+                    distances[neighbor] = distance
+                    previous_nodes[neighbor] = current
+                    heapq.heappush(priority_queue, (distance, neighbor))
+                    pushes += 1
+            if len(priority_queue) > peak:
+                peak = len(priority_queue)
+
+        record_stats(stats, expanded, pushes, relaxed, peak)
+
+    def _unwind(self, node) -> list:
+        # Follow predecessor indices back to the source and translate the path to node ids
+        ids, previous_nodes = self.graph.ids, self.previous_nodes
+        path = []
+        while node != -1:
+            path.append(ids[node])
+            node = previous_nodes[node]
+        path.reverse()
+        return path
+
+    def shortest_path(self, source, destination, stats=None):
+        """
+        Finds the shortest path between two nodes.
+
+        Args:
+            source: The starting node id.
+            destination: The target node id.
+            stats (dict): Optional dictionary that receives search counters (see `algorithms.record_stats`).
+
+        Returns:
+            tuple: Total distance and the path from source to destination, or (None, None) if unreachable.
+        """
+        index = self.graph.index
+        if source not in index or destination not in index:
+            return None, None
+
+        target = index[destination]
+        self._search(index[source], (target,), stats)
+
+        if self.distances[target] == float('inf'):
+            return None, None
+        reconstruct_start = time.perf_counter()
+        path = self._unwind(target)
+        if stats is not None:
+            stats['reconstruct_s'] = time.perf_counter() - reconstruct_start
+        return self.distances[target], path
+
+    def shortest_paths(self, source, destinations, stats=None) -> dict:
+        """
+        Finds the shortest paths from one source to many destinations with a single search.
+
+        The search stops as soon as every destination is settled, so nearby destinations cost little more than
+        the farthest one alone.
+
+        Args:
+            source: The starting node id.
+            destinations (iterable): Target node ids.
+            stats (dict): Optional dictionary that receives search counters (see `algorithms.record_stats`).
+
+        Returns:
+            dict: (distance, path) per destination, with (None, None) for destinations that are unreachable or
+            not in the graph.
+        """
+        index = self.graph.index
+        destinations = set(destinations)
+        if source not in index:
+            return {destination: (None, None) for destination in destinations}
+
+        goals = {index[destination] for destination in destinations if destination in index}
+        if goals:
+            self._search(index[source], goals, stats)
+
+        inf = float('inf')
+        distances = self.distances
+        results = {}
+        for destination in destinations:
+            target = index.get(destination)
+            if target is None or distances[target] == inf:
+                results[destination] = (None, None)
+            else:
+                results[destination] = (distances[target], self._unwind(target))
+        return results
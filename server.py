@@ -0,0 +1,513 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+from algorithms import AStar, BFS, BidirectionalDijkstra, DFS, Dijkstra
+from graph import (ROUTE_TABLE_PATH, SNAPSHOT_PATH, csuf_locations, load_graph, parse_node_id,
+                   walking_distance, walking_minutes)
+from instrumentation import QueryStats, StatsLog
+from isochrone import IsochroneCache
+from overlay import GraphOverlay, apply_closures, improves, load_closures, read_overrides, save_overrides
+from route_table import load_route_table
+from snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Algorithms selectable with the `algo` query parameter
+ALGORITHMS = {
+    'bfs': BFS,
+    'dfs': DFS,
+    'dijkstra': Dijkstra,
+    'astar': AStar,
+    'bidirectional': BidirectionalDijkstra,
+}
+
+# Algorithms that return shortest paths, which the precomputed route table can answer for them
+EXACT_ALGORITHMS = {'dijkstra', 'astar', 'bidirectional'}
+
+DEFAULT_ALGORITHM = 'astar'
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                500: 'Internal Server Error'}
+
+# Largest request body accepted, in bytes (closures are posted as JSON)
+MAX_BODY_SIZE = 1 << 20
+
+# Routing graph of the current worker process, set up once by `_init_worker`
+_graph = None
+
+# Closures of the current worker process, created on the first query with closures and synced by version from the
+# service's overrides file
+_overlay = None
+_overlay_version = 0
+_overrides_path = None
+
+
+class RouteCache:
+    """
+    Bounded least-recently-used cache of route results, with hit and miss counters.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        Returns the cached value for `key` (marking it as recently used), or None on a miss.
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value) -> None:
+        """
+        Stores a value, evicting the least recently used entry once the cache is full.
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, changes) -> None:
+        """
+        Drops the routes that edge changes (see `GraphOverlay`) can affect.
+
+        A longer or closed edge only affects the routes that use it. A shorter or reopened edge can improve any
+        route, including ones that had no path, so the whole cache is cleared.
+        """
+        if improves(changes):
+            self.entries.clear()
+            return
+        for key, value in list(self.entries.items()):
+            if value and any(pair in changes for pair in zip(value[1], value[1][1:])):
+                del self.entries[key]
+
+    def stats(self) -> dict:
+        return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+def path_length(graph, path) -> float:
+    """
+    Adds up the edge lengths along a path.
+
+    Args:
+        graph (CSRGraph | dict): The routing graph.
+        path (list): Node ids, in order.
+
+    Returns:
+        float: Length of the path in meters.
+    """
+    return sum(graph[node]['adj'][next_node] for node, next_node in zip(path, path[1:]))
+
+
+# ----------------------
+# Function: find_route
+# ----------------------
+def find_route(graph, algo, start, end, stats=None):
+    """
+    Runs one of the `ALGORITHMS` and normalizes its result.
+
+    BFS only returns a path, so its distance is measured along that path.
+
+    Args:
+        graph (CSRGraph | dict): The routing graph.
+        algo (str): Key into `ALGORITHMS`.
+        start: The start node id.
+        end: The end node id.
+        stats (dict): Optional dictionary that receives the algorithm's search counters.
+
+    Returns:
+        tuple: Distance in meters and path, or None if there is no path.
+    """
+    result = ALGORITHMS[algo](graph, start, end, stats=stats)
+    if result is None or result == (None, None):
+        return None
+    if isinstance(result, tuple):
+        return result
+    return path_length(graph, result), result
+
+
+def _init_worker(path, overrides_path=None):
+    global _graph, _overrides_path
+
+    # Workers map the snapshot themselves, so the graph is never pickled
+    _graph = load_snapshot(path)
+    _overrides_path = overrides_path
+
+
+def _find_route(algo, start, end, version=0):
+    # `version` is the version of the service's closures (0 for none). Only the number travels with each search; a
+    # worker that is behind reads the closures from the service's overrides file.
+    global _overlay, _overlay_version
+    graph = _graph
+    if version:
+        if _overlay is None:
+            _overlay = GraphOverlay(_graph)
+        if version != _overlay_version:
+            _overlay_version, overrides = read_overrides(_overrides_path)
+            _overlay.set_overrides(overrides)
+        graph = _overlay.graph
+
+    # The search counters and time travel back with the result
+    stats = {}
+    start_time = time.perf_counter()
+    result = find_route(graph, algo, start, end, stats)
+    return result, stats, time.perf_counter() - start_time
+
+
+class RoutingService:
+    """
+    Small HTTP/JSON routing service.
+
+    `GET /route?from=&to=&algo=` returns the route between two nodes (location names or OSM node ids), its length
+    and the walking time. `GET /isochrone?from=&minutes=` (or `&meters=`) returns the locations reachable from a
+    node within a walking budget and the outline of the reachable area. `GET /stats` returns the cache counters.
+    `POST /closures` closes, reweights or reopens paths at runtime; the body is a JSON object in the format of
+    `overlay.apply_closures`.
+
+    Searches run in a pool of worker processes so the event loop keeps accepting requests while they run. Results
+    are kept in a `RouteCache`, and requests for a route that is already being computed wait for that search
+    instead of starting another one.
+
+    With a `GraphOverlay`, routes follow its closures: changes made to the overlay drop just the cached routes,
+    route table rows and isochrone searches they affect. The overlay's overrides are written to a file after every
+    change, and a worker reads them on its next search if it is behind.
+    """
+
+    def __init__(self, graph, path=SNAPSHOT_PATH, route_table=None, cache_size=1024, workers=None, stats_log=None,
+                 overlay=None):
+        self.overlay = overlay
+        if overlay is not None:
+            graph = overlay.graph
+        self.graph = graph
+        self.route_table = route_table
+        self.stats_log = stats_log
+        self.cache = RouteCache(cache_size)
+        self.isochrones = IsochroneCache(graph)
+        self._overrides_path = None
+        if overlay is not None:
+            self._overrides_path = os.path.join(tempfile.mkdtemp(prefix='routing-'), 'overrides.json')
+            save_overrides(overlay, self._overrides_path)
+            overlay.subscribe(self._apply_changes)
+            if route_table is not None:
+                route_table.apply_overlay(overlay)
+        # Spawned rather than forked workers: a forked worker would inherit the open client sockets and keep them
+        # alive after the handler closes them
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(path, self._overrides_path))
+        self._in_flight = {}
+
+    def close(self) -> None:
+        self.executor.shutdown(cancel_futures=True)
+        if self._overrides_path is not None:
+            self.overlay.listeners.remove(self._apply_changes)
+            shutil.rmtree(os.path.dirname(self._overrides_path), ignore_errors=True)
+
+    def _apply_changes(self, overlay, changes) -> None:
+        # Overlay listener: forget whatever the changed edges can affect, and publish the closures to the workers
+        self.cache.invalidate(changes)
+        self.isochrones.invalidate(overlay, changes)
+        if self.route_table is not None:
+            self.route_table.apply_overlay(overlay, changes)
+        save_overrides(overlay, self._overrides_path)
+
+    async def route(self, algo, start, end, query=None) -> tuple:
+        """
+        Finds a route, from the cache when possible.
+
+        Args:
+            query (QueryStats): Optional record that receives the time spent in each phase and the search counters.
+
+        Returns:
+            tuple: Distance and path (or None if there is no path), and whether the result came from the cache.
+        """
+        query = query or QueryStats()
+        key = (algo, start, end)
+        version = self.overlay.version if self.overlay is not None else 0
+        with query.phase('cache'):
+            result = self.cache.get(key)
+        if result is not None:
+            return result, True
+
+        if algo in EXACT_ALGORITHMS and self.route_table is not None and (start, end) in self.route_table:
+            with query.phase('route table'):
+                dist, path = self.route_table.lookup(start, end)
+            result = (dist, path) if path is not None else None
+        else:
+            # Searches are shared only between requests made under the same closures
+            flight_key = key + (version,)
+            future = self._in_flight.get(flight_key)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self.executor, _find_route, algo, start, end, version)
+                self._in_flight[flight_key] = future
+            submitted = time.perf_counter()
+            try:
+                result, stats, seconds = await asyncio.shield(future)
+            finally:
+                self._in_flight.pop(flight_key, None)
+
+            # Time spent waiting for a worker and moving the result between processes is reported apart from the
+            # search itself
+            query.add_search(stats, seconds)
+            query.record('worker wait', max(0.0, time.perf_counter() - submitted - seconds))
+
+        # "No path" results are cached as well, as an empty tuple. A result computed before the closures changed
+        # is returned but not kept.
+        if self.overlay is None or self.overlay.version == version:
+            self.cache.put(key, result or ())
+        return result, False
+
+    async def handle_route(self, query) -> tuple:
+        """
+        Answers a `/route` query and records its timings and counters, writing them to `stats_log` if there is one.
+        """
+        stats = QueryStats('query')
+        status, body = await self._handle_route(query, stats)
+        stats.fields['status'] = status
+        if self.stats_log is not None:
+            self.stats_log.write(stats)
+        return status, body
+
+    async def _handle_route(self, query, stats) -> tuple:
+        # Validate the query parameters and turn the route into a JSON document
+        params = parse_qs(query)
+        algo = params.get('algo', [DEFAULT_ALGORITHM])[0].lower()
+        if 'from' not in params or 'to' not in params:
+            return 400, {'error': "Both 'from' and 'to' are required."}
+        if algo not in ALGORITHMS:
+            return 400, {'error': f"Unknown algorithm '{algo}'.", 'algorithms': list(ALGORITHMS)}
+
+        with stats.phase('resolve'):
+            start = parse_node_id(self.graph, params['from'][0])
+            end = parse_node_id(self.graph, params['to'][0])
+        stats.fields.update({'algo': algo, 'from': start, 'to': end})
+        for node in (start, end):
+            if node not in self.graph:
+                return 404, {'error': f"Unknown location '{node}'."}
+
+        result, cached = await self.route(algo, start, end, stats)
+        stats.fields['cached'] = cached
+        if not result:
+            return 404, {'error': f"No path found from '{start}' to '{end}'.", 'cached': cached}
+
+        dist, path = result
+        stats.fields['path_nodes'] = len(path)
+        with stats.phase('coordinates'):
+            coords = []
+            for node in path:
+                lat, long = self.graph.coords(self.graph.index[node])
+                coords.append(None if math.isnan(lat) else [lat, long])
+        return 200, {
+            'from': start,
+            'to': end,
+            'algo': algo,
+            'distance_m': dist,
+            'walking_time_min': walking_minutes(dist),
+            'path': path,
+            'coords': coords,
+            'cached': cached,
+            'timings_ms': stats.to_dict()['timings_ms'],
+            'counters': stats.counters,
+        }
+
+    async def handle_isochrone(self, query) -> tuple:
+        """
+        Answers an `/isochrone` query. The resumable searches are kept in this process, so a budget that isn't
+        cached yet is searched on a thread rather than in the worker pool, leaving the event loop free.
+        """
+        stats = QueryStats('isochrone')
+        status, body = await self._handle_isochrone(query, stats)
+        stats.fields['status'] = status
+        if self.stats_log is not None:
+            self.stats_log.write(stats)
+        return status, body
+
+    async def _handle_isochrone(self, query, stats) -> tuple:
+        params = parse_qs(query)
+        if 'from' not in params or ('minutes' in params) == ('meters' in params):
+            return 400, {'error': "'from' and one of 'minutes' or 'meters' are required."}
+        try:
+            if 'minutes' in params:
+                max_distance = walking_distance(float(params['minutes'][0]))
+            else:
+                max_distance = float(params['meters'][0])
+        except ValueError:
+            return 400, {'error': "The budget must be a number."}
+        if not 0 <= max_distance < math.inf:
+            return 400, {'error': "The budget must be a non-negative number."}
+
+        with stats.phase('resolve'):
+            start = parse_node_id(self.graph, params['from'][0])
+        stats.fields.update({'from': start, 'max_distance_m': max_distance})
+        if start not in self.graph:
+            return 404, {'error': f"Unknown location '{start}'."}
+
+        with stats.phase('cache'):
+            isochrone = self.isochrones.cached(start, max_distance)
+        if isochrone is None:
+            counters = {}
+            search_start = time.perf_counter()
+            isochrone, area_seconds = await asyncio.to_thread(self._search_isochrone, start, max_distance, counters)
+            stats.add_search(counters, time.perf_counter() - search_start - area_seconds)
+            stats.record('area', area_seconds)
+        polygon = [list(point) for point in isochrone.polygon]
+        return 200, {
+            'from': start,
+            'distance_m': isochrone.max_distance,
+            'walking_time_min': walking_minutes(isochrone.max_distance),
+            'locations': {name: {'distance_m': dist, 'walking_time_min': walking_minutes(dist)}
+                          for name, dist in isochrone.locations.items()},
+            'node_count': len(isochrone.nodes),
+            'polygon': polygon,
+            'timings_ms': stats.to_dict()['timings_ms'],
+            'counters': stats.counters,
+        }
+
+    def handle_closures(self, body) -> tuple:
+        """
+        Answers a `POST /closures` request: applies the closures in the JSON body (see `overlay.apply_closures`)
+        and reports how many edges changed and how many differ from the base graph now.
+        """
+        if self.overlay is None:
+            return 400, {'error': "This service was started without closures support."}
+        try:
+            closures = json.loads(body)
+        except ValueError:
+            return 400, {'error': "The body must be a JSON object."}
+        if not isinstance(closures, dict):
+            return 400, {'error': "The body must be a JSON object."}
+        edges = closures.get('edges', [])
+        if not isinstance(edges, list) or not all(isinstance(edge, dict) and 'from' in edge and 'to' in edge
+                                                  for edge in edges):
+            return 400, {'error': "Every edge needs 'from' and 'to'."}
+
+        try:
+            changes = apply_closures(self.overlay, closures)
+        except KeyError as error:
+            return 404, {'error': str(error.args[0]), 'version': self.overlay.version}
+        except (TypeError, ValueError) as error:
+            return 400, {'error': str(error), 'version': self.overlay.version}
+        return 200, {'changed_edges': len(changes), 'overridden_edges': len(self.overlay.overrides),
+                     'version': self.overlay.version}
+
+    def _search_isochrone(self, start, max_distance, counters) -> tuple:
+        # Runs on a worker thread: the search and the outline, which is computed on first use and kept
+        isochrone = self.isochrones.get(start, max_distance, counters)
+        area_start = time.perf_counter()
+        isochrone.polygon
+        return isochrone, time.perf_counter() - area_start
+
+    async def handle(self, reader, writer) -> None:
+        """
+        Serves one HTTP request per connection.
+        """
+        status, request_line = 500, []
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            # Only the body length is needed from the headers; GET requests carry everything in the URL
+            content_length = 0
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length' and value.strip().isdigit():
+                    content_length = int(value)
+
+            if len(request_line) != 3:
+                status, body = 400, {'error': "Malformed request."}
+            elif request_line[0] == 'POST' and urlsplit(request_line[1]).path == '/closures':
+                if content_length > MAX_BODY_SIZE:
+                    status, body = 400, {'error': "The request body is too large."}
+                else:
+                    status, body = self.handle_closures(await reader.readexactly(content_length))
+            elif request_line[0] != 'GET':
+                status, body = 405, {'error': "Only GET is supported, and POST for /closures."}
+            else:
+                url = urlsplit(request_line[1])
+                if url.path == '/route':
+                    status, body = await self.handle_route(url.query)
+                elif url.path == '/isochrone':
+                    status, body = await self.handle_isochrone(url.query)
+                elif url.path == '/stats':
+                    status, body = 200, {'cache': self.cache.stats(), 'isochrones': self.isochrones.stats()}
+                else:
+                    status, body = 404, {'error': f"Unknown endpoint '{url.path}'."}
+        except Exception:
+            logger.exception("Request failed.")
+            body = {'error': "Internal server error."}
+
+        payload = json.dumps(body).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(payload)}\r\n"
+                     f"Access-Control-Allow-Origin: *\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + payload)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        logger.info("%s -> %d", ' '.join(request_line[:2]) if request_line else '-', status)
+
+
+async def serve(host, port, service) -> None:
+    server = await asyncio.start_server(service.handle, host, port)
+    logger.info("Routing service listening on http://%s:%d", host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve CSUF campus routes over HTTP/JSON.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="port to listen on")
+    parser.add_argument('--cache-size', type=int, default=1024, help="number of routes kept in the LRU cache")
+    parser.add_argument('--workers', type=int, default=None, help="search worker processes (default: CPU count)")
+    parser.add_argument('--stats-log', help="append per-query timings and search counters to this JSON-lines file")
+    parser.add_argument('--closures', help="JSON file of closed or reweighted paths to route around")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    stats_log = StatsLog(args.stats_log) if args.stats_log else None
+
+    # Load the graph once (building the snapshot the workers map if needed), and the location route table
+    startup = QueryStats('startup', program='server')
+    graph = load_graph(stats=startup)
+    with startup.phase('load route table'):
+        route_table = load_route_table(graph, csuf_locations, ROUTE_TABLE_PATH)
+    # An overlay is always set up, so paths can be closed at runtime with POST /closures
+    overlay = GraphOverlay(graph)
+    if args.closures:
+        with startup.phase('load closures'):
+            load_closures(overlay, args.closures)
+    if stats_log is not None:
+        stats_log.write(startup)
+
+    service = RoutingService(graph, SNAPSHOT_PATH, route_table, args.cache_size, args.workers, stats_log, overlay)
+    try:
+        asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+        if stats_log is not None:
+            stats_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from csr_graph import CSRGraph, table_bytes
+
+# Bump whenever the on-disk layout below changes so old snapshots are rebuilt
+SNAPSHOT_VERSION = 3
+MAGIC = b'CSUFGRPH'
+
+# Bump whenever the graph built from the same inputs changes (e.g. how locations are snapped to streets or how
+# their links are weighted), so snapshots built the old way get a different key and are rebuilt
+BUILD_VERSION = 1
+
+# Header layout: magic, version, byte order flag, cache key, node count, edge count, edge geometry point count,
+# name table size, CRC-32 of everything after the header
+HEADER = struct.Struct('<8sII32sQQQQQ')
+BYTE_ORDER = 0 if sys.byteorder == 'little' else 1
+
+# ------------------------------------------------------------------
+# File layout (every section starts on an 8-byte boundary):
+#
+#   header
+#   offsets           int64[node_count + 1]   CSR row offsets into targets/weights
+#   weights           float64[edge_count]     edge lengths in meters
+#   lats              float64[node_count]     node latitudes
+#   lons              float64[node_count]     node longitudes
+#   targets           int32[edge_count]       CSR column indices
+#   geometry_offsets  int64[edge_count + 1]   per-edge offsets into geometry_lats/geometry_lons
+#   geometry_lats     float64[point_count]    latitudes of the shape points of contracted and curved edges
+#   geometry_lons     float64[point_count]    longitudes of the shape points
+#   table             UTF-8 JSON              node ids and names, in index order
+#
+# The numeric sections are stored in native byte order so they can be used straight out of a memory map.
+# ------------------------------------------------------------------
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def write_tables(f, tables) -> None:
+    """
+    Writes numeric tables back to back, padding each one to an 8-byte boundary.
+
+    Args:
+        f (file): Binary file open for writing.
+        tables (iterable): (values, typecode) pairs.
+    """
+    for values, typecode in tables:
+        data = table_bytes(values, typecode)
+        f.write(data)
+        f.write(b'\0' * (_align(len(data)) - len(data)))
+
+
+def map_tables(view, pos, layout):
+    """
+    Creates typed, zero-copy views over tables written by `write_tables`.
+
+    Args:
+        view (memoryview): View over the whole file.
+        pos (int): Offset of the first table.
+        layout (iterable): (name, typecode, count) triples in file order.
+
+    Returns:
+        tuple: A dictionary of views by name, and the offset just past the last table.
+    """
+    tables = {}
+    for name, typecode, count in layout:
+        size = count * array(typecode).itemsize
+        tables[name] = view[pos:pos + size].cast(typecode)
+        pos += _align(size)
+    return tables, pos
+
+
+def tables_size(layout) -> int:
+    """
+    Returns how many bytes `write_tables` writes for tables of the given (name, typecode, count) layout.
+    """
+    return sum(_align(count * array(typecode).itemsize) for _, typecode, count in layout)
+
+
+def read_json_table(mm, pos, size):
+    """
+    Decodes the UTF-8 JSON table stored after the numeric tables of a file.
+
+    Args:
+        mm (mmap.mmap): The whole file.
+        pos (int): Offset of the table.
+        size (int): Size of the table in bytes.
+
+    Returns:
+        The decoded table, or None if the file is too short to hold it or it isn't valid JSON.
+    """
+    if pos + size > len(mm):
+        return None
+    try:
+        return json.loads(mm[pos:pos + size].decode('utf-8'))
+    except ValueError:
+        return None
+
+
+def body_checksum(f, start) -> int:
+    """
+    Computes the CRC-32 of a file from offset `start` to its end, reading it in chunks.
+
+    Args:
+        f (file): Binary file open for reading.
+        start (int): Offset of the first byte covered.
+
+    Returns:
+        int: The checksum.
+    """
+    f.seek(start)
+    checksum = 0
+    while chunk := f.read(1 << 20):
+        checksum = zlib.crc32(chunk, checksum)
+    return checksum
+
+
+def snapshot_key(latitude, longitude, dist, locations) -> bytes:
+    """
+    Computes the cache key of a snapshot from everything that goes into building the graph, including the
+    `BUILD_VERSION` of the build steps themselves.
+
+    Args:
+        latitude (float): Latitude of the download center.
+        longitude (float): Longitude of the download center.
+        dist (int): Download radius in meters.
+        locations (dict): Mapping of location names to (lat, long) coordinates.
+
+    Returns:
+        bytes: A 32-byte SHA-256 digest identifying the graph inputs.
+    """
+    inputs = {
+        'build': BUILD_VERSION,
+        'center': [latitude, longitude],
+        'dist': dist,
+        'locations': [[name, list(coords)] for name, coords in locations.items()],
+    }
+    return hashlib.sha256(json.dumps(inputs).encode('utf-8')).digest()
+
+
+# ----------------------
+# Function: save_snapshot
+# ----------------------
+def save_snapshot(path, graph, key) -> None:
+    """
+    Writes a routing graph to a compact binary snapshot.
+
+    Args:
+        path (str): Destination file. Parent directories are created as needed.
+        graph (CSRGraph | dict): The routing graph, or a graph dictionary produced by `create_graph`/`add_locations`.
+        key (bytes): Cache key from `snapshot_key` stored in the header.
+    """
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_dict(graph)
+
+    table = json.dumps({'ids': list(graph.ids), 'names': list(graph.names)}).encode('utf-8')
+    if graph.geometry_offsets is not None:
+        geometry = graph.geometry_offsets, graph.geometry_lats, graph.geometry_lons
+    else:
+        geometry = [0] * (graph.edge_count + 1), [], []
+    point_count = len(geometry[1])
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w+b') as f:
+        f.write(bytes(HEADER.size))
+        write_tables(f, ((graph.offsets, 'q'), (graph.weights, 'd'), (graph.lats, 'd'), (graph.lons, 'd'),
+                         (graph.targets, 'i'), (geometry[0], 'q'), (geometry[1], 'd'), (geometry[2], 'd')))
+        f.write(table)
+
+        # The header goes in last, once the checksum of the body is known
+        checksum = body_checksum(f, HEADER.size)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, BYTE_ORDER, key, len(graph), graph.edge_count, point_count,
+                            len(table), checksum))
+
+    # Replace the old snapshot only once the new one is fully written
+    os.replace(tmp_path, path)
+
+
+# ----------------------
+# Function: read_snapshot
+# ----------------------
+def read_snapshot(path, key=None):
+    """
+    Memory-maps a snapshot and returns typed views over its sections without copying them.
+
+    Args:
+        path (str): Snapshot file to open.
+        key (bytes): Expected cache key, or None to accept any key.
+
+    Returns:
+        dict: The 'ids', 'names', 'offsets', 'targets', 'weights', 'lats', 'lons', 'geometry_offsets',
+        'geometry_lats' and 'geometry_lons' sections plus the backing 'mmap', or None if the file is missing, stale,
+        truncated or corrupt, or was written by another version.
+    """
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mm) < HEADER.size:
+        mm.close()
+        return None
+
+    (magic, version, byte_order, file_key, node_count, edge_count, point_count, table_size,
+     checksum) = HEADER.unpack_from(mm)
+    if magic != MAGIC or version != SNAPSHOT_VERSION or byte_order != BYTE_ORDER:
+        mm.close()
+        return None
+    if key is not None and file_key != key:
+        mm.close()
+        return None
+
+    # Check the body against the header before mapping anything, so a truncated or corrupt file is rebuilt rather
+    # than crashing the load or routing on damaged tables (the map can't be closed anymore once views of it exist).
+    # The checksum catches damage anywhere in the body; the sizes and the JSON table are checked on top of it, so
+    # a file whose header doesn't match its body is rejected too.
+    with memoryview(mm) as view, view[HEADER.size:] as body:
+        intact = zlib.crc32(body) == checksum
+    if not intact:
+        mm.close()
+        return None
+    layout = (('offsets', 'q', node_count + 1), ('weights', 'd', edge_count), ('lats', 'd', node_count),
+              ('lons', 'd', node_count), ('targets', 'i', edge_count), ('geometry_offsets', 'q', edge_count + 1),
+              ('geometry_lats', 'd', point_count), ('geometry_lons', 'd', point_count))
+    pos = HEADER.size + tables_size(layout)
+    table = read_json_table(mm, pos, table_size)
+    if (table is None or not isinstance(table, dict) or len(table.get('ids', ())) != node_count
+            or len(table.get('names', ())) != node_count):
+        mm.close()
+        return None
+
+    sections, _ = map_tables(memoryview(mm), HEADER.size, layout)
+    sections['ids'] = table['ids']
+    sections['names'] = table['names']
+    sections['mmap'] = mm
+    return sections
+
+
+# ----------------------
+# Function: load_snapshot
+# ----------------------
+def load_snapshot(path, key=None):
+    """
+    Loads a snapshot as a `CSRGraph` whose tables stay memory-mapped from the file.
+
+    Args:
+        path (str): Snapshot file to load.
+        key (bytes): Expected cache key, or None to accept any key.
+
+    Returns:
+        CSRGraph: The routing graph, or None if the snapshot is missing or stale.
+    """
+    sections = read_snapshot(path, key)
+    if sections is None:
+        return None
+
+    # A graph without contracted edges is loaded without geometry tables
+    geometry = {}
+    if len(sections['geometry_lats']):
+        geometry = {name: sections[name] for name in ('geometry_offsets', 'geometry_lats', 'geometry_lons')}
+    return CSRGraph(sections['ids'], sections['offsets'], sections['targets'], sections['weights'],
+                    sections['lats'], sections['lons'], sections['names'], buffer=sections['mmap'], **geometry)
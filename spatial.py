@@ -0,0 +1,199 @@
+import math
+from collections import defaultdict
+
+# Mean Earth radius in meters (the value OSMnx uses for great-circle edge lengths)
+EARTH_RADIUS = 6371009
+
+
+def haversine(lat1, long1, lat2, long2) -> float:
+    """
+    Computes the great-circle distance in meters between two (lat, long) points.
+    """
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(long2 - long1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """
+    Uniform grid over a fixed set of planar points for fast nearest-neighbor and radius queries.
+
+    Points are bucketed into square cells once. A nearest query scans rings of cells around the query point and
+    stops as soon as no unscanned cell can hold anything closer, so a query only touches the points around it
+    instead of the whole set.
+    """
+
+    def __init__(self, xs, ys, cell_size=None):
+        self.xs = list(xs)
+        self.ys = list(ys)
+
+        # Default to roughly one point per cell over the bounding box of the points
+        if cell_size is None:
+            if self.xs:
+                extent = max(max(self.xs) - min(self.xs), max(self.ys) - min(self.ys))
+                cell_size = extent / math.sqrt(len(self.xs))
+            cell_size = cell_size or 1.0
+        self.cell_size = cell_size
+
+        cells = defaultdict(list)
+        for i, (x, y) in enumerate(zip(self.xs, self.ys)):
+            cells[self._cell(x, y)].append(i)
+        self.cells = dict(cells)
+
+        if self.cells:
+            cell_xs = [cx for cx, _ in self.cells]
+            cell_ys = [cy for _, cy in self.cells]
+            self._cell_bounds = (min(cell_xs), max(cell_xs), min(cell_ys), max(cell_ys))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def _cell(self, x, y):
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def _ring(self, cx, cy, r):
+        # Cells at Chebyshev distance exactly `r` from (cx, cy)
+        if r == 0:
+            yield cx, cy
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield x, cy - r
+            yield x, cy + r
+        for y in range(cy - r + 1, cy + r):
+            yield cx - r, y
+            yield cx + r, y
+
+    def nearest(self, x, y):
+        """
+        Finds the indexed point closest to (x, y).
+
+        Returns:
+            tuple: (point index, distance), or (None, inf) if the index is empty.
+        """
+        if not self.cells:
+            return None, float('inf')
+
+        cells, xs, ys = self.cells, self.xs, self.ys
+        cx, cy = self._cell(x, y)
+        min_x, max_x, min_y, max_y = self._cell_bounds
+        max_r = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+
+        best, best_d2 = None, float('inf')
+        for r in range(max_r + 1):
+            for cell in self._ring(cx, cy, r):
+                for i in cells.get(cell, ()):
+                    d2 = (xs[i] - x) ** 2 + (ys[i] - y) ** 2
+                    if d2 < best_d2:
+                        best, best_d2 = i, d2
+            # Everything outside the scanned rings is at least r cells away
+            if best is not None and best_d2 <= (r * self.cell_size) ** 2:
+                break
+
+        return best, math.sqrt(best_d2)
+
+    def nearest_many(self, points) -> list:
+        """
+        Finds the nearest indexed point for each (x, y) query point.
+
+        Returns:
+            list: One (point index, distance) tuple per query point.
+        """
+        return [self.nearest(x, y) for x, y in points]
+
+    def within(self, x, y, radius) -> list:
+        """
+        Finds every indexed point within `radius` of (x, y).
+
+        Returns:
+            list: (point index, distance) tuples sorted by distance.
+        """
+        cells, xs, ys = self.cells, self.xs, self.ys
+        min_cx, min_cy = self._cell(x - radius, y - radius)
+        max_cx, max_cy = self._cell(x + radius, y + radius)
+
+        found = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for i in cells.get((cx, cy), ()):
+                    d = math.hypot(xs[i] - x, ys[i] - y)
+                    if d <= radius:
+                        found.append((i, d))
+        found.sort(key=lambda item: item[1])
+        return found
+
+
+class SnapIndex:
+    """
+    Nearest-node index over (lat, long) coordinates, used to snap locations onto the street network.
+
+    Coordinates are projected once onto a local equirectangular plane in meters and stored in a `GridIndex`.
+    Snapped distances are reported as great-circle distances, like `ox.distance.nearest_nodes`.
+    """
+
+    def __init__(self, nodes, coords):
+        self.nodes = list(nodes)
+        self.coords = list(coords)
+
+        # Project around the mean latitude so planar distances are in meters near the campus
+        mean_lat = sum(lat for lat, _ in self.coords) / len(self.coords) if self.coords else 0.0
+        self._kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(mean_lat))
+        self._ky = math.radians(1) * EARTH_RADIUS
+
+        self.grid = GridIndex([long * self._kx for _, long in self.coords],
+                              [lat * self._ky for lat, _ in self.coords])
+
+    def snap_many(self, points) -> list:
+        """
+        Snaps a batch of (lat, long) points to their nearest indexed node.
+
+        Args:
+            points (iterable): (lat, long) query points.
+
+        Returns:
+            list: One (node id, great-circle distance in meters) tuple per query point.
+        """
+        points = list(points)
+        kx, ky = self._kx, self._ky
+        nearest = self.grid.nearest_many([(long * kx, lat * ky) for lat, long in points])
+
+        snapped = []
+        for (lat, long), (i, _) in zip(points, nearest):
+            node_lat, node_long = self.coords[i]
+            snapped.append((self.nodes[i], haversine(lat, long, node_lat, node_long)))
+        return snapped
+
+
+# ----------------------
+# Function: convex_hull
+# ----------------------
+def convex_hull(points) -> list:
+    """
+    Computes the convex hull of a set of planar points with Andrew's monotone chain algorithm.
+
+    Args:
+        points (iterable): (x, y) points, e.g. (lat, long) pairs over an area as small as the campus.
+
+    Returns:
+        list: The hull's vertices in counter-clockwise order (for (x, y) axes), without repeating the first one.
+        Fewer than three points are returned as they are, sorted.
+    """
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    # Build the lower and upper chains, dropping points that would make a clockwise turn
+    lower, upper = [], []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+# Modules that make up the headless routing core; none of them may pull in a GUI or geospatial dependency
+CORE_MODULES = ['algorithms', 'csr_graph', 'spatial', 'snapshot', 'graph', 'routing_engine', 'route_table',
+                'contraction', 'batch', 'server', 'benchmark', 'route_worker', 'instrumentation', 'isochrone',
+                'planner', 'overlay']
+
+# Modules that are expected to load the GUI stack
+GUI_MODULES = ['visualizer', 'main']
+
+# Heavy third-party packages the core must not import
+GUI_DEPENDENCIES = ['matplotlib', 'tkinter', 'osmnx', 'geopandas', 'shapely', 'pyproj', 'contextily', 'networkx']
+
+
+class PhaseTimer:
+    """
+    Records how long each named phase of a program's startup takes.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the body of a `with` block as one phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self) -> str:
+        """
+        Formats the phases, the share of the total each took and the total time since the timer was created.
+        """
+        total = time.perf_counter() - self.started
+        width = max([len(name) for name, _ in self.phases] + [len('total')])
+        lines = [f"{'phase':<{width}} {'time (s)':>9} {'share':>6}"]
+        for name, seconds in self.phases:
+            lines.append(f"{name:<{width}} {seconds:>9.3f} {seconds / total:>6.1%}")
+        lines.append(f"{'total':<{width}} {total:>9.3f}")
+        return '\n'.join(lines)
+
+
+# ----------------------
+# Function: import_profile
+# ----------------------
+def import_profile(module, top=5) -> dict:
+    """
+    Imports a module in a fresh interpreter with `-X importtime` and summarizes where the time went.
+
+    Args:
+        module (str): Name of the module to import.
+        top (int): Number of heaviest direct dependencies to report.
+
+    Returns:
+        dict: The module's cumulative import time, its heaviest direct imports and which `GUI_DEPENDENCIES` it
+        loaded. 'error' holds the last line of the traceback if the import failed.
+    """
+    code = (f"import {module}; import sys, json; "
+            f"print(json.dumps([name for name in {GUI_DEPENDENCIES!r} if name in sys.modules]))")
+
+    # A non-interactive backend so GUI modules can be profiled without a display
+    env = dict(os.environ, MPLBACKEND='Agg')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+
+    profile = {'module': module, 'import_s': None, 'heaviest': [], 'gui_dependencies': []}
+    if result.returncode != 0:
+        profile['error'] = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'import failed'
+        return profile
+
+    # Lines look like "import time:  self [us] | cumulative | imported package", with nested imports indented by
+    # two spaces per level and listed before the module that imported them
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == module:
+                profile['import_s'] = int(cumulative) / 1e6
+                break
+            children = []
+        elif depth == 1:
+            children.append((name.strip(), int(cumulative) / 1e6))
+
+    profile['heaviest'] = sorted(children, key=lambda item: -item[1])[:top]
+    profile['gui_dependencies'] = json.loads(result.stdout.strip().splitlines()[-1])
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the import time of each module, each in a fresh "
+                                                 "interpreter, and check that the routing core stays headless.")
+    parser.add_argument('modules', nargs='*', default=CORE_MODULES + GUI_MODULES, help="modules to profile")
+    parser.add_argument('--top', type=int, default=3, help="heaviest dependencies to list per module")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    profiles = []
+    regressions = []
+    print(f"{'module':>16} {'import (ms)':>12}  heaviest imports")
+    for module in args.modules:
+        profile = import_profile(module, args.top)
+        profiles.append(profile)
+
+        if 'error' in profile:
+            print(f"{module:>16} {'failed':>12}  {profile['error']}")
+            continue
+        heaviest = ', '.join(f"{name} {seconds * 1000:.0f}" for name, seconds in profile['heaviest'])
+        print(f"{module:>16} {profile['import_s'] * 1000:>12.1f}  {heaviest}")
+
+        if module in CORE_MODULES and profile['gui_dependencies']:
+            regressions.append(f"{module} imports {', '.join(profile['gui_dependencies'])}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(profiles, f, indent=2)
+
+    # Fail (e.g. in CI) when a core module starts depending on the GUI stack
+    for regression in regressions:
+        print(f"Headless core regression: {regression}", file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
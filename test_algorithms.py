@@ -0,0 +1,33 @@
+import random
+from algorithms import AStar, Dijkstra
+from benchmark import grid_graph
+from csr_graph import CSRGraph
+
+
+def test_astar_after_weights_edited_in_place():
+    # A* run before the edit keeps a heuristic scale for the graph; edges shortened behind its back must not leave
+    # it overestimating
+    graph = grid_graph(2500)
+    ids = list(graph)
+    rng = random.Random(3)
+    AStar(graph, ids[0], ids[-1])
+
+    for data in graph.values():
+        for neighbor in data['adj']:
+            data['adj'][neighbor] *= 0.3
+
+    for start, end in (rng.sample(ids, 2) for _ in range(50)):
+        assert abs(AStar(graph, start, end)[0] - Dijkstra(graph, start, end)[0]) < 1e-6
+
+
+def test_csr_astar_after_weights_edited_in_place():
+    graph = CSRGraph.from_dict(grid_graph(2500))
+    ids = list(graph.ids)
+    rng = random.Random(4)
+    AStar(graph, ids[0], ids[-1])
+
+    for e in range(len(graph.weights)):
+        graph.weights[e] *= 0.3
+
+    for start, end in (rng.sample(ids, 2) for _ in range(50)):
+        assert abs(AStar(graph, start, end)[0] - Dijkstra(graph, start, end)[0]) < 1e-6
@@ -0,0 +1,37 @@
+import random
+from algorithms import AStar, Dijkstra
+from benchmark import grid_graph
+from csr_graph import CSRGraph
+from overlay import GraphOverlay
+
+
+def test_astar_after_shortening_edges():
+    # A* run before the change keeps a heuristic scale on the graph; shorter edges must not leave it overestimating
+    graph = CSRGraph.from_dict(grid_graph(900))
+    overlay = GraphOverlay(graph)
+    ids = list(graph.ids)
+    rng = random.Random(1)
+    AStar(overlay.graph, ids[0], ids[-1])
+
+    for node in rng.sample(ids, 40):
+        neighbor = next(iter(overlay.graph[node]['adj']))
+        overlay.reweight_edge(node, neighbor, 1.0)
+
+    for start, end in (rng.sample(ids, 2) for _ in range(100)):
+        assert abs(AStar(overlay.graph, start, end)[0] - Dijkstra(overlay.graph, start, end)[0]) < 1e-6
+
+
+def test_astar_after_set_overrides():
+    # Worker processes sync closures with `set_overrides`, which must reset the scale as well
+    graph = CSRGraph.from_dict(grid_graph(900))
+    source = GraphOverlay(graph)
+    ids = list(graph.ids)
+    rng = random.Random(2)
+    for node in rng.sample(ids, 40):
+        source.reweight_edge(node, next(iter(graph[node]['adj'])), 1.0)
+
+    worker = GraphOverlay(graph)
+    AStar(worker.graph, ids[0], ids[-1])
+    worker.set_overrides(source.overrides)
+    for start, end in (rng.sample(ids, 2) for _ in range(100)):
+        assert abs(AStar(worker.graph, start, end)[0] - Dijkstra(worker.graph, start, end)[0]) < 1e-6
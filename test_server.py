@@ -0,0 +1,37 @@
+import json
+import server
+from algorithms import Dijkstra
+from benchmark import grid_graph
+from csr_graph import CSRGraph
+from overlay import GraphOverlay
+from server import RoutingService
+
+
+def test_closures_invalidate_only_affected_routes():
+    graph = CSRGraph.from_dict(grid_graph(400))
+    service = RoutingService(graph, overlay=GraphOverlay(graph))
+    try:
+        # Two routes along opposite edges of the 20 x 20 grid; closing a path of the first can't affect the second
+        ids = list(graph.ids)
+        affected, unrelated = ('dijkstra', ids[0], ids[5]), ('dijkstra', ids[-1], ids[-6])
+        for key in (affected, unrelated):
+            service.cache.put(key, Dijkstra(service.graph, key[1], key[2]))
+        path = service.cache.get(affected)[1]
+
+        status, body = service.handle_closures(json.dumps({'edges': [{'from': path[1], 'to': path[2]}]}))
+        assert status == 200 and body['changed_edges'] == 2
+        assert affected not in service.cache.entries
+        assert unrelated in service.cache.entries
+
+        # A worker behind the service's closures catches up from the overrides file
+        server._graph, server._overrides_path = graph, service._overrides_path
+        (dist, new_path), _, _ = server._find_route('dijkstra', ids[0], ids[5], body['version'])
+        assert (path[1], path[2]) not in zip(new_path, new_path[1:])
+        assert dist == Dijkstra(service.graph, ids[0], ids[5])[0]
+
+        assert service.handle_closures(json.dumps({'edges': [{'from': ids[0], 'to': ids[399]}]}))[0] == 404
+        assert service.handle_closures('[]')[0] == 400
+    finally:
+        service.close()
+        server._graph = server._overlay = server._overrides_path = None
+        server._overlay_version = 0
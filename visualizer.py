@@ -1,108 +1,472 @@
 import time
-from graph import csuf_campus_map, csuf_locations
+from algorithms import AStar, BidirectionalDijkstra, Dijkstra
+from basemap import add_background
+from graph import get_campus_map, csuf_locations, walking_minutes
+from instrumentation import QueryStats, phase
+from planner import plan_route
+from projection import projected, to_web_mercator
+from spatial import GridIndex
+from matplotlib.patches import Polygon
 from matplotlib.widgets import TextBox
-from pyproj import Transformer
 import matplotlib.pyplot as plt
-import osmnx as ox
-import contextily as ctx
-from shapely.geometry import box
-import geopandas as gpd
-from shapely.geometry import Point
 
+# The geospatial libraries (osmnx, geopandas, shapely, pyproj, contextily) take seconds to import, so they are
+# imported inside the functions that need them rather than here
 
-start_ax = plt.axes([0.075, 0.05, 0.2, 0.04])
-end_ax = plt.axes([0.35, 0.05, 0.2, 0.04])
+# Start/end text boxes, created on first use by `get_textboxes` so importing this module doesn't open a figure
+start_textbox = None
+end_textbox = None
 
-start_textbox = TextBox(start_ax, 'Start:')
-end_textbox = TextBox(end_ax, 'End:')
+# Route layer of the map axes, created by the first `plot_path` call
+route_layer = None
 
-# Store the text elements so we can clear them later
+# Store the text elements so we can update them in place
 exec_time_text = None
 dist_text = None
 walking_time_text = None
+expanded_text = None
+status_text = None
+isochrone_text = None
+tour_text = None
+
+
+class RouteLayer:
+    """
+    The path line, start/end markers and labels of the route shown on the map.
+
+    The artists are created once and only moved when a new route is shown. They are animated, so a full redraw
+    of the figure leaves them out; instead the rendered figure (background tiles, location markers, buttons) is
+    saved after every full draw and `update` restores it and draws just the route artists on top (blitting).
+    Switching routes therefore never re-renders the background image.
+    """
+
+    def __init__(self, ax):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.background = None
+
+        # Path as a line and start/end markers
+        self.line, = ax.plot([], [], color='cyan', linestyle='-', marker='o', markersize=5, lw=2, zorder=10,
+                             animated=True)
+        self.start_marker, = ax.plot([], [], 'go', markersize=10, zorder=11, label='Start', animated=True)
+        self.end_marker, = ax.plot([], [], 'bo', markersize=10, zorder=11, label='End', animated=True)
+
+        # Start and end labels, placed once there is a route
+        self.start_label = ax.annotate('Start', (0, 0), textcoords="offset points", xytext=(-10, -10), ha='center',
+                                       color='black', bbox=dict(boxstyle="round,pad=0.3", fc="white", lw=1),
+                                       zorder=11, animated=True, visible=False)
+        self.end_label = ax.annotate('End', (0, 0), textcoords="offset points", xytext=(-10, -10), ha='center',
+                                     color='black', bbox=dict(boxstyle="round,pad=0.3", fc="white", lw=1),
+                                     zorder=11, animated=True, visible=False)
+
+        # Reachable area of an isochrone, drawn under the route: its outline polygon and the reachable paths
+        self.area = Polygon([[0, 0]], closed=True, facecolor='orange', edgecolor='darkorange', alpha=0.25, lw=1,
+                            zorder=5, animated=True, visible=False)
+        ax.add_patch(self.area)
+        self.area_points, = ax.plot([], [], linestyle='', marker='.', markersize=2, color='darkorange', zorder=6,
+                                    animated=True)
+
+        self.artists = [self.area, self.area_points, self.line, self.start_marker, self.end_marker,
+                        self.start_label, self.end_label]
+
+        # Save the background after every full redraw (first show, resize, zoom)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add(self, artist):
+        """
+        Makes another artist (e.g. an info box) part of the layer, so it is redrawn by `update` as well.
+        """
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def show(self, coords_x, coords_y) -> None:
+        """
+        Moves the layer's artists onto a new route, given in map coordinates.
+        """
+        self.line.set_data(coords_x, coords_y)
+        self.start_marker.set_data([coords_x[0]], [coords_y[0]])
+        self.end_marker.set_data([coords_x[-1]], [coords_y[-1]])
+        self.start_label.xy = (coords_x[0], coords_y[0])
+        self.end_label.xy = (coords_x[-1], coords_y[-1])
+        self.start_label.set_visible(True)
+        self.end_label.set_visible(True)
+
+    def clear(self) -> None:
+        """
+        Hides the route.
+        """
+        for artist in (self.line, self.start_marker, self.end_marker):
+            artist.set_data([], [])
+        self.start_label.set_visible(False)
+        self.end_label.set_visible(False)
+
+    def show_area(self, outline_xs, outline_ys, point_xs, point_ys) -> None:
+        """
+        Shows a reachable area under the route, given as its outline and a point set in map coordinates.
+        """
+        if len(outline_xs) >= 3:
+            self.area.set_xy(list(zip(outline_xs, outline_ys)))
+            self.area.set_visible(True)
+        else:
+            self.area.set_visible(False)
+        self.area_points.set_data(point_xs, point_ys)
+
+    def clear_area(self) -> None:
+        """
+        Hides the reachable area.
+        """
+        self.area.set_visible(False)
+        self.area_points.set_data([], [])
+
+    def _on_draw(self, event) -> None:
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self) -> None:
+        figure = self.canvas.figure
+        for artist in self.artists:
+            figure.draw_artist(artist)
+
+    def update(self) -> None:
+        """
+        Puts the layer's current state on screen by blitting it over the saved background.
+
+        Falls back to a full redraw before the figure has been drawn once or when the backend can't blit.
+        """
+        if self.background is None or not self.canvas.supports_blit:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
+
+def get_route_layer(ax):
+    global route_layer
+    if route_layer is None or route_layer.ax is not ax:
+        route_layer = RouteLayer(ax)
+    return route_layer
+
+
+def _info_text(text, y, label, ax):
+    # Create an info box the first time, afterwards only change its text. Boxes are stacked down the top left corner
+    # of the map axes, `y` being the box's top in axes coordinates; the current axes can't be used, since it is
+    # whichever widget was created last.
+    if text is None:
+        text = ax.text(0.01, y, label, color='blue', fontsize=12, verticalalignment='top', transform=ax.transAxes)
+        text.set_bbox(dict(facecolor='white', alpha=1, edgecolor='blue'))
+        if route_layer is not None:
+            route_layer.add(text)
+    else:
+        text.set_text(label)
+    return text
 
-def plot_exec_time(start_t, end_t):
+def plot_exec_time(start_t, end_t, ax, query=None):
+    # With a query record, show how long each phase took instead of the total
     global exec_time_text
-    if exec_time_text:
-        exec_time_text.remove()  # Clear previous text
-    exec_time_text = plt.text(1.50, .75, f"Execution time: {end_t - start_t}", color='blue', fontsize=12,
-                              transform=plt.gca().transAxes)
-    exec_time_text.set_bbox(dict(facecolor='white', alpha=1, edgecolor='blue'))
-
-def plot_dist(dist):
+    if query is not None:
+        label = query.summary(['search', 'reconstruct', 'route table', 'matrix', 'order', 'projection'])
+    else:
+        label = f"{(end_t - start_t) * 1000:.2f} ms"
+    exec_time_text = _info_text(exec_time_text, 0.91, f"Execution time: {label}", ax)
+
+def plot_expanded(expanded, ax, baseline=None, counters=None):
+    global expanded_text
+    label = f"Nodes expanded: {expanded}"
+    if baseline is not None:
+        label += f" (Dijkstra: {baseline})"
+    if counters:
+        label += (f", pushes: {counters.get('pushes', 0)}, relaxed: {counters.get('relaxed', 0)}, "
+                  f"peak frontier: {counters.get('peak_frontier', 0)}")
+    expanded_text = _info_text(expanded_text, 0.95, label, ax)
+
+def plot_dist(dist, ax):
     global dist_text, walking_time_text
-    if dist_text:
-        dist_text.remove()  # Clear previous text
-    if walking_time_text:
-        walking_time_text.remove()  # Clear previous text
+    walking_time_min = walking_minutes(dist)
+    dist_text = _info_text(dist_text, 0.87, f"Distance: {dist:.2f} meters", ax)
+    walking_time_text = _info_text(walking_time_text, 0.83,
+                                   f"Estimated Walking Time: {walking_time_min:.2f} minutes", ax)
 
-    avg_walking_speed = 1.42
-    walking_time_min = (dist / avg_walking_speed) / 60
-    dist_text = plt.text(1.50, 0.50, f"Distance: {dist:.2f} meters", color='blue', fontsize=12, transform=plt.gca().transAxes)
-    dist_text.set_bbox(dict(facecolor='white', alpha=1, edgecolor='blue'))
-    walking_time_text = plt.text(1.50, 0.25, f"Estimated Walking Time: {walking_time_min:.2f} minutes", color='blue', fontsize=12,
-                                 transform=plt.gca().transAxes)
-    walking_time_text.set_bbox(dict(facecolor='white', alpha=1, edgecolor='blue'))
 
+def get_textboxes():
+    global start_textbox, end_textbox
+    if start_textbox is None:
+        start_ax = plt.axes([0.075, 0.05, 0.2, 0.04])
+        end_ax = plt.axes([0.35, 0.05, 0.2, 0.04])
 
+        start_textbox = TextBox(start_ax, 'Start:')
+        end_textbox = TextBox(end_ax, 'End:')
+    return start_textbox, end_textbox
 
 def err_invalid():
+    start_textbox, end_textbox = get_textboxes()
     start_textbox.set_val("Invalid")
     end_textbox.set_val("Invalid")
 
 def convert_coords(coords_list):
-    gdf = gpd.GeoDataFrame(geometry=[Point(x, y) for y, x in coords_list], crs="EPSG:4326")
-    gdf = gdf.to_crs(epsg=3857)  # Convert to Web Mercator or whatever projection your map uses
-    return [(point.x, point.y) for point in gdf.geometry]
+    # Project (lat, long) pairs to the map's Web Mercator coordinates in one vectorized call
+    xs, ys = to_web_mercator([lat for lat, _ in coords_list], [long for _, long in coords_list])
+    return list(zip(xs.tolist(), ys.tolist()))
 
 
-def run_algo(graph, algo, start, end, fig, ax):
+def run_algo(graph, algo, start, end, fig, ax, route_table=None, stats_log=None):
     # Step 1: Validate the start and end nodes
     if start not in graph or end not in graph:
         print("Invalid start or end location.")
         return
 
     # Step 2: Start timing for performance measurement
+    query = QueryStats('query', algo=algo.__name__, start=start, end=end)
     s_t = time.perf_counter()
 
-    # Step 3: Run the selected algorithm to find a path
-    result = algo(graph, start, end)
-
+    # Step 3: Run the selected algorithm to find a path. Shortest-path queries between two locations are answered
+    # from the precomputed route table when one is available.
+    stats = {}
+    from_table = _in_route_table(route_table, algo, start, end)
+    if from_table:
+        result = route_table.lookup(start, end)
+        stats['expanded'] = 0
+        query.record('route table', time.perf_counter() - s_t)
+    else:
+        result = algo(graph, start, end, stats=stats)
+        query.add_search(stats, time.perf_counter() - s_t)
+    query.fields['source'] = 'route table' if from_table else 'search'
+
+    # For A*, run Dijkstra on the same query so the saved expansions can be compared, once the route is drawn
+    comparing = algo is AStar and not from_table and result != (None, None)
+    show_result(graph, result, query, None, ax, None if comparing else stats_log)
+    if comparing:
+        baseline_stats = {}
+        with query.phase('baseline'):
+            Dijkstra(graph, start, end, stats=baseline_stats)
+        show_baseline(query, baseline_stats['expanded'], ax, stats_log)
+
+
+def _in_route_table(route_table, algo, start, end):
+    # Shortest-path algorithms between two locations can be answered from the precomputed route table
+    exact = algo in (Dijkstra, AStar, BidirectionalDijkstra)
+    return route_table is not None and exact and (start, end) in route_table
+
+
+def show_result(graph, result, query, baseline, ax, stats_log=None):
+    """
+    Draws a search result and its statistics, then writes the query record to `stats_log` if there is one.
+
+    Args:
+        graph (CSRGraph): The routing graph.
+        result: What the algorithm returned.
+        query (QueryStats): The query's timings and search counters. Projection and render times are added here.
+        baseline (int): Nodes Dijkstra expanded on the same query, shown next to A*'s.
+        ax (matplotlib.axes.Axes): The map axes.
+        stats_log (StatsLog): Optional log the finished record is appended to.
+    """
     # Step 4: If result is None, exit and print a message
-    if result is None:
+    if result is None or result == (None, None):
         print("No path found.")
-        return
-
+        path = None
     # Step 5: Handle result for different algorithms (BFS/DFS return path, Dijkstra returns tuple)
-    if isinstance(result, tuple):
+    elif isinstance(result, tuple):
         dist, path = result  # For Dijkstra
     else:
         path = result
         dist = len(path)  # Estimate distance for BFS/DFS based on path length
 
-    # Step 6: End timing
-    e_t = time.perf_counter()
-
-    # Step 7: Plot the path, execution time, and distance
+    # Step 6: Plot the path, execution time, and distance
     if path:
-        # Clear any previous paths on `ax`
-        for line in ax.get_lines():
-            line.remove()
-
-        # Plot the new path on the existing map
-        plot_path(graph, path, ax)
-
-        # Plot execution time and distance information
-        plot_exec_time(s_t, e_t)
-        plot_dist(dist)
-
-        # Reattach hover functionality after updating the plot
-        on_hover(fig, ax, csuf_locations)
+        query.fields['path_nodes'] = len(path)
+
+        # Move the route layer onto the new path; the previous route's artists are reused
+        plot_path(graph, path, ax, draw=False, stats=query)
+
+        # Plot execution time and distance information, and blit the route and info boxes over the saved
+        # background instead of redrawing the whole figure
+        with query.phase('render'):
+            plot_exec_time(0, 0, ax, query)
+            plot_dist(dist, ax)
+            plot_expanded(query.counters.get('expanded', 0), ax, baseline, query.counters)
+            get_route_layer(ax).update()
+    elif result is not None and result != (None, None):
+        print("Path not found between start and end.")
 
-        # Refresh the figure canvas to display updates
-        fig.canvas.draw_idle()
+    if stats_log is not None:
+        stats_log.write(query)
+
+
+def show_baseline(query, baseline, ax, stats_log=None):
+    """
+    Adds Dijkstra's expansions on the same query next to those of an A* result already drawn by `show_result`,
+    then writes the query record to `stats_log` if there is one.
+
+    Args:
+        query (QueryStats): The A* query's record.
+        baseline (int): Nodes Dijkstra expanded, or None if the comparison was cancelled or failed.
+        ax (matplotlib.axes.Axes): The map axes.
+        stats_log (StatsLog): Optional log the finished record is appended to.
+    """
+    if baseline is not None:
+        plot_expanded(query.counters.get('expanded', 0), ax, baseline, query.counters)
+        get_route_layer(ax).update()
+    if stats_log is not None:
+        stats_log.write(query)
+
+
+def run_tour(graph, stops, ax, route_table=None, stats_log=None):
+    """
+    Plans the shortest route through several stops with `plan_route` and draws it like a single route.
+
+    Planning takes milliseconds even for every location, so it runs right away rather than on the search worker.
+
+    Args:
+        graph (CSRGraph): The routing graph.
+        stops (list): Location names; the route starts at the first and visits the others in the best order.
+        ax (matplotlib.axes.Axes): The map axes.
+        route_table (RouteTable): Precomputed location routes, used for the stop-to-stop distances when available.
+        stats_log (StatsLog): Optional log the tour's timings are appended to.
+    """
+    query = QueryStats('tour', stops=list(stops))
+    dist, order, path = plan_route(graph, stops, route_table=route_table, stats=query)
+    if path is None:
+        print("No route through all stops.")
     else:
-        print("Path not found between start and end.")
+        query.fields.update({'order': order, 'path_nodes': len(path)})
+        plot_path(graph, path, ax, draw=False, stats=query)
+        with query.phase('render'):
+            plot_exec_time(0, 0, ax, query)
+            plot_dist(dist, ax)
+            plot_tour(order, ax)
+            get_route_layer(ax).update()
+
+    if stats_log is not None:
+        stats_log.write(query)
+
+
+def plot_tour(order, ax):
+    global tour_text
+    tour_text = _info_text(tour_text, 0.75, "Tour: " + " -> ".join(order), ax)
+
+
+class SearchController:
+    """
+    Runs the searches started from the GUI on a `RouteWorker`, so the window stays responsive while they run.
+
+    Each new search cancels the one still running. The result is collected by polling the worker from the GUI's
+    event loop (e.g. with Tk's `after`) and is drawn there, and a status box shows that a search is in progress.
+    For A*, the route is drawn as soon as it arrives and Dijkstra's expansions are added to it when the worker has
+    counted them.
+    """
+
+    def __init__(self, graph, ax, worker, route_table=None, schedule=None, interval=100, stats_log=None):
+        """
+        Args:
+            graph (CSRGraph): The routing graph, used to validate locations and draw routes.
+            ax (matplotlib.axes.Axes): The map axes.
+            worker (RouteWorker): Runs the searches.
+            route_table (RouteTable): Precomputed location-to-location routes, answered without a search.
+            schedule (function): Calls a function after a number of milliseconds on the GUI thread, such as Tk's
+                `root.after`. Defaults to a matplotlib timer on the figure's canvas.
+            interval (int): Milliseconds between two polls of the worker.
+            stats_log (StatsLog): Optional JSON-lines log that receives every query's timings and counters.
+        """
+        self.graph = graph
+        self.ax = ax
+        self.worker = worker
+        self.route_table = route_table
+        self.schedule = schedule or self._timer_schedule
+        self.interval = interval
+        self.stats_log = stats_log
+        self.searching = None
+        self.comparing = None  # Record of the A* query whose Dijkstra expansions are still being counted
+        self._polling = False
+
+    def _timer_schedule(self, ms, callback):
+        timer = self.ax.figure.canvas.new_timer(interval=ms)
+        timer.single_shot = True
+        timer.add_callback(callback)
+        timer.start()
+
+    def run(self, algo, start, end):
+        # Validate the start and end nodes
+        if start not in self.graph or end not in self.graph:
+            print("Invalid start or end location.")
+            return
+
+        # A new search replaces the one still running, and the comparison of the previous A* route
+        self.worker.cancel()
+        if self.comparing is not None:
+            query, self.comparing = self.comparing, None
+            show_baseline(query, None, self.ax, self.stats_log)
+        if _in_route_table(self.route_table, algo, start, end):
+            self._set_status(None)
+            run_algo(self.graph, algo, start, end, self.ax.figure, self.ax, self.route_table, self.stats_log)
+            return
+
+        self.worker.submit(algo, start, end)
+        query = QueryStats('query', algo=algo.__name__, start=start, end=end, source='worker')
+        self.searching = (algo.__name__, time.perf_counter(), query)
+        self._set_status(f"Searching ({algo.__name__})...")
+        if not self._polling:
+            self._polling = True
+            self.schedule(self.interval, self._poll)
+
+    def _poll(self):
+        finished = self.worker.poll()
+        if self.searching is not None and (finished is not None or self.worker.pending is None):
+            self._show_search(finished)
+        elif self.comparing is not None and finished is not None:
+            self._show_comparison(finished[1])
+
+        if self.worker.pending is not None:
+            # Still running (or counting Dijkstra's expansions): show how long for, then check again
+            if self.searching is not None:
+                name, started, _ = self.searching
+                self._set_status(f"Searching ({name})... {time.perf_counter() - started:.1f} s")
+            self.schedule(self.interval, self._poll)
+            return
+        self._polling = False
+
+    def _show_search(self, finished):
+        # Draw the route of the finished (or cancelled, for None) search
+        _, started, query = self.searching
+        self.searching = None
+        self._set_status(None, draw=False)
+        if finished is None:
+            get_route_layer(self.ax).update()
+            return
+        _, reply = finished
+        if 'error' in reply:
+            print(f"Search failed: {reply['error']}")
+            get_route_layer(self.ax).update()
+            return
+
+        # Besides the search, record how long the result took to come back (process hand-off and polling delay)
+        query.add_search(reply['stats'], reply['elapsed'])
+        query.record('worker wait', max(0.0, time.perf_counter() - started - reply['elapsed']))
+        if reply['comparing']:
+            # The record is written once Dijkstra's expansions are in
+            self.comparing = query
+            show_result(self.graph, reply['result'], query, None, self.ax)
+        else:
+            show_result(self.graph, reply['result'], query, None, self.ax, self.stats_log)
+
+    def _show_comparison(self, reply):
+        query, self.comparing = self.comparing, None
+        if 'error' in reply:
+            print(f"Dijkstra comparison failed: {reply['error']}")
+            show_baseline(query, None, self.ax, self.stats_log)
+            return
+        query.record('baseline', reply['baseline_elapsed'])
+        show_baseline(query, reply['baseline'], self.ax, self.stats_log)
+
+    def _set_status(self, label, draw=True):
+        # Show (or hide, for None) the search status box
+        global status_text
+        layer = get_route_layer(self.ax)
+        status_text = _info_text(status_text, 0.99, label or "", self.ax)
+        status_text.set_visible(label is not None)
+        if draw:
+            layer.update()
 
 
 def run_accessible_algo(graph, start, end, fig, ax):
@@ -121,18 +485,34 @@ def run_accessible_algo(graph, start, end, fig, ax):
 
 
 def clear_textboxes(event):
+    start_textbox, end_textbox = get_textboxes()
     start_textbox.set_val('')
     end_textbox.set_val('')
 
 
-def plot_campus():
-    # Convert the graph nodes to a GeoDataFrame in Web Mercator
-    gdf_nodes, gdf_edges = ox.graph_to_gdfs(csuf_campus_map)
-    gdf_nodes = gdf_nodes.to_crs(epsg=3857)
+def plot_campus(graph=None):
+    """
+    Draws the campus map: the location markers over the map background.
+
+    Args:
+        graph (CSRGraph | dict): The routing graph. Location markers are looked up in it by node id (the location
+            names) from its projected positions, so the OSM map isn't needed. Without it, the location nodes that
+            `add_csuf_locations` added to the OSM map are used.
+
+    Returns:
+        tuple: The figure, the map axes and a mapping of location coordinates to names.
+    """
+    # Location nodes are keyed by their names, so markers are found by id rather than by matching coordinates
+    names = list(csuf_locations)
+    if graph is not None:
+        location_xs, location_ys = projected(graph).positions([name for name in names if name in graph])
+    else:
+        campus_map = get_campus_map()
+        nodes = [campus_map.nodes[name] for name in names if name in campus_map]
+        location_xs, location_ys = to_web_mercator([data['y'] for data in nodes], [data['x'] for data in nodes])
 
     # Filter only campus locations based on `csuf_locations`
     campus_locations = {coords: name for name, coords in csuf_locations.items()}
-    location_nodes = gdf_nodes[gdf_nodes.apply(lambda row: (row['y'], row['x']) in campus_locations, axis=1)]
 
     # Calculate bounds directly from csuf_locations
     longitudes = [coords[1] for coords in campus_locations.keys()]
@@ -141,18 +521,16 @@ def plot_campus():
     south_bound, north_bound = min(latitudes) - 0.0002, max(latitudes) + 0.0009
 
     # Convert these bounds to Web Mercator projection
-    bbox = gpd.GeoDataFrame(geometry=[box(west_bound, south_bound, east_bound, north_bound)], crs="EPSG:4326")
-    bbox = bbox.to_crs(epsg=3857)
-    west, south, east, north = bbox.total_bounds
+    (west, east), (south, north) = to_web_mercator([south_bound, north_bound], [west_bound, east_bound])
 
     # Initialize the plot with explicit bounds and fixed figure size
     fig, ax = plt.subplots(figsize=(10, 10), dpi=75)  # Adjust `figsize` and `dpi` for fixed size at startup
 
     # Plot only the campus nodes without any edges
-    location_nodes.plot(ax=ax, markersize=50, color='red', zorder=2)  # Larger markers for visibility
+    ax.scatter(location_xs, location_ys, s=50, color='red', zorder=2)  # Larger markers for visibility
 
-    # Add OpenStreetMap tiles as the background
-    ctx.add_basemap(ax, source=ctx.providers.OpenStreetMap.Mapnik)
+    # Add OpenStreetMap tiles as the background, from the pre-rendered raster (or the local tile cache) when possible
+    add_background(ax, (west, south, east, north))
 
     # Set x and y limits based on calculated campus area bounds
     ax.set_xlim([west, east])
@@ -172,84 +550,58 @@ def plot_campus():
     # Return fig and ax for further customization (hover, GUI)
     return fig, ax, campus_locations
 
-def on_hover(fig, ax):
-    # Create an annotation for displaying the node name
-    annot = ax.annotate(
-        "", xy=(0,0), xytext=(15,15),
-        textcoords="offset points",
-        bbox=dict(boxstyle="round", fc="w"),
-        arrowprops=dict(arrowstyle="->")
-    )
-    annot.set_visible(False)
-
-    # Dictionary to store coordinates and location names for easy lookup
-    location_coords = {coords: name for name, coords in csuf_locations.items()}
-
-    # Update the annotation position and text
-    def update_annot(x, y, name):
-        annot.xy = (x, y)
-        annot.set_text(name)
-        annot.set_visible(True)
-
-    # Event handler for mouse movement
-    def hover(event):
-        visible = annot.get_visible()
-        if event.inaxes == ax:
-            for (lat, long), name in location_coords.items():
-                # Check if mouse is near a specific location marker
-                if abs(event.xdata - long) < 0.0001 and abs(event.ydata - lat) < 0.0001:
-                    update_annot(long, lat, name)
-                    fig.canvas.draw_idle()
-                    return
-            if visible:
-                annot.set_visible(False)
-                fig.canvas.draw_idle()
-
-    # Connect the hover event to the figure
-    fig.canvas.mpl_connect("motion_notify_event", hover)
-
-def plot_path(graph, path, ax=None):
+def plot_path(graph, path, ax=None, draw=True, stats=None):
     # Ensure we have an existing axis with a background map
     if ax is None:
         fig, ax, _ = plot_campus()
-    else:
-        # Clear only previous path lines and start/end annotations on the existing axis
-        for line in ax.get_lines():
-            line.remove()
-        for text in ax.texts:
-            text.remove()  # Clear previous start/end annotations
+    layer = get_route_layer(ax)
 
+    # Look up the map positions along the path (its nodes and the curves between them), projected once per graph
+    with phase(stats, 'projection'):
+        coords_x, coords_y = projected(graph).path(path) if path else ((), ())
     if not path or len(path) < 2:
         print("Path is too short or invalid.")
-        return
-
-    # Collect coordinates and convert them to the correct projection if needed
-    coords_list = [(graph[node]['coords'][0], graph[node]['coords'][1]) for node in path if 'coords' in graph[node]]
-    if len(coords_list) < 2:
+        layer.clear()
+    elif len(coords_x) < 2:
         print("Insufficient valid coordinates for plotting.")
-        return
-
-    # Convert coordinates to the projection used by the map if necessary
-    coords_list = convert_coords(coords_list)
-    coords_x, coords_y = zip(*coords_list)
-
-    # Plot path as a line and start/end markers
-    ax.plot(coords_x, coords_y, color='cyan', linestyle='-', marker='o', markersize=5, lw=2, zorder=10)
-
-    # Mark start and end points
-    start_x, start_y = coords_x[0], coords_y[0]
-    end_x, end_y = coords_x[-1], coords_y[-1]
-    ax.plot(start_x, start_y, 'go', markersize=10, zorder=11, label='Start')
-    ax.plot(end_x, end_y, 'bo', markersize=10, zorder=11, label='End')
-
-    # Annotate start and end points
-    ax.annotate('Start', (start_x, start_y), textcoords="offset points", xytext=(-10, -10), ha='center', color='black',
-                bbox=dict(boxstyle="round,pad=0.3", fc="white", lw=1), zorder=11)
-    ax.annotate('End', (end_x, end_y), textcoords="offset points", xytext=(-10, -10), ha='center', color='black',
-                bbox=dict(boxstyle="round,pad=0.3", fc="white", lw=1), zorder=11)
+        layer.clear()
+    else:
+        # Move the path line, start/end markers and labels onto the new route
+        layer.show(coords_x, coords_y)
 
     # Ensure the plot is updated with the path
-    ax.figure.canvas.draw_idle()
+    if draw:
+        layer.update()
+
+def plot_isochrone(isochrone, ax, draw=True):
+    """
+    Shades the area reachable in an isochrone on the map and lists how many locations it reaches.
+
+    Args:
+        isochrone (Isochrone): The reachable area, e.g. from `IsochroneCache.get`, or None to hide it.
+        ax (matplotlib.axes.Axes): The map axes.
+        draw (bool): Put the change on screen right away.
+    """
+    global isochrone_text
+    layer = get_route_layer(ax)
+    if isochrone is None:
+        layer.clear_area()
+        label = None
+    else:
+        # Both the outline and the point set are (lat, long), projected in one transform each
+        outline_xs, outline_ys = to_web_mercator([lat for lat, _ in isochrone.polygon],
+                                                 [long for _, long in isochrone.polygon])
+        point_xs, point_ys = to_web_mercator([lat for lat, _ in isochrone.points],
+                                             [long for _, long in isochrone.points])
+        layer.show_area(outline_xs, outline_ys, point_xs, point_ys)
+        minutes = walking_minutes(isochrone.max_distance)
+        reached = sum(1 for name in isochrone.locations if name != isochrone.source)
+        label = f"Within {minutes:.1f} min: {reached} locations, {len(isochrone.nodes)} nodes"
+
+    isochrone_text = _info_text(isochrone_text, 0.79, label or "", ax)
+    isochrone_text.set_visible(label is not None)
+    if draw:
+        layer.update()
 
 def plot_location_names(event):
     plt.figure()
@@ -263,48 +615,93 @@ def plot_location_names(event):
     plt.axis('off')
     plt.show()
 
+class HoverEngine:
+    """
+    Shows the name of the location under the mouse pointer.
+
+    Marker positions are kept in a `GridIndex` in map coordinates, so finding the marker under the pointer only
+    looks at the few grid cells around it, however many markers there are. The tolerance is in pixels and is
+    converted to map units on every move, so it stays the same when zooming. The tooltip belongs to the map's
+    `RouteLayer` and is blitted, and only when the hovered marker changes.
+    """
+
+    def __init__(self, ax, names, xs, ys, tolerance=8):
+        self.ax = ax
+        self.names = list(names)
+        self.index = GridIndex(xs, ys)
+        self.tolerance = tolerance
+        self.current = None
+
+        # Initialize an annotation for displaying node names
+        self.annot = ax.annotate(
+            "", xy=(0, 0), xytext=(10, 10),
+            textcoords="offset points",
+            bbox=dict(boxstyle="round", fc="w"),
+            arrowprops=dict(arrowstyle="->")
+        )
+        self.annot.set_visible(False)
+        self.layer = get_route_layer(ax)
+        self.layer.add(self.annot)
+
+        self.cid = ax.figure.canvas.mpl_connect("motion_notify_event", self.on_move)
+
+    def target(self, event):
+        """
+        Finds the marker within `tolerance` pixels of a mouse event.
+
+        Returns:
+            int: Index of the closest marker, or None.
+        """
+        if event.inaxes is not self.ax or event.xdata is None:
+            return None
+
+        # Search radius in map units: the tolerance in pixels along the more stretched axis
+        inverse = self.ax.transData.inverted()
+        (x0, y0), (x1, y1) = inverse.transform([(event.x, event.y),
+                                                (event.x + self.tolerance, event.y + self.tolerance)])
+        radius = max(abs(x1 - x0), abs(y1 - y0))
+
+        candidates = [i for i, _ in self.index.within(event.xdata, event.ydata, radius)]
+        if not candidates:
+            return None
+
+        # Compare in pixels, since the two axes can have different scales
+        pixels = self.ax.transData.transform([(self.index.xs[i], self.index.ys[i]) for i in candidates])
+        best, best_d2 = None, self.tolerance ** 2
+        for i, (px, py) in zip(candidates, pixels):
+            d2 = (px - event.x) ** 2 + (py - event.y) ** 2
+            if d2 <= best_d2:
+                best, best_d2 = i, d2
+        return best
+
+    def on_move(self, event):
+        target = self.target(event)
+        if target == self.current:
+            return  # Nothing to redraw
+        self.current = target
+
+        if target is None:
+            self.annot.set_visible(False)
+        else:
+            self.annot.xy = (self.index.xs[target], self.index.ys[target])
+            self.annot.set_text(self.names[target])
+            self.annot.set_visible(True)
+        self.layer.update()
+
+
+# Hover engine of the map axes, so `on_hover` registers only one handler per figure
+hover_engine = None
+
+
 def on_hover(fig, ax, csuf_locations):
-    # Set up coordinate transformation from lat/long to the map's projection
-    transformer = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)  # from lat/long to Web Mercator
-
-    # Initialize an annotation for displaying node names
-    annot = ax.annotate(
-        "", xy=(0, 0), xytext=(10, 10),
-        textcoords="offset points",
-        bbox=dict(boxstyle="round", fc="w"),
-        arrowprops=dict(arrowstyle="->")
-    )
-    annot.set_visible(False)
-
-    # Convert and store node positions in projected coordinates
-    node_positions = {}
-    for name, (lat, long) in csuf_locations.items():
-        # Transform latitude and longitude to match plot coordinates
-        proj_x, proj_y = transformer.transform(long, lat)
-        node_positions[name] = (proj_x, proj_y)
-
-    # Function to update the annotation
-    def update_annotation(name, x, y):
-        annot.xy = (x, y)
-        annot.set_text(name)
-        annot.set_visible(True)
-        fig.canvas.draw_idle()
-
-    # Event handler for hover
-    def on_move(event):
-        if event.inaxes != ax:
-            return  # Ignore events outside the plot area
-
-        for name, (node_x, node_y) in node_positions.items():
-            # Check if the cursor is close to a node within a small tolerance
-            if abs(node_x - event.xdata) < 20 and abs(node_y - event.ydata) < 20:  # Adjust tolerance as needed
-                update_annotation(name, node_x, node_y)
-                return
-
-        # Hide the annotation if no node is nearby
-        annot.set_visible(False)
-        fig.canvas.draw_idle()
-
-    # Connect the hover function to the figure
-    fig.canvas.mpl_connect("motion_notify_event", on_move)
+    global hover_engine
+    if hover_engine is not None and hover_engine.ax is ax:
+        return hover_engine
+
+    # Convert node positions to projected coordinates
+    names = list(csuf_locations)
+    xs, ys = to_web_mercator([lat for lat, _ in csuf_locations.values()],
+                             [long for _, long in csuf_locations.values()])
 
+    hover_engine = HoverEngine(ax, names, xs, ys)
+    return hover_engine